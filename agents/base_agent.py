@@ -5,7 +5,7 @@ Agent基类
 import json
 import time
 from abc import ABC, abstractmethod
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Callable, Dict, List, Optional, Union
 from pydantic import BaseModel, ValidationError
 
 from langchain_openai import ChatOpenAI
@@ -15,7 +15,10 @@ from langchain_core.messages import HumanMessage, SystemMessage
 
 from utils.config import config
 from utils.logger import log
-from utils.json_utils import safe_parse_json
+from utils.json_utils import prompt_json, safe_parse_json
+from utils.context_budget import ContextAssembler, agent_context_budget
+from utils.prompt_profiler import prompt_profiler
+from utils.concurrency import llm_call_slot
 
 
 # JSON修复提示词模板
@@ -37,6 +40,14 @@ JSON_FIX_PROMPT = """你之前生成的JSON格式不正确，请修复。
 """
 
 
+class ThrottledChatOpenAI(ChatOpenAI):
+    """每次invoke占用一个全局LLM调用名额的ChatOpenAI（链式调用 prompt | llm 同样生效）"""
+
+    def invoke(self, *args, **kwargs):
+        with llm_call_slot():
+            return super().invoke(*args, **kwargs)
+
+
 class AgentConfig(BaseModel):
     """Agent配置模型"""
     name: str
@@ -66,6 +77,8 @@ class BaseAgent(ABC):
     system_prompt: str = ""
     human_prompt_template: str = ""
     required_fields: List[str] = []
+    # 上下文token预算上限（None表示只受模型上下文窗口限制）
+    context_token_budget: Optional[int] = None
 
     def __init__(self, config: Optional[AgentConfig] = None):
         """
@@ -105,7 +118,7 @@ class BaseAgent(ABC):
             llm_kwargs["model_kwargs"] = {"response_format": {"type": "json_object"}}
             log.debug(f"{self._config.name} 启用结构化输出")
 
-        return ChatOpenAI(**llm_kwargs)
+        return ThrottledChatOpenAI(**llm_kwargs)
 
     def _create_prompt_template(self) -> ChatPromptTemplate:
         """创建prompt模板"""
@@ -114,6 +127,37 @@ class BaseAgent(ABC):
             ("human", self._config.human_prompt_template)
         ])
 
+    def _context_assembler(self, label: Optional[str] = None) -> ContextAssembler:
+        """
+        创建上下文装配器
+
+        预算 = 模型上下文窗口 - 输出预留 - prompt模板，且不超过context_token_budget
+
+        Args:
+            label: 日志中的名称（默认Agent名称）
+        """
+        budget = agent_context_budget(
+            self._config.system_prompt,
+            self._config.human_prompt_template,
+            max_budget=self.context_token_budget
+        )
+        return ContextAssembler(budget, label or self._config.name)
+
+    def _format_prompt(self, template: str, label: str = "", **variables: Any) -> str:
+        """
+        渲染prompt模板（开启PROMPT_PROFILE时记录各变量的组成）
+
+        Args:
+            template: prompt模板
+            label: 调用类型（报告中区分同一Agent的不同模板）
+            **variables: 模板变量
+
+        Returns:
+            渲染后的prompt
+        """
+        prompt_profiler.record(self._config.name, template, variables, self._config.system_prompt, label)
+        return template.format(**variables)
+
     def _extract_json(self, response: str) -> Dict[str, Any]:
         """
         从响应中提取JSON
@@ -175,7 +219,7 @@ class BaseAgent(ABC):
 
         fix_prompt = JSON_FIX_PROMPT.format(
             error_message=error_message,
-            previous_json=json.dumps(previous_json, ensure_ascii=False, indent=2),
+            previous_json=prompt_json(previous_json),
             required_fields=required_fields_str
         )
 
@@ -228,6 +272,9 @@ class BaseAgent(ABC):
         log.info(f"{self._config.name} 开始执行...")
         log.debug(f"输入参数: {json.dumps(kwargs, ensure_ascii=False)[:200]}...")
 
+        prompt_profiler.record(
+            self._config.name, self._config.human_prompt_template, kwargs, self._config.system_prompt
+        )
         prompt_template = self._create_prompt_template()
         chain = prompt_template | self._llm
 
@@ -339,6 +386,51 @@ class BaseAgent(ABC):
 
         return previous_output
 
+    def _invoke_with_validation(
+        self,
+        human_prompt: str,
+        validator: Callable[[Dict[str, Any]], Union[bool, str]],
+        label: str,
+        max_rounds: Optional[int] = None,
+        retry_hint: str = "请重新修复。"
+    ) -> Optional[Dict[str, Any]]:
+        """
+        调用LLM并解析、验证JSON，验证失败时带上错误信息重试（不经过通用的run流程）
+
+        Args:
+            human_prompt: 已格式化的用户prompt
+            validator: 验证函数，返回True或错误信息
+            label: 日志中的名称
+            max_rounds: 最大尝试轮数（默认max_fix_rounds）
+            retry_hint: 重试时附在错误信息后的要求
+
+        Returns:
+            验证通过的JSON，全部失败时返回None
+        """
+        messages = [
+            SystemMessage(content=self._config.system_prompt),
+            HumanMessage(content=human_prompt)
+        ]
+
+        for round_num in range(max_rounds or self._config.max_fix_rounds):
+            try:
+                response = self._llm.invoke(messages)
+                output = self._extract_json(response.content)
+
+                validation_result = validator(output)
+                if validation_result is True:
+                    return output
+
+                log.warning(f"{label}验证失败: {validation_result}")
+                messages.append(SystemMessage(
+                    content=f"输出仍有问题: {validation_result}。{retry_hint}"
+                ))
+
+            except Exception as e:
+                log.error(f"{label}失败 (第{round_num + 1}轮): {e}")
+
+        return None
+
     def _build_feedback_prompt(
         self,
         previous_output: Dict[str, Any],
@@ -379,7 +471,7 @@ class BaseAgent(ABC):
             "一致性审查发现以下问题，请根据反馈修改之前的输出：",
             "",
             "【之前的输出】",
-            json.dumps(previous_output, ensure_ascii=False, indent=2),
+            prompt_json(previous_output),
             "",
             "【发现的问题】",
             *issue_descriptions,
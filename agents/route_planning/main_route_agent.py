@@ -12,6 +12,7 @@ from prompts.route_planning.main_route_prompt import (
 )
 from pydantic import BaseModel, Field
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class MainRouteFramework(BaseModel):
@@ -98,13 +99,12 @@ class MainRouteAgent(BaseAgent):
             steps_data_section = ""  # 修复模式不传递故事数据
         else:
             # 正常生成模式：传递故事数据
-            import json
             relevant_data = {
                 "premise": steps.get("premise", {}),
                 "cast_arc": steps.get("cast_arc", {}),
                 "conflict_map": steps.get("conflict_engine", {}).get("map", {})
             }
-            steps_json = json.dumps(relevant_data, ensure_ascii=False, separators=(',', ':'))
+            steps_json = prompt_json(relevant_data)
             steps_data_section = f"【故事数据】\n{steps_json}\n"
             feedback_section = ""
 
@@ -4,7 +4,6 @@ Main Route Fixer Agent
 """
 from typing import Dict, Any, List, Optional, Union
 import uuid
-import json
 
 from agents.base_agent import BaseAgent
 from prompts.route_planning.main_route_fixer_prompt import (
@@ -12,6 +11,7 @@ from prompts.route_planning.main_route_fixer_prompt import (
     MAIN_ROUTE_FIXER_PROMPT
 )
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class MainRouteFixerAgent(BaseAgent):
@@ -52,8 +52,8 @@ class MainRouteFixerAgent(BaseAgent):
         """
         log.info(f"执行主线框架修复（第{fix_round}轮），共{len(issues)}个问题...")
 
-        route_json = json.dumps(route_framework, ensure_ascii=False, indent=2)
-        issues_json = json.dumps(issues, ensure_ascii=False, indent=2)
+        route_json = prompt_json(route_framework)
+        issues_json = prompt_json(issues)
 
         # 构建轮次信息
         fix_round_info = ""
@@ -12,7 +12,12 @@ from prompts.route_planning.modular_main_route_prompt import (
     MODULAR_MAIN_ROUTE_SYSTEM_PROMPT,
     MODULAR_MAIN_ROUTE_PROMPT
 )
+from utils.entity_index import build_entity_index, prune_entities
 from utils.logger import log
+from utils.json_utils import prompt_json
+
+# 模块点名之外，按检索得分追加的实体数
+MODULE_RETRIEVAL_TOP_K = {"character": 2, "conflict": 3, "escalation_node": 4}
 
 
 class ModuleRouteFramework(BaseModel):
@@ -57,7 +62,8 @@ class ModularMainRouteAgent(BaseAgent):
         route_strategy_text: str = "",
         main_plot_summary: str = "",
         chapters: List[Dict[str, Any]] = None,
-        previous_issues: List[Dict[str, Any]] = None
+        previous_issues: List[Dict[str, Any]] = None,
+        previous_context: Optional[str] = None
     ) -> ModuleRouteFramework:
         """
         处理单个模块的框架规划
@@ -77,6 +83,7 @@ class ModularMainRouteAgent(BaseAgent):
             main_plot_summary: 主线一句话概要
             chapters: 章节规划数组
             previous_issues: 之前检查出的问题列表（修复模式）
+            previous_context: 前序模块上下文（并发模式下由模块策略构建，默认读取已生成模块）
 
         Returns:
             该模块的路线框架
@@ -94,19 +101,17 @@ class ModularMainRouteAgent(BaseAgent):
         chapter_count = chapter_end - chapter_start + 1
         log.info(f"规划{module_name}模块框架（第{chapter_start}-{chapter_end}章，共{chapter_count}章）...")
 
-        # 构建故事数据（确保传递给LLM）
-        story_data_section = ""
-        if steps:
-            import json
-            relevant_data = {
-                "premise": steps.get("premise", {}),
-                "cast_arc": steps.get("cast_arc", {}),
-                "conflict_map": steps.get("conflict_engine", {}).get("map", {})
-            }
-            story_data_section = "\n【故事大纲数据】\n" + json.dumps(relevant_data, ensure_ascii=False, indent=2)
+        # 构建故事数据（确保传递给LLM）：前提、主角和女主完整保留，配角/反派/冲突按本模块检索
+        module_chapters = [
+            ch for ch in (chapters or [])
+            if isinstance(ch, dict) and chapter_start <= ch.get("chapter", 0) <= chapter_end
+        ]
+        story_steps = _select_story_steps(steps, module_strategy, module_chapters)
+        story_data_section = _format_story_data(story_steps)
 
         # 构建上下文信息
-        previous_context = self._build_previous_context(module_name)
+        if previous_context is None:
+            previous_context = self._build_previous_context(module_name)
 
         # 构建修改意见
         feedback_section = ""
@@ -121,24 +126,35 @@ class ModularMainRouteAgent(BaseAgent):
         if not main_plot_summary:
             main_plot_summary = ""
 
+        # 按优先级装进上下文预算：模块策略/修复意见必需，故事数据和其他模块的章节规划可摘要
+        assembler = self._context_assembler(f"{module_name}模块")
+        assembler.add("module_strategy", _format_strategy(module_strategy), priority=0)
+        assembler.add("feedback_section", feedback_section, priority=0)
+        assembler.add("state_framework", _format_state(global_state) if global_state else "{}", priority=0)
+        assembler.add("user_idea", user_idea, priority=0)
+        assembler.add("main_plot_summary", main_plot_summary, priority=0)
+        assembler.add(
+            "chapters", _format_chapters(chapters) if chapters else "[]", priority=1, min_tokens=500,
+            summarize=lambda: _format_chapters(_focus_chapters(chapters, chapter_start, chapter_end), compact=True)
+        )
+        assembler.add("global_branches", _format_branches(global_branches) if global_branches else "[]", priority=1)
+        assembler.add("global_endings", _format_endings(global_endings) if global_endings else "[]", priority=1)
+        assembler.add(
+            "story_data", story_data_section, priority=2, min_tokens=800,
+            summarize=lambda: _format_story_data(story_steps, compact=True)
+        )
+        assembler.add("previous_context", previous_context, priority=2, min_tokens=300)
+        assembler.add("route_strategy_text", route_strategy_text, priority=3, min_tokens=300)
+        context = assembler.assemble()
+
         try:
             result = self.run(
-                user_idea=user_idea,
-                story_data=story_data_section,
-                route_strategy_text=route_strategy_text,
-                main_plot_summary=main_plot_summary,
-                chapters=_format_chapters(chapters) if chapters else "[]",
                 module_name=module_name,
                 module_type=module_type,
                 chapter_start=chapter_start,
                 chapter_end=chapter_end,
                 chapter_count=chapter_count,
-                previous_context=previous_context,
-                module_strategy=_format_strategy(module_strategy),
-                state_framework=_format_state(global_state) if global_state else "{}",
-                global_branches=_format_branches(global_branches) if global_branches else "[]",
-                global_endings=_format_endings(global_endings) if global_endings else "[]",
-                feedback_section=feedback_section
+                **context
             )
 
             # 添加元数据
@@ -188,6 +204,37 @@ class ModularMainRouteAgent(BaseAgent):
 
         return "\n".join(context_parts) if context_parts else "【前序模块】无"
 
+    def build_strategy_context(self, module_name: str, module_strategies: Dict[str, Dict[str, Any]]) -> str:
+        """
+        根据模块策略构建前序模块的上下文（并发模式使用，不依赖已生成的模块）
+
+        Args:
+            module_name: 当前模块名称
+            module_strategies: {模块名: 模块策略}
+
+        Returns:
+            前序模块上下文
+        """
+        module_order = ["起", "承", "转", "合"]
+        current_index = module_order.index(module_name)
+
+        if current_index == 0:
+            return "【前序模块】这是第一个模块（起），没有前序模块的上下文。"
+
+        context_parts = ["【说明】前序模块与本模块并发生成，以下为前序模块的策略规划"]
+        for prev_module in module_order[:current_index]:
+            strategy = module_strategies.get(prev_module)
+            if not strategy:
+                continue
+            chapter_range = strategy.get("chapter_range", {})
+            context_parts.append(f"【{prev_module}模块】")
+            context_parts.append(f"  - 章节范围: 第{chapter_range.get('start', '?')}-{chapter_range.get('end', '?')}章")
+            context_parts.append(f"  - 主线剧情: {strategy.get('main_plot', '')}")
+            context_parts.append(f"  - 分支设计: {strategy.get('branch_design', '')}")
+            context_parts.append(f"  - 好感度区间: {strategy.get('affection_range', '')}")
+
+        return "\n".join(context_parts)
+
     def _build_feedback_section(self, issues: List[Dict[str, Any]]) -> str:
         """构建修复意见部分"""
         feedback = "\n【重要：修复模式】\n"
@@ -280,19 +327,16 @@ class ModularMainRouteAgent(BaseAgent):
 
 def _format_strategy(strategy: Dict[str, Any]) -> str:
     """格式化策略信息"""
-    import json
-    return json.dumps(strategy, ensure_ascii=False, indent=2)
+    return prompt_json(strategy)
 
 
 def _format_state(state: Dict[str, Any]) -> str:
     """格式化状态框架"""
-    import json
-    return json.dumps(state, ensure_ascii=False, indent=2)
+    return prompt_json(state)
 
 
 def _format_branches(branches: List[Dict[str, Any]]) -> str:
     """格式化分支列表"""
-    import json
     # 只输出简要信息
     summary = []
     for br in branches:
@@ -302,12 +346,11 @@ def _format_branches(branches: List[Dict[str, Any]]) -> str:
             "desc": br.get("desc"),
             "return": br.get("return")
         })
-    return json.dumps(summary, ensure_ascii=False, indent=2)
+    return prompt_json(summary)
 
 
 def _format_endings(endings: List[Dict[str, Any]]) -> str:
     """格式化结局列表"""
-    import json
     # 只输出简要信息
     summary = []
     for ed in endings:
@@ -317,10 +360,80 @@ def _format_endings(endings: List[Dict[str, Any]]) -> str:
             "desc": ed.get("desc"),
             "type": ed.get("type")
         })
-    return json.dumps(summary, ensure_ascii=False, indent=2)
+    return prompt_json(summary)
 
 
-def _format_chapters(chapters: List[Dict[str, Any]]) -> str:
+def _format_chapters(chapters: List[Dict[str, Any]], compact: bool = False) -> str:
     """格式化章节规划列表"""
-    import json
-    return json.dumps(chapters, ensure_ascii=False, indent=2)
+    return prompt_json(chapters, drop_empty=compact)
+
+
+def _focus_chapters(chapters: List[Dict[str, Any]], chapter_start: int, chapter_end: int) -> List[Dict[str, Any]]:
+    """本模块章节保留完整规划，其他章节只保留章节号和标题"""
+    focused = []
+    for idx, ch in enumerate(chapters, 1):
+        number = ch.get("chapter", idx) if isinstance(ch, dict) else idx
+        if not isinstance(ch, dict) or (isinstance(number, int) and chapter_start <= number <= chapter_end):
+            focused.append(ch)
+        else:
+            focused.append({"chapter": number, "title": ch.get("title", "")})
+    return focused
+
+
+def _select_story_steps(
+    steps: Dict[str, Any],
+    module_strategy: Dict[str, Any],
+    module_chapters: List[Dict[str, Any]]
+) -> Dict[str, Any]:
+    """
+    按模块策略和本模块章节规划检索相关的角色和冲突
+
+    主角和女主是路线规划的核心，始终保留；配角/反派、冲突、升级节点只保留被点名或检索命中的
+    """
+    if not steps:
+        return steps
+    index = build_entity_index({"steps": steps}, {})
+    query = prompt_json({"strategy": module_strategy, "chapters": module_chapters})
+
+    mentions = [c for ch in module_chapters for c in (ch.get("characters") or [])]
+    core = [
+        entity["id"] for entity in index.entities
+        if entity["kind"] == "character" and entity["data"].get("role_type") in ("protagonist", "heroine")
+    ]
+    characters = index.select("character", query, mentions, top_k=MODULE_RETRIEVAL_TOP_K["character"], core=core)
+    conflicts = index.select(
+        "conflict", query, [ch.get("major_conflict") for ch in module_chapters],
+        top_k=MODULE_RETRIEVAL_TOP_K["conflict"]
+    )
+    nodes = index.select("escalation_node", query, top_k=MODULE_RETRIEVAL_TOP_K["escalation_node"])
+
+    conflict_engine = steps.get("conflict_engine", {})
+    conflict_map = prune_entities(conflict_engine.get("map", {}), "conflict_id", {c["conflict_id"] for c in conflicts})
+    conflict_map = prune_entities(conflict_map, "node_id", {n["node_id"] for n in nodes})
+    return {
+        "premise": steps.get("premise", {}),
+        "cast_arc": prune_entities(
+            steps.get("cast_arc", {}), "character_id", {c.get("character_id") for c in characters}
+        ),
+        "conflict_engine": {**conflict_engine, "map": conflict_map},
+    }
+
+
+def _format_story_data(steps: Dict[str, Any], compact: bool = False) -> str:
+    """
+    格式化故事大纲数据
+
+    compact模式用于超出上下文预算时：去掉空字段，冲突只保留主冲突
+    """
+    if not steps:
+        return ""
+    conflict_map = steps.get("conflict_engine", {}).get("map", {})
+    relevant_data = {
+        "premise": steps.get("premise", {}),
+        "cast_arc": steps.get("cast_arc", {}),
+        "conflict_map": conflict_map
+    }
+    if compact:
+        if isinstance(conflict_map, dict):
+            relevant_data["conflict_map"] = {"main_conflicts": conflict_map.get("main_conflicts", [])}
+    return "\n【故事大纲数据】\n" + prompt_json(relevant_data, drop_empty=compact)
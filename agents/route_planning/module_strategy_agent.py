@@ -13,6 +13,7 @@ from prompts.route_planning.module_strategy_prompt import (
     MODULE_STRATEGY_PROMPT
 )
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class ModuleStrategy(BaseModel):
@@ -72,13 +73,12 @@ class ModuleStrategyAgent(BaseAgent):
         log.info(f"规划四模块策略（总章节数：{total_chapters}）...")
 
         # 构建故事数据
-        import json
         relevant_data = {
             "premise": steps.get("premise", {}),
             "cast_arc": steps.get("cast_arc", {}),
             "conflict_map": steps.get("conflict_engine", {}).get("map", {})
         }
-        steps_json = json.dumps(relevant_data, ensure_ascii=False, separators=(',', ':'))
+        steps_json = prompt_json(relevant_data)
 
         # 如果没有提供路线战略，使用空字符串
         if not route_strategy_text:
@@ -7,7 +7,7 @@ import uuid
 import json
 
 from agents.base_agent import BaseAgent
-from utils.route_consistency_checker import check_route_consistency
+from utils.route_consistency_checker import RouteConsistencyChecker
 from utils.logger import log
 
 
@@ -41,15 +41,22 @@ class RouteConsistencyAgent(BaseAgent):
     # 严重程度
     SEVERITIES = ["low", "medium", "high", "critical"]
 
+    def __init__(self):
+        super().__init__()
+        # 上一次检查的检查器（保留路线索引，供修复后增量复查）
+        self._checker: Optional[RouteConsistencyChecker] = None
+
     def process(
         self,
-        route_framework: Dict[str, Any]
+        route_framework: Dict[str, Any],
+        incremental: bool = False
     ) -> Dict[str, Any]:
         """
         处理路线一致性检查
 
         Args:
             route_framework: 主线框架数据
+            incremental: 是否基于上一次检查增量复查（只重新检查变化的章节/分支/结局）
 
         Returns:
             检查报告
@@ -57,7 +64,11 @@ class RouteConsistencyAgent(BaseAgent):
         log.info("执行路线一致性检查（脚本模式）...")
 
         try:
-            result = check_route_consistency(route_framework)
+            if incremental and self._checker is not None:
+                result = self._checker.recheck(route_framework)
+            else:
+                self._checker = RouteConsistencyChecker(route_framework)
+                result = self._checker.check_all()
 
             if "report_id" not in result:
                 result["report_id"] = f"route_consistency_{uuid.uuid4().hex[:8]}"
@@ -4,14 +4,17 @@ Route Fixer Agent
 """
 from typing import Dict, Any, List, Optional, Union
 import uuid
-import json
 
 from agents.base_agent import BaseAgent
 from prompts.route_planning.route_fixer_prompt import (
     ROUTE_FIXER_SYSTEM_PROMPT,
-    ROUTE_FIXER_PROMPT
+    ROUTE_FIXER_PROMPT,
+    ROUTE_FIXER_WINDOW_HUMAN_PROMPT
 )
 from utils.logger import log
+from utils.json_utils import prompt_json
+from utils.concurrency import run_parallel
+from utils.route_fix_window import RouteFixWindowBuilder, merge_fix_fragments
 
 
 class RouteFixerAgent(BaseAgent):
@@ -25,6 +28,7 @@ class RouteFixerAgent(BaseAgent):
     - 修复数值平衡问题
     - 修复分支跨度问题
     - 修复无效选择问题
+    - 局部窗口修复（只发送问题涉及的章节/分支/结局，并发修复后按ID合并）
     """
 
     name = "RouteFixerAgent"
@@ -51,21 +55,14 @@ class RouteFixerAgent(BaseAgent):
         """
         log.info(f"执行路线修复（第{fix_round}轮），共{len(issues)}个问题...")
 
-        route_json = json.dumps(route_framework, ensure_ascii=False, indent=2)
-        issues_json = json.dumps(issues, ensure_ascii=False, indent=2)
+        route_json = prompt_json(route_framework)
+        issues_json = prompt_json(issues)
 
         try:
-            # 构建轮次信息
-            fix_round_info = ""
-            if fix_round > 1:
-                fix_round_info = f"【修复轮次】这是第{fix_round}轮修复。之前的修复可能没有完全解决问题，请继续修复以下问题。\n"
-            else:
-                fix_round_info = "【修复轮次】这是第1轮修复。请仔细修复以下问题。\n"
-
             result = self.run(
                 route_framework_json=route_json,
                 issues_json=issues_json,
-                fix_round_info=fix_round_info
+                fix_round_info=self._fix_round_info(fix_round)
             )
 
             # 保留原始ID
@@ -83,6 +80,90 @@ class RouteFixerAgent(BaseAgent):
             log.error(f"RouteFixerAgent 处理失败: {e}")
             raise RuntimeError(f"路线修复失败: {e}") from e
 
+    def process_windows(
+        self,
+        route_framework: Dict[str, Any],
+        issues: List[Dict[str, Any]],
+        fix_round: int = 1,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        按局部窗口修复路线
+
+        每个窗口只包含问题location涉及的章节/分支/结局和相邻章节，
+        修复后的片段按ID合并回完整路线，互不重叠的窗口并发修复；
+        有问题无法定位时退回完整修复
+
+        Args:
+            route_framework: 主线框架数据
+            issues: 检查报告中的问题列表
+            fix_round: 当前修复轮次
+            max_workers: 窗口并发数（默认使用 config.LLM_MAX_CONCURRENCY）
+
+        Returns:
+            修复后的主线框架
+        """
+        builder = RouteFixWindowBuilder(route_framework)
+        windows = builder.build(issues)
+        if windows is None:
+            log.info("存在无法定位的问题，使用完整路线修复")
+            return self.process(route_framework, issues, fix_round)
+
+        log.info(f"执行路线局部修复（第{fix_round}轮），{len(issues)}个问题分为{len(windows)}个窗口...")
+        fix_round_info = self._fix_round_info(fix_round)
+
+        def fix_window(window: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+            payload = builder.payload(window)
+            human_prompt = self._format_prompt(
+                ROUTE_FIXER_WINDOW_HUMAN_PROMPT, "window",
+                editable_json=prompt_json(payload["editable"]),
+                context_json=prompt_json(payload["context_chapters"]),
+                route_index_json=prompt_json(payload["route_index"]),
+                issues_json=prompt_json(window["issues"]),
+                fix_round_info=fix_round_info
+            )
+            return self._invoke_with_validation(
+                human_prompt, self._validate_fragment, f"修复窗口({len(window['issues'])}个问题)",
+                retry_hint="请重新输出修复片段。"
+            )
+
+        fragments = run_parallel(fix_window, windows, max_workers)
+        succeeded = [(w, f) for w, f in zip(windows, fragments) if f is not None]
+        if len(succeeded) < len(windows):
+            log.warning(f"{len(windows) - len(succeeded)}个修复窗口失败，对应问题保持原样")
+
+        result, merged = merge_fix_fragments(route_framework, succeeded)
+        result["fixed"] = True
+        result["fix_count"] = sum(len(w["issues"]) for w, _ in succeeded)
+        result["fix_windows"] = len(windows)
+        log.info(f"局部修复合并了{len(merged)}个元素")
+
+        self._log_success(result, result["fix_count"])
+        return result
+
+    def _validate_fragment(self, fragment: Dict[str, Any]) -> Union[bool, str]:
+        """验证修复片段"""
+        if not isinstance(fragment, dict):
+            return "输出必须是JSON对象"
+        for key in ("chapters", "branches", "endings"):
+            items = fragment.get(key, [])
+            if not isinstance(items, list):
+                return f"{key}必须是数组"
+            for idx, item in enumerate(items):
+                if not isinstance(item, dict) or not item.get("id"):
+                    return f"{key}[{idx}]必须是包含id的对象"
+        for idx, chapter in enumerate(fragment.get("chapters", [])):
+            if not isinstance(chapter.get("choices"), list):
+                return f"chapters[{idx}]必须包含choices数组"
+        return True
+
+    @staticmethod
+    def _fix_round_info(fix_round: int) -> str:
+        """构建轮次信息"""
+        if fix_round > 1:
+            return f"【修复轮次】这是第{fix_round}轮修复。之前的修复可能没有完全解决问题，请继续修复以下问题。\n"
+        return "【修复轮次】这是第1轮修复。请仔细修复以下问题。\n"
+
     def _log_success(self, result: Dict[str, Any], issue_count: int) -> None:
         """记录成功日志"""
         log.info(f"路线修复完成")
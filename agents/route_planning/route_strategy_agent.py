@@ -3,14 +3,12 @@ Route Strategy Agent
 路线战略规划 Agent - 提供整体路线架构的战略意见
 """
 import uuid
-import json
 import re
 from typing import Dict, Any, List
 
-from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
 
-from agents.base_agent import BaseAgent
+from agents.base_agent import BaseAgent, ThrottledChatOpenAI
 from prompts.route_planning.route_strategy_prompt import (
     ROUTE_STRATEGY_SYSTEM_PROMPT,
     ROUTE_STRATEGY_HUMAN_PROMPT
@@ -29,8 +27,7 @@ def _format_locations(locations: list) -> str:
             "description": loc.get("description", ""),
             "atmosphere": loc.get("atmosphere", "")
         })
-    import json
-    return json.dumps(location_list, ensure_ascii=False, indent=2)
+    return prompt_json(location_list)
 
 
 def _format_scene_presets(scene_presets: list) -> str:
@@ -45,8 +42,7 @@ def _format_scene_presets(scene_presets: list) -> str:
             "mood": preset.get("mood", ""),
             "color_palette": preset.get("color_palette", [])
         })
-    import json
-    return json.dumps(preset_list, ensure_ascii=False, indent=2)
+    return prompt_json(preset_list)
 
 
 def _format_character_list(cast_arc: dict) -> str:
@@ -89,13 +85,13 @@ def _format_character_list(cast_arc: dict) -> str:
             "role_type": "antagonist"
         })
 
-    return json.dumps(character_list, ensure_ascii=False, indent=2)
+    return prompt_json(character_list)
 
 
 from pydantic import BaseModel, Field
 from utils.config import config
 from utils.logger import log
-from utils.json_utils import safe_parse_json
+from utils.json_utils import prompt_json, safe_parse_json
 
 
 class MajorConflict(BaseModel):
@@ -161,7 +157,7 @@ class RouteStrategyAgent(BaseAgent):
             "cast_arc": steps.get("cast_arc", {}),
             "conflict_map": steps.get("conflict_engine", {}).get("map", {})
         }
-        steps_json = json.dumps(relevant_data, ensure_ascii=False, separators=(',', ':'))
+        steps_json = prompt_json(relevant_data)
 
         # 从world_setting_data中提取locations和scene_presets
         locations = []
@@ -294,7 +290,7 @@ class RouteStrategyAgent(BaseAgent):
     def _run_raw(self, **kwargs) -> str:
         """直接运行LLM获取文本输出（非JSON格式）"""
         # 创建一个不带JSON格式要求的LLM
-        text_llm = ChatOpenAI(
+        text_llm = ThrottledChatOpenAI(
             model=config.LLM_MODEL,
             api_key=config.LLM_API_KEY,
             base_url=config.LLM_BASE_URL,
@@ -303,7 +299,7 @@ class RouteStrategyAgent(BaseAgent):
             timeout=config.LLM_TIMEOUT,
         )
 
-        human_prompt = self.human_prompt_template.format(**kwargs)
+        human_prompt = self._format_prompt(self.human_prompt_template, "raw", **kwargs)
         messages = [
             SystemMessage(content=self.system_prompt),
             HumanMessage(content=human_prompt)
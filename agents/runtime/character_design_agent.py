@@ -2,7 +2,6 @@
 角色设计 Agent
 支持半路创建新角色，或根据剧情需要动态生成角色
 """
-import json
 import uuid
 from typing import Dict, Any, List, Optional, Union
 
@@ -13,6 +12,7 @@ from prompts.runtime.character_design_prompt import (
 )
 from models.runtime.character import RuntimeCharacter, HeroineCharacter, ProtagonistCharacter
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class CharacterDesignAgent(BaseAgent):
@@ -120,7 +120,7 @@ class CharacterDesignAgent(BaseAgent):
             world_context=self._format_world_context(context),
             existing_characters="",  # 不需要
             role_type=character.role_type,
-            current_character_data=json.dumps(current_data, ensure_ascii=False, indent=2),
+            current_character_data=prompt_json(current_data),
             is_refinement=True
         )
 
@@ -4,7 +4,7 @@ GAL游戏剧情细化 Agent - 根据章节大纲生成具体的场景和对话
 """
 import uuid
 import json
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Set
 
 from langchain_openai import ChatOpenAI
 from langchain_core.messages import HumanMessage, SystemMessage
@@ -12,12 +12,18 @@ from langchain_core.messages import HumanMessage, SystemMessage
 from agents.base_agent import BaseAgent
 from prompts.story_orchestration.chapter_detail_prompt import (
     CHAPTER_DETAIL_SYSTEM_PROMPT,
-    CHAPTER_DETAIL_HUMAN_PROMPT
+    CHAPTER_DETAIL_HUMAN_PROMPT,
+    CHAPTER_STITCH_HUMAN_PROMPT,
+    CHAPTER_SKELETON_HUMAN_PROMPT,
+    CHAPTER_SCENE_HUMAN_PROMPT
 )
 from pydantic import BaseModel, Field
 from utils.config import config
 from utils.logger import log
-from utils.json_utils import safe_parse_json
+from utils.json_utils import prompt_json, safe_parse_json, stable_hash
+from utils.concurrency import run_parallel
+from utils.chapter_dependency_graph import ChapterDependencyGraph
+from utils.entity_index import EntityIndex, build_entity_index, prune_entities
 
 
 class SceneEvent(BaseModel):
@@ -46,6 +52,8 @@ class ChapterDetail(BaseModel):
     chapter_id: str = Field(..., description="章节ID")
     characters: List[Dict[str, str]] = Field(default_factory=list, description="本章节出场角色列表")
     scenes: List[Scene] = Field(default_factory=list, description="场景列表")
+    plan_hash: Optional[str] = Field(None, description="章节输入哈希（不含前一章节），用于增量重建")
+    input_hash: Optional[str] = Field(None, description="章节输入哈希（含前一章节结尾）")
 
 
 class ChapterDetailAgent(BaseAgent):
@@ -60,9 +68,26 @@ class ChapterDetailAgent(BaseAgent):
     required_fields = ["scenes"]
     output_model = ChapterDetail
 
+    # prompt版本：prompt文本变化时，已生成章节的哈希随之失效
+    PROMPT_VERSION = stable_hash([
+        CHAPTER_DETAIL_SYSTEM_PROMPT,
+        CHAPTER_DETAIL_HUMAN_PROMPT,
+        CHAPTER_STITCH_HUMAN_PROMPT,
+        CHAPTER_SKELETON_HUMAN_PROMPT,
+        CHAPTER_SCENE_HUMAN_PROMPT
+    ])
+
+    # 路线概览中保留详细信息的前后章节数（超出上下文预算时缩小到ROUTE_SUMMARY_RADIUS）
+    ROUTE_OVERVIEW_RADIUS = 3
+    ROUTE_SUMMARY_RADIUS = 1
+
+    # 章节规划点名之外，按检索得分追加的实体数
+    RETRIEVAL_TOP_K = {"conflict": 2, "escalation_node": 2, "location": 1, "scene_preset": 3}
+
     def __init__(self):
         super().__init__()
         self.generated_chapters = {}  # 存储已生成的章节
+        self._route_overview_cache: Dict[str, Any] = {}  # 预先序列化的路线概览片段
 
     def process(
         self,
@@ -71,7 +96,9 @@ class ChapterDetailAgent(BaseAgent):
         story_outline_data: Dict[str, Any],
         world_setting_data: Dict[str, Any],
         previous_chapter: Optional[Dict[str, Any]] = None,
-        user_idea: str = ""
+        user_idea: str = "",
+        scene_level: bool = False,
+        max_workers: Optional[int] = None
     ) -> ChapterDetail:
         """
         生成章节详情
@@ -83,6 +110,8 @@ class ChapterDetailAgent(BaseAgent):
             world_setting_data: 世界观设定数据
             previous_chapter: 前一章节详情（可选）
             user_idea: 用户创意
+            scene_level: 是否分幕生成（先生成骨架，再并发生成每一幕）
+            max_workers: 分幕生成的并发数
 
         Returns:
             章节详情
@@ -100,85 +129,399 @@ class ChapterDetailAgent(BaseAgent):
         if not steps:
             raise ValueError("story_outline_data中缺少steps数据")
 
-        if not user_idea:
-            user_idea = story_outline_data.get("input", {}).get("user_idea", "")
-
         chapter_num = chapter_plan.get("chapter", 0)
         chapter_id = chapter_plan.get("id", "")
         log.info(f"生成第{chapter_num}章详情 ({chapter_id})...")
 
+        prompt_context = self._build_prompt_context(
+            chapter_plan, route_strategy_data, story_outline_data, world_setting_data,
+            previous_chapter, user_idea
+        )
+        # 哈希基于完整输入计算，预算裁剪只影响发送给LLM的内容
+        budgeted_context = self._fit_prompt_context(prompt_context, chapter_num)
+
+        try:
+            if scene_level:
+                result = self._generate_by_scenes(budgeted_context, chapter_num, max_workers)
+            else:
+                result = self.run(**budgeted_context)
+
+            # 添加元数据
+            result["chapter"] = chapter_num
+            result["chapter_id"] = chapter_id
+            result["plan_hash"] = self._plan_hash(prompt_context)
+            result["input_hash"] = self._input_hash(result["plan_hash"], prompt_context["previous_chapter"])
+
+            detail = ChapterDetail(**result)
+
+            # 保存已生成的章节
+            self.generated_chapters[chapter_id] = detail
+
+            self._log_success(detail)
+            return detail
+
+        except Exception as e:
+            log.error(f"ChapterDetailAgent 生成第{chapter_num}章失败: {e}")
+            raise RuntimeError(f"章节详情生成失败: {e}") from e
+
+    def _build_prompt_context(
+        self,
+        chapter_plan: Dict[str, Any],
+        route_strategy_data: Dict[str, Any],
+        story_outline_data: Dict[str, Any],
+        world_setting_data: Dict[str, Any],
+        previous_chapter: Optional[Dict[str, Any]] = None,
+        user_idea: str = ""
+    ) -> Dict[str, str]:
+        """构建章节生成所需的prompt变量"""
+        steps = story_outline_data.get("steps", {})
+
+        if not user_idea:
+            user_idea = story_outline_data.get("input", {}).get("user_idea", "")
+
+        # 按章节规划检索相关实体：前提完整保留，角色/冲突/场景/场景预设只保留本章相关的
+        index = build_entity_index(story_outline_data, world_setting_data)
+        query = json.dumps(chapter_plan, ensure_ascii=False)
+        character_ids = self._select_character_ids(index, chapter_plan, query)
+        cast_arc = self._select_cast_arc(steps.get("cast_arc", {}), character_ids)
+
         # 构建故事数据（只传递需要的部分）
         relevant_data = {
             "premise": steps.get("premise", {}),
-            "cast_arc": steps.get("cast_arc", {}),
-            "conflict_map": steps.get("conflict_engine", {}).get("map", {})
+            "cast_arc": cast_arc,
+            "conflict_map": self._select_conflict_map(
+                index, steps.get("conflict_engine", {}).get("map", {}), chapter_plan, query
+            )
         }
-        steps_json = json.dumps(relevant_data, ensure_ascii=False, separators=(',', ':'))
+        steps_json = prompt_json(relevant_data)
 
-        # 提取完整路线战略（所有章节概览）
+        # 路线概览：当前章节前后几章详细，其余每章一行（各章节片段每次运行只序列化一次）
         route_strategy = route_strategy_data.get("steps", {}).get("route_strategy", {})
-        all_chapters = route_strategy.get("chapters", [])
-        major_conflicts = route_strategy.get("major_conflicts", [])
-        main_plot_summary = route_strategy.get("main_plot_summary", "")
-
-        # 格式化完整路线战略（简要版，节省token）
-        full_route_strategy = self._format_full_route_strategy(all_chapters, major_conflicts, main_plot_summary)
-
-        # 提取locations
-        key_elements = world_setting_data.get("key_elements", {})
-        if isinstance(key_elements, dict):
-            locations = key_elements.get("locations", [])
-        else:
-            locations = []
-
-        # 提取scene_presets
-        atmosphere = world_setting_data.get("atmosphere", {})
-        if isinstance(atmosphere, dict):
-            scene_presets = atmosphere.get("scene_presets", [])
-        else:
-            scene_presets = []
+        full_route_strategy = self._format_full_route_strategy(
+            self._route_overview(route_strategy), chapter_plan.get("chapter", 0), self.ROUTE_OVERVIEW_RADIUS
+        )
+
+        # 提取本章场景和场景预设
+        locations = index.select(
+            "location", query, [chapter_plan.get("location")], top_k=self.RETRIEVAL_TOP_K["location"]
+        )
+        scene_presets = index.select("scene_preset", query, top_k=self.RETRIEVAL_TOP_K["scene_preset"])
 
         # 提取character_list
-        cast_arc = steps.get("cast_arc", {})
         character_list = self._format_character_list(cast_arc)
 
-        # 格式化数据
-        chapter_plan_json = json.dumps(chapter_plan, ensure_ascii=False, indent=2)
-        locations_json = self._format_locations(locations)
-        scene_presets_json = self._format_scene_presets(scene_presets)
-
         # 格式化前一章节
         previous_chapter_json = "[]"  # 默认为空
         if previous_chapter:
             previous_chapter_json = self._format_previous_chapter(previous_chapter)
 
-        try:
-            result = self.run(
-                user_idea=user_idea,
-                steps_data=steps_json,
-                full_route_strategy=full_route_strategy,
-                chapter_plan=chapter_plan_json,
-                locations=locations_json,
-                scene_presets=scene_presets_json,
-                character_list=character_list,
-                previous_chapter=previous_chapter_json
+        return {
+            "user_idea": user_idea,
+            "steps_data": steps_json,
+            "full_route_strategy": full_route_strategy,
+            "chapter_plan": prompt_json(chapter_plan),
+            "locations": self._format_locations(locations),
+            "scene_presets": self._format_scene_presets(scene_presets),
+            "character_list": character_list,
+            "previous_chapter": previous_chapter_json
+        }
+
+    def _select_character_ids(self, index: EntityIndex, chapter_plan: Dict[str, Any], query: str) -> Set[str]:
+        """本章相关角色ID：主角 + 章节规划点名的角色"""
+        selected = index.select("character", query, chapter_plan.get("characters") or [])
+        ids = {c.get("character_id") for c in selected if c.get("character_id")}
+        ids.update(
+            entity["id"] for entity in index.entities
+            if entity["kind"] == "character" and entity["data"].get("role_type") == "protagonist"
+        )
+        return ids
+
+    def _select_cast_arc(self, cast_arc: Dict[str, Any], character_ids: Set[str]) -> Dict[str, Any]:
+        """裁剪角色弧光：只保留相关角色及其之间的关系"""
+        if not cast_arc:
+            return {}
+        selected = prune_entities(cast_arc, "character_id", character_ids)
+        matrix = cast_arc.get("relationship_matrix")
+        if isinstance(matrix, dict):
+            selected["relationship_matrix"] = {
+                a: {b: desc for b, desc in row.items() if b in character_ids} if isinstance(row, dict) else row
+                for a, row in matrix.items() if a in character_ids
+            }
+        return selected
+
+    def _select_conflict_map(
+        self,
+        index: EntityIndex,
+        conflict_map: Dict[str, Any],
+        chapter_plan: Dict[str, Any],
+        query: str
+    ) -> Dict[str, Any]:
+        """裁剪冲突设定：本章大冲突 + 检索到的相关冲突和升级节点，冲突链/规则等整体约束保留"""
+        if not conflict_map:
+            return {}
+        conflicts = index.select(
+            "conflict", query, [chapter_plan.get("major_conflict")], top_k=self.RETRIEVAL_TOP_K["conflict"]
+        )
+        nodes = index.select("escalation_node", query, top_k=self.RETRIEVAL_TOP_K["escalation_node"])
+        selected = prune_entities(conflict_map, "conflict_id", {c["conflict_id"] for c in conflicts})
+        return prune_entities(selected, "node_id", {n["node_id"] for n in nodes})
+
+    def _fit_prompt_context(self, prompt_context: Dict[str, str], chapter_num: int) -> Dict[str, str]:
+        """
+        按优先级把prompt变量装进上下文预算
+
+        章节规划、角色列表必需；前一章节次之；超出预算时先把故事大纲数据摘要为前提+角色，
+        把路线概览的详细范围缩小到前后一章，再截断场景预设/场景列表等低优先级内容
+        """
+        def summarize_steps() -> str:
+            data = json.loads(prompt_context["steps_data"])
+            data.pop("conflict_map", None)
+            return prompt_json(data, drop_empty=True)
+
+        def summarize_route() -> str:
+            summary = json.loads(prompt_context["full_route_strategy"])
+            summary["chapters_overview"] = [
+                ch if not isinstance(ch, dict) or abs(ch.get("chapter", 0) - chapter_num) <= self.ROUTE_SUMMARY_RADIUS
+                else self._overview_line(ch)
+                for ch in summary.get("chapters_overview", [])
+            ]
+            return prompt_json(summary, drop_empty=True)
+
+        assembler = self._context_assembler(f"第{chapter_num}章")
+        assembler.add("user_idea", prompt_context["user_idea"], priority=0)
+        assembler.add("chapter_plan", prompt_context["chapter_plan"], priority=0)
+        assembler.add("character_list", prompt_context["character_list"], priority=0)
+        assembler.add("previous_chapter", prompt_context["previous_chapter"], priority=1)
+        assembler.add("steps_data", prompt_context["steps_data"], priority=2,
+                      min_tokens=500, summarize=summarize_steps)
+        assembler.add("locations", prompt_context["locations"], priority=2, min_tokens=200)
+        assembler.add("full_route_strategy", prompt_context["full_route_strategy"], priority=3,
+                      min_tokens=300, summarize=summarize_route)
+        assembler.add("scene_presets", prompt_context["scene_presets"], priority=4, min_tokens=100)
+        return {**prompt_context, **assembler.assemble()}
+
+    def compute_plan_hash(
+        self,
+        chapter_plan: Dict[str, Any],
+        route_strategy_data: Dict[str, Any],
+        story_outline_data: Dict[str, Any],
+        world_setting_data: Dict[str, Any]
+    ) -> str:
+        """
+        计算章节输入哈希（不含前一章节）
+
+        包含章节规划、与本章相关的故事大纲实体、场景/预设和prompt版本；
+        不包含全部章节概览，修改某一章的规划不会使其他章节失效
+
+        Returns:
+            章节输入哈希
+        """
+        prompt_context = self._build_prompt_context(
+            chapter_plan, route_strategy_data, story_outline_data, world_setting_data
+        )
+        return self._plan_hash(prompt_context)
+
+    def compute_input_hash(self, plan_hash: str, previous_chapter: Optional[Dict[str, Any]]) -> str:
+        """
+        计算包含前一章节结尾的输入哈希（与生成/衔接时记录的input_hash一致）
+
+        Args:
+            plan_hash: 章节输入哈希（不含前一章节）
+            previous_chapter: 前一章节详情（无前一章节时为None）
+
+        Returns:
+            章节输入哈希
+        """
+        if previous_chapter and hasattr(previous_chapter, "model_dump"):
+            previous_chapter = previous_chapter.model_dump()
+        return self._input_hash(plan_hash, self._format_previous_chapter(previous_chapter))
+
+    def _plan_hash(self, prompt_context: Dict[str, str]) -> str:
+        """计算prompt变量的哈希（排除全部章节概览和前一章节）"""
+        hashed = {
+            key: value for key, value in prompt_context.items()
+            if key not in ("full_route_strategy", "previous_chapter")
+        }
+        hashed["prompt_version"] = self.PROMPT_VERSION
+        return stable_hash(hashed)
+
+    def _input_hash(self, plan_hash: str, previous_chapter_json: str) -> str:
+        """计算包含前一章节结尾的输入哈希"""
+        return stable_hash({"plan_hash": plan_hash, "previous_chapter": previous_chapter_json})
+
+    def _generate_by_scenes(
+        self,
+        prompt_context: Dict[str, str],
+        chapter_num: int,
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        分幕生成章节
+
+        先用一次短调用生成分幕骨架，再并发生成每一幕的事件。
+        每一幕单独用Scene校验，失败只重试这一幕，不会导致整章重新生成
+
+        Args:
+            prompt_context: 章节prompt变量
+            chapter_num: 章节号
+            max_workers: 分幕并发数（默认使用 config.LLM_MAX_CONCURRENCY）
+
+        Returns:
+            章节数据（characters + scenes）
+        """
+        # 1. 分幕骨架
+        skeleton_prompt = self._format_prompt(
+            CHAPTER_SKELETON_HUMAN_PROMPT, "skeleton",
+            user_idea=prompt_context["user_idea"],
+            steps_data=prompt_context["steps_data"],
+            full_route_strategy=prompt_context["full_route_strategy"],
+            chapter_plan=prompt_context["chapter_plan"],
+            locations=prompt_context["locations"],
+            character_list=prompt_context["character_list"],
+            previous_chapter=prompt_context["previous_chapter"]
+        )
+        skeleton = self._invoke_with_validation(
+            skeleton_prompt, self._validate_skeleton, f"第{chapter_num}章分幕骨架",
+            max_rounds=self._config.max_redo_rounds
+        )
+        if skeleton is None:
+            raise RuntimeError(f"第{chapter_num}章分幕骨架生成失败")
+
+        skeleton_scenes = skeleton["scenes"]
+        for idx, scene_skeleton in enumerate(skeleton_scenes, 1):
+            scene_skeleton["scene"] = idx
+        log.info(f"第{chapter_num}章分幕骨架: {len(skeleton_scenes)}幕")
+
+        chapter_skeleton_json = prompt_json(skeleton_scenes)
+
+        # 2. 并发生成每一幕
+        def generate_scene(scene_skeleton: Dict[str, Any]) -> Dict[str, Any]:
+            scene_num = scene_skeleton["scene"]
+            scene_prompt = self._format_prompt(
+                CHAPTER_SCENE_HUMAN_PROMPT, "scene",
+                chapter_plan=prompt_context["chapter_plan"],
+                chapter_skeleton=chapter_skeleton_json,
+                scene_skeleton=prompt_json(scene_skeleton),
+                locations=prompt_context["locations"],
+                scene_presets=prompt_context["scene_presets"],
+                character_list=prompt_context["character_list"],
+                previous_chapter=prompt_context["previous_chapter"] if scene_num == 1 else "[]"
             )
 
-            # 添加元数据
-            result["chapter"] = chapter_num
-            result["chapter_id"] = chapter_id
+            def validate_scene(scene: Dict[str, Any]):
+                scene["scene"] = scene_num
+                return self._pydantic_validate(scene, Scene)
 
-            detail = ChapterDetail(**result)
+            scene = self._invoke_with_validation(
+                scene_prompt, validate_scene, f"第{chapter_num}章第{scene_num}幕"
+            )
+            if scene is None:
+                raise RuntimeError(f"第{chapter_num}章第{scene_num}幕生成失败")
+            return scene
 
-            # 保存已生成的章节
-            self.generated_chapters[chapter_id] = detail
+        scenes = run_parallel(generate_scene, skeleton_scenes, max_workers)
 
-            self._log_success(detail)
+        return {
+            "characters": skeleton.get("characters", []),
+            "scenes": scenes
+        }
+
+    def _validate_skeleton(self, skeleton: Dict[str, Any]) -> bool | str:
+        """验证分幕骨架"""
+        scenes = skeleton.get("scenes")
+        if not isinstance(scenes, list) or not scenes:
+            return "scenes必须是非空数组"
+
+        for idx, scene in enumerate(scenes):
+            if not isinstance(scene, dict):
+                return f"scenes[{idx}]必须是对象"
+            for field in ("title", "location", "time_of_day", "purpose"):
+                if not scene.get(field):
+                    return f"scenes[{idx}]缺少{field}字段"
+
+        characters = skeleton.get("characters", [])
+        if not isinstance(characters, list):
+            return "characters必须是数组"
+
+        return True
+
+    def stitch_opening(
+        self,
+        chapter_detail: Dict[str, Any],
+        previous_chapter: Optional[Dict[str, Any]],
+        chapter_plan: Dict[str, Any],
+        story_outline_data: Dict[str, Any]
+    ) -> ChapterDetail:
+        """
+        衔接章节开场
+
+        并发生成的章节不知道前一章的真实结尾，这里只改写第一幕，
+        使其承接前一章的结尾，其余幕保持不变
+
+        Args:
+            chapter_detail: 当前章节详情（已生成）
+            previous_chapter: 前一章节详情（真实结尾）
+            chapter_plan: 当前章节规划
+            story_outline_data: 故事大纲数据
+
+        Returns:
+            衔接后的章节详情（改写失败时返回原章节）
+        """
+        if hasattr(chapter_detail, "model_dump"):
+            chapter_detail = chapter_detail.model_dump()
+        if previous_chapter and hasattr(previous_chapter, "model_dump"):
+            previous_chapter = previous_chapter.model_dump()
+
+        detail = ChapterDetail(**chapter_detail)
+        scenes = chapter_detail.get("scenes", [])
+        if not previous_chapter or not scenes:
             return detail
 
-        except Exception as e:
-            log.error(f"ChapterDetailAgent 生成第{chapter_num}章失败: {e}")
-            raise RuntimeError(f"章节详情生成失败: {e}") from e
+        chapter_id = chapter_detail.get("chapter_id", "")
+        log.info(f"衔接第{chapter_detail.get('chapter', 0)}章开场 ({chapter_id})...")
+
+        opening_scene = scenes[0]
+        next_scene = {}
+        if len(scenes) > 1:
+            next_scene = {
+                "title": scenes[1].get("title", ""),
+                "location": scenes[1].get("location", ""),
+                "time_of_day": scenes[1].get("time_of_day", ""),
+                "narration": scenes[1].get("narration", "")
+            }
+
+        cast_arc = story_outline_data.get("steps", {}).get("cast_arc", {})
+        stitch_prompt = self._format_prompt(
+            CHAPTER_STITCH_HUMAN_PROMPT, "stitch",
+            chapter_plan=prompt_json(chapter_plan),
+            character_list=self._format_character_list(cast_arc),
+            previous_chapter=self._format_previous_chapter(previous_chapter),
+            opening_scene=prompt_json(opening_scene),
+            next_scene=prompt_json(next_scene) if next_scene else "（本章只有一幕）"
+        )
+
+        def validate_scene(scene: Dict[str, Any]):
+            scene["scene"] = opening_scene.get("scene", 1)
+            return self._pydantic_validate(scene, Scene)
+
+        scene = self._invoke_with_validation(
+            stitch_prompt, validate_scene, f"第{chapter_detail.get('chapter', 0)}章开场衔接",
+            max_rounds=self._config.max_redo_rounds
+        )
+        if scene is not None:
+            stitched = dict(chapter_detail)
+            stitched["scenes"] = [scene] + scenes[1:]
+            if stitched.get("plan_hash"):
+                stitched["input_hash"] = self._input_hash(
+                    stitched["plan_hash"], self._format_previous_chapter(previous_chapter)
+                )
+            detail = ChapterDetail(**stitched)
+            self.generated_chapters[chapter_id] = detail
+            log.success(f"第{detail.chapter}章开场衔接完成")
+            return detail
+
+        log.warning(f"第{chapter_detail.get('chapter', 0)}章开场衔接失败，保留原开场")
+        return detail
 
     def _format_locations(self, locations: list) -> str:
         """格式化场景列表"""
@@ -192,7 +535,7 @@ class ChapterDetailAgent(BaseAgent):
                 "description": loc.get("description", ""),
                 "atmosphere": loc.get("atmosphere", "")
             })
-        return json.dumps(location_list, ensure_ascii=False, indent=2)
+        return prompt_json(location_list)
 
     def _format_scene_presets(self, scene_presets: list) -> str:
         """格式化场景预设列表"""
@@ -206,7 +549,7 @@ class ChapterDetailAgent(BaseAgent):
                 "mood": preset.get("mood", ""),
                 "color_palette": preset.get("color_palette", [])
             })
-        return json.dumps(preset_list, ensure_ascii=False, indent=2)
+        return prompt_json(preset_list)
 
     def _format_character_list(self, cast_arc: dict) -> str:
         """格式化角色列表"""
@@ -256,37 +599,71 @@ class ChapterDetailAgent(BaseAgent):
                 "initial_state": antagonist.get("initial_state", "")
             })
 
-        return json.dumps(character_list, ensure_ascii=False, indent=2)
+        return prompt_json(character_list)
 
-    def _format_full_route_strategy(self, all_chapters: list, major_conflicts: list, main_plot_summary: str) -> str:
-        """格式化完整路线战略（简要版，用于了解整体结构）"""
-        # 只保留关键信息，节省token
-        summary = {
-            "main_plot_summary": main_plot_summary,
+    def _route_overview(self, route_strategy: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        预先序列化路线概览片段（同一份路线战略只序列化一次，之后各章节直接拼接）
+
+        Returns:
+            {header: 主线概要/大冲突, numbers: 章节号, details: 详细片段, lines: 单行片段}
+        """
+        cached = self._route_overview_cache
+        if cached.get("source") is route_strategy:
+            return cached
+
+        all_chapters = route_strategy.get("chapters", [])
+        header = prompt_json({
+            "main_plot_summary": route_strategy.get("main_plot_summary", ""),
             "total_chapters": len(all_chapters),
             "major_conflicts": [
                 {
                     "name": mc.get("name", ""),
                     "position_chapter": mc.get("position_chapter", "")
                 }
-                for mc in major_conflicts
-            ],
-            "chapters_overview": [
-                {
-                    "chapter": ch.get("chapter", 0),
-                    "id": ch.get("id", ""),
-                    "title": ch.get("title", ""),
-                    "story_phase": ch.get("story_phase", ""),
-                    "location": ch.get("location", ""),
-                    "time_of_day": ch.get("time_of_day", ""),
-                    "characters": ch.get("characters", []),
-                    "goal": ch.get("goal", ""),
-                    "mood": ch.get("mood", "")
-                }
-                for ch in all_chapters
+                for mc in route_strategy.get("major_conflicts", [])
             ]
+        })
+
+        details, lines = [], []
+        for ch in all_chapters:
+            details.append(prompt_json({
+                "chapter": ch.get("chapter", 0),
+                "id": ch.get("id", ""),
+                "title": ch.get("title", ""),
+                "story_phase": ch.get("story_phase", ""),
+                "location": ch.get("location", ""),
+                "time_of_day": ch.get("time_of_day", ""),
+                "characters": ch.get("characters", []),
+                "goal": ch.get("goal", ""),
+                "mood": ch.get("mood", "")
+            }, drop_empty=True))
+            lines.append(prompt_json(self._overview_line(ch)))
+
+        self._route_overview_cache = {
+            "source": route_strategy,
+            "header": header[:-1],
+            "numbers": [ch.get("chapter", 0) for ch in all_chapters],
+            "details": details,
+            "lines": lines,
         }
-        return json.dumps(summary, ensure_ascii=False, indent=2)
+        return self._route_overview_cache
+
+    @staticmethod
+    def _overview_line(chapter: Dict[str, Any]) -> str:
+        """单行章节概览"""
+        line = f"第{chapter.get('chapter', 0)}章 {chapter.get('title', '')}"
+        if chapter.get("mood"):
+            line += f"（{chapter['mood']}）"
+        return line
+
+    def _format_full_route_strategy(self, overview: Dict[str, Any], chapter_num: int, radius: int) -> str:
+        """格式化路线概览（简要版，用于了解整体结构）：前后radius章详细，其余每章一行"""
+        entries = [
+            detail if isinstance(number, int) and abs(number - chapter_num) <= radius else line
+            for number, detail, line in zip(overview["numbers"], overview["details"], overview["lines"])
+        ]
+        return overview["header"] + ',"chapters_overview":[\n' + ",\n".join(entries) + "\n]}"
 
     def _format_previous_chapter(self, prev_chapter: Dict[str, Any]) -> str:
         """格式化前一章节（只提供简要信息）"""
@@ -309,7 +686,7 @@ class ChapterDetailAgent(BaseAgent):
             }
         }
 
-        return json.dumps(summary, ensure_ascii=False, indent=2)
+        return prompt_json(summary)
 
     def _log_success(self, detail: ChapterDetail) -> None:
         """记录成功日志"""
@@ -319,9 +696,29 @@ class ChapterDetailAgent(BaseAgent):
         total_events = sum(len(scene.events) for scene in detail.scenes)
         log.info(f"  事件数: {total_events}")
 
-    def get_previous_chapter(self, current_chapter_id: str) -> Optional[Dict[str, Any]]:
-        """获取前一章节（按顺序）"""
-        # 这里假设chapter_id格式为common_ch1, common_ch2等
+    def get_previous_chapter(
+        self,
+        current_chapter_id: str,
+        dependency_graph: Optional[ChapterDependencyGraph] = None
+    ) -> Optional[Dict[str, Any]]:
+        """
+        获取前一章节
+
+        Args:
+            current_chapter_id: 当前章节ID
+            dependency_graph: 章节依赖图（提供时使用主前驱，支持分支/个人线章节）
+
+        Returns:
+            前一章节详情（未生成时返回None）
+        """
+        if dependency_graph is not None and current_chapter_id in dependency_graph:
+            prev_id = dependency_graph.primary_predecessor(current_chapter_id)
+            prev_chapter = self.generated_chapters.get(prev_id) if prev_id else None
+            if prev_chapter and hasattr(prev_chapter, "model_dump"):
+                return prev_chapter.model_dump()
+            return prev_chapter
+
+        # 按顺序：假设chapter_id格式为common_ch1, common_ch2等
         try:
             chapter_num = int(current_chapter_id.replace("common_ch", ""))
             prev_num = chapter_num - 1
@@ -355,6 +752,14 @@ class ChapterDetailAgent(BaseAgent):
 
         return True
 
+    def register_chapter(self, chapter_detail: Dict[str, Any]) -> ChapterDetail:
+        """登记已有章节（如上次运行复用的章节），供后续章节承接"""
+        if hasattr(chapter_detail, "model_dump"):
+            chapter_detail = chapter_detail.model_dump()
+        detail = ChapterDetail(**chapter_detail)
+        self.generated_chapters[detail.chapter_id] = detail
+        return detail
+
     def clear(self):
         """清除已生成的章节数据"""
         self.generated_chapters.clear()
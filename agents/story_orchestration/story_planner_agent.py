@@ -2,9 +2,10 @@
 完整故事规划 Agent
 根据大纲生成 10-20 章完整故事，支持动态调整
 """
-from typing import Any, Dict, Union, List
+from typing import Any, Dict, Union, List, Optional
 from agents.base_agent import BaseAgent
 from models.runtime.story_plan import StoryDirection
+from utils.json_utils import prompt_json
 from prompts.story_orchestration.story_planner_prompt import (
     get_story_planner_prompts,
     STORY_PLANNER_SYSTEM_PROMPT,
@@ -22,6 +23,9 @@ class StoryPlannerAgent(BaseAgent):
     required_fields = ["plan_id", "chapters"]
     output_model = StoryDirection
 
+    # 上下文超出预算时保留的最近时间线条数
+    RECENT_HISTORY = 20
+
     def validate_output(self, output: Dict[str, Any]) -> Union[bool, str]:
         """验证输出格式"""
         if "chapters" not in output:
@@ -55,6 +59,42 @@ class StoryPlannerAgent(BaseAgent):
 
         return True
 
+    def plan_story(
+        self,
+        outline: Dict[str, Any],
+        world_setting: Dict[str, Any],
+        characters: List[Dict[str, Any]],
+        conflicts: Optional[List[Dict[str, Any]]] = None,
+        timeline_history: Optional[List[Dict[str, Any]]] = None,
+        character_states: Optional[Dict[str, Any]] = None,
+        chapter_count: int = 15
+    ) -> Dict[str, Any]:
+        """生成完整故事规划（各段上下文按优先级装进预算）
+
+        Args:
+            outline: 故事大纲
+            world_setting: 世界观设定
+            characters: 角色列表
+            conflicts: 冲突列表
+            timeline_history: 当前时间线历史
+            character_states: 当前角色状态
+            chapter_count: 章节数
+
+        Returns:
+            故事规划
+        """
+        assembler = self._context_assembler()
+        assembler.add("outline", prompt_json(outline), priority=0)
+        assembler.add("characters", prompt_json(characters), priority=1, min_tokens=500)
+        assembler.add("character_states", prompt_json(character_states or {}), priority=1, min_tokens=300)
+        assembler.add("conflicts", prompt_json(conflicts or []), priority=2, min_tokens=500)
+        assembler.add("world_setting", prompt_json(world_setting), priority=2, min_tokens=800)
+        assembler.add(
+            "timeline_history", prompt_json(timeline_history or []), priority=3, min_tokens=300,
+            summarize=lambda: prompt_json((timeline_history or [])[-self.RECENT_HISTORY:], drop_empty=True)
+        )
+        return self.run(chapter_count=chapter_count, **assembler.assemble())
+
     def adjust_story(
         self,
         original_plan: Dict[str, Any],
@@ -75,18 +115,29 @@ class StoryPlannerAgent(BaseAgent):
         Returns:
             调整后的故事规划
         """
-        import json
         from langchain_core.messages import HumanMessage, SystemMessage
 
+        # 原规划必需；已完成章节超出预算时只保留章节号/标题/目标
+        assembler = self._context_assembler(f"{self._config.name}调整")
+        assembler.add("original_plan", prompt_json(original_plan), priority=0)
+        assembler.add("player_choices", prompt_json(player_choices), priority=1)
+        assembler.add("character_states", prompt_json(character_states), priority=1)
+        assembler.add(
+            "completed_chapters", prompt_json(completed_chapters),
+            priority=2, min_tokens=300,
+            summarize=lambda: prompt_json([
+                {key: ch.get(key) for key in ("chapter_number", "title", "goal")} for ch in completed_chapters
+            ], drop_empty=True)
+        )
+        assembler.add(
+            "timeline_history", prompt_json(timeline_history),
+            priority=3, min_tokens=300,
+            summarize=lambda: prompt_json(timeline_history[-self.RECENT_HISTORY:], drop_empty=True)
+        )
+
         messages = [
             SystemMessage(content=self._config.system_prompt),
-            HumanMessage(content=STORY_PLANNER_ADJUST_PROMPT.format(
-                original_plan=json.dumps(original_plan, ensure_ascii=False, indent=2),
-                completed_chapters=json.dumps(completed_chapters, ensure_ascii=False, indent=2),
-                timeline_history=json.dumps(timeline_history, ensure_ascii=False, indent=2),
-                character_states=json.dumps(character_states, ensure_ascii=False, indent=2),
-                player_choices=json.dumps(player_choices, ensure_ascii=False, indent=2)
-            ))
+            HumanMessage(content=self._format_prompt(STORY_PLANNER_ADJUST_PROMPT, "adjust", **assembler.assemble()))
         ]
 
         response = self._llm.invoke(messages)
@@ -2,18 +2,20 @@
 Cast Arc Agent
 角色弧光 Agent - 建立人物弧光（起点-裂缝-需求-误区-转变-结局）
 """
-import json
+import re
 import uuid
-from typing import Dict, Any, List, Optional, Union
+from typing import Dict, Any, Iterable, Iterator, List, Optional, Tuple, Union
 from copy import deepcopy
 
 from agents.base_agent import BaseAgent
 from prompts.story_outline.cast_arc_prompt import (
     CAST_ARC_SYSTEM_PROMPT,
-    CAST_ARC_HUMAN_PROMPT
+    CAST_ARC_HUMAN_PROMPT,
+    CAST_ARC_CHARACTER_FIX_PROMPT
 )
 from models.story_outline.cast_arc import CastArc
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class CastArcAgent(BaseAgent):
@@ -39,6 +41,14 @@ class CastArcAgent(BaseAgent):
     ARC_TYPES = ["positive", "negative", "flat", "tragic", "redemptive"]
     # 关系类型
     RELATIONSHIP_TYPES = ["love_interest", "mentor", "rival", "ally", "family", "enemy", "complex"]
+    # 角色分组（protagonist为单个角色，其余为列表）
+    CAST_COLLECTIONS = ["protagonist", "heroines", "supporting_cast", "antagonists"]
+    # 主角必需字段
+    REQUIRED_CHARACTER_FIELDS = [
+        "character_id", "character_name", "role_type",
+        "initial_state", "surface_goal", "deep_need",
+        "character_arc_type", "final_state"
+    ]
 
     def process(
         self,
@@ -79,7 +89,7 @@ class CastArcAgent(BaseAgent):
 
         # 构建prompt字符串
         world_setting_str = self._format_world_setting_for_prompt(steps)
-        premise_str = json.dumps(premise_json, ensure_ascii=False, indent=2)
+        premise_str = prompt_json(premise_json)
 
         try:
             result = self.run(
@@ -104,6 +114,160 @@ class CastArcAgent(BaseAgent):
             log.error(f"CastArcAgent 处理失败: {e}")
             raise RuntimeError(f"角色弧光生成失败: {e}") from e
 
+    def redo_characters(
+        self,
+        world_setting_json: Dict[str, Any],
+        premise_json: Dict[str, Any],
+        cast_arc: Union[CastArc, Dict[str, Any]],
+        character_ids: List[str],
+        user_idea: str = "",
+        fix_instructions: str = ""
+    ) -> CastArc:
+        """
+        只重新生成指定角色，按character_id合并回原角色弧光
+
+        其余角色只以ID/名称/类型/势力的概览提供给LLM；character_id和role_type保持不变，
+        relationship_matrix中只替换被重新生成角色的行
+
+        Args:
+            world_setting_json: 完整的世界观数据
+            premise_json: 故事前提数据
+            cast_arc: 当前角色弧光
+            character_ids: 需要重新生成的角色ID
+            user_idea: 用户原始创意
+            fix_instructions: 修复指令
+
+        Returns:
+            CastArc: 合并后的角色弧光
+        """
+        cast_dict = deepcopy(cast_arc.model_dump() if hasattr(cast_arc, "model_dump") else cast_arc)
+        wanted = set(character_ids)
+        targets = {
+            character["character_id"]: (collection, position, character)
+            for collection, position, character in self._iter_cast(cast_dict)
+            if character.get("character_id") in wanted
+        }
+        missing = [cid for cid in character_ids if cid not in targets]
+        if missing:
+            raise ValueError(f"角色弧光中不存在角色: {', '.join(missing)}")
+        if not user_idea:
+            user_idea = world_setting_json.get("input", {}).get("user_idea", "")
+
+        target_ids = list(targets)
+        log.info(f"局部重新生成角色: {', '.join(target_ids)}")
+
+        cast_overview = [
+            {key: character.get(key) for key in ("character_id", "character_name", "role_type", "faction_affiliation")}
+            for _, _, character in self._iter_cast(cast_dict)
+            if character.get("character_id") not in targets
+        ]
+        human_prompt = self._format_prompt(
+            CAST_ARC_CHARACTER_FIX_PROMPT, "characters",
+            user_idea=user_idea,
+            fix_instructions=fix_instructions or "无",
+            world_setting_json=self._format_world_setting_for_prompt(world_setting_json.get("steps", {})),
+            premise_json=prompt_json(premise_json),
+            cast_overview=prompt_json(cast_overview),
+            target_characters=prompt_json([character for _, _, character in targets.values()]),
+            target_ids=", ".join(target_ids)
+        )
+        fragment = self._invoke_with_validation(
+            human_prompt, lambda output: self._validate_character_fix(output, targets), "角色局部重新生成",
+            retry_hint="请重新输出这些角色。"
+        )
+        if fragment is None:
+            raise RuntimeError(f"角色局部重新生成失败: {', '.join(target_ids)}")
+
+        # 按character_id合并回原位置
+        for character in fragment["characters"]:
+            collection, position, original = targets[character["character_id"]]
+            character["role_type"] = original.get("role_type", character.get("role_type"))
+            if position is None:
+                cast_dict[collection] = character
+            else:
+                cast_dict[collection][position] = character
+
+        matrix = cast_dict.get("relationship_matrix") or {}
+        for character_id, row in (fragment.get("relationship_matrix") or {}).items():
+            if character_id in targets and isinstance(row, dict):
+                matrix[character_id] = row
+        cast_dict["relationship_matrix"] = matrix
+
+        merged = CastArc(**cast_dict)
+        log.info(f"角色局部重新生成成功: {len(target_ids)}个角色")
+        return merged
+
+    def _validate_character_fix(
+        self,
+        fragment: Dict[str, Any],
+        targets: Dict[str, Tuple[str, Optional[int], Dict[str, Any]]]
+    ) -> Union[bool, str]:
+        """验证局部重新生成的角色"""
+        if not isinstance(fragment, dict):
+            return "输出必须是JSON对象"
+        characters = fragment.get("characters")
+        if not isinstance(characters, list):
+            return "characters必须是数组"
+
+        returned = [c.get("character_id") for c in characters if isinstance(c, dict)]
+        if len(returned) != len(characters):
+            return "characters中的每个角色都必须是对象"
+        if sorted(returned) != sorted(targets):
+            return f"characters必须恰好包含这些角色: {', '.join(targets)}（当前: {', '.join(map(str, returned))}）"
+
+        for character in characters:
+            for field in self.REQUIRED_CHARACTER_FIELDS:
+                if field != "role_type" and not character.get(field):
+                    return f"角色{character['character_id']}缺少{field}"
+
+        matrix = fragment.get("relationship_matrix")
+        if matrix is not None and not isinstance(matrix, dict):
+            return "relationship_matrix必须是对象"
+        return True
+
+    @classmethod
+    def _iter_cast(cls, cast_dict: Dict[str, Any]) -> Iterator[Tuple[str, Optional[int], Dict[str, Any]]]:
+        """遍历所有角色: (分组, 列表下标（主角为None）, 角色数据)"""
+        for collection in cls.CAST_COLLECTIONS:
+            value = cast_dict.get(collection)
+            if isinstance(value, dict):
+                yield collection, None, value
+            elif isinstance(value, list):
+                for position, character in enumerate(value):
+                    if isinstance(character, dict):
+                        yield collection, position, character
+
+    @classmethod
+    def find_characters(
+        cls,
+        cast_arc: Union[CastArc, Dict[str, Any]],
+        texts: Iterable[str],
+        character_ids: Optional[Iterable[str]] = None
+    ) -> List[str]:
+        """
+        找出文本中提到的角色（character_id按整词匹配，character_name按原文匹配）
+
+        Args:
+            cast_arc: 角色弧光
+            texts: 问题描述、修复指令等文本
+            character_ids: 只在这些角色中查找（默认所有角色）
+
+        Returns:
+            被提到的角色ID（按角色弧光中的顺序）
+        """
+        cast_dict = cast_arc.model_dump() if hasattr(cast_arc, "model_dump") else cast_arc
+        text = "\n".join(t for t in texts if t)
+        candidates = set(character_ids) if character_ids is not None else None
+        found = []
+        for _, _, character in cls._iter_cast(cast_dict or {}):
+            character_id = character.get("character_id")
+            name = character.get("character_name")
+            if not character_id or (candidates is not None and character_id not in candidates):
+                continue
+            if re.search(rf"(?<![A-Za-z0-9_]){re.escape(character_id)}(?![A-Za-z0-9_])", text) or (name and name in text):
+                found.append(character_id)
+        return found
+
     def _ensure_character_ids(self, result: Dict[str, Any]) -> Dict[str, Any]:
         """确保所有角色有唯一ID"""
         id_counter = 1
@@ -272,10 +436,7 @@ class CastArcAgent(BaseAgent):
         if not isinstance(protagonist, dict):
             return "protagonist必须是对象"
 
-        required_char_fields = ["character_id", "character_name", "role_type",
-                                "initial_state", "surface_goal", "deep_need",
-                                "character_arc_type", "final_state"]
-        for field in required_char_fields:
+        for field in self.REQUIRED_CHARACTER_FIELDS:
             if not protagonist.get(field):
                 return f"protagonist缺少{field}"
 
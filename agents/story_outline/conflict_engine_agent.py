@@ -48,7 +48,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> List[Conflict]:
         """生成主冲突列表（至少3个）"""
         result = self._run_with_template(
-            GENERATE_MAIN_CONFLICTS_HUMAN_PROMPT,
+            GENERATE_MAIN_CONFLICTS_HUMAN_PROMPT, "main_conflicts",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             world_setting_json=world_setting_json,
@@ -71,7 +71,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> Conflict:
         """生成单个主冲突（用于逐个生成）"""
         result = self._run_with_template(
-            GENERATE_MAIN_CONFLICT_HUMAN_PROMPT,
+            GENERATE_MAIN_CONFLICT_HUMAN_PROMPT, "main_conflict",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             world_setting_json=world_setting_json,
@@ -94,7 +94,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> Conflict:
         """生成次要冲突"""
         result = self._run_with_template(
-            GENERATE_SECONDARY_CONFLICT_HUMAN_PROMPT,
+            GENERATE_SECONDARY_CONFLICT_HUMAN_PROMPT, "secondary_conflict",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             world_setting_json=world_setting_json,
@@ -116,7 +116,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> Conflict:
         """生成背景冲突"""
         result = self._run_with_template(
-            GENERATE_BACKGROUND_CONFLICT_HUMAN_PROMPT,
+            GENERATE_BACKGROUND_CONFLICT_HUMAN_PROMPT, "background_conflict",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             world_setting_json=world_setting_json,
@@ -138,7 +138,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> List[EscalationNode]:
         """生成升级曲线"""
         result = self._run_with_template(
-            GENERATE_ESCALATION_CURVE_HUMAN_PROMPT,
+            GENERATE_ESCALATION_CURVE_HUMAN_PROMPT, "escalation_curve",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             world_setting_json=world_setting_json,
@@ -159,7 +159,7 @@ class ConflictEngineAgent(BaseAgent):
     ) -> Dict[str, Any]:
         """生成冲突链和势力博弈"""
         result = self._run_with_template(
-            GENERATE_CONFLICT_CHAIN_HUMAN_PROMPT,
+            GENERATE_CONFLICT_CHAIN_HUMAN_PROMPT, "conflict_chain",
             user_idea=user_idea,
             fix_instructions=fix_instructions or "无",
             all_conflicts=all_conflicts_json,
@@ -167,10 +167,10 @@ class ConflictEngineAgent(BaseAgent):
         )
         return result
 
-    def _run_with_template(self, template: str, **kwargs) -> Dict[str, Any]:
+    def _run_with_template(self, template: str, label: str = "", **kwargs) -> Dict[str, Any]:
         """使用指定模板运行"""
         # 替换模板中的占位符
-        human_prompt = template.format(**kwargs)
+        human_prompt = self._format_prompt(template, label, **kwargs)
 
         # 构造消息（包含system prompt）
         from langchain_core.messages import SystemMessage, HumanMessage
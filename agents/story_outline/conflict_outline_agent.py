@@ -2,7 +2,6 @@
 Conflict Outline Agent
 冲突大纲 Agent - 规划整体冲突框架
 """
-import json
 import uuid
 from typing import Dict, Any, List, Optional, Union
 
@@ -12,6 +11,8 @@ from prompts.story_outline.conflict_outline_prompt import (
     CONFLICT_OUTLINE_HUMAN_PROMPT
 )
 from utils.logger import log
+from utils.json_utils import prompt_json
+from utils.world_digest import build_world_digest
 
 
 class ConflictOutlineAgent(BaseAgent):
@@ -72,9 +73,9 @@ class ConflictOutlineAgent(BaseAgent):
             raise ValueError("world_setting_json中缺少steps数据")
 
         # 构建prompt字符串
-        world_setting_str = self._format_world_setting_for_prompt(steps)
-        premise_str = json.dumps(premise_json, ensure_ascii=False, indent=2)
-        cast_arc_str = json.dumps(cast_arc_json, ensure_ascii=False, indent=2)
+        world_setting_str = build_world_digest(world_setting_json)
+        premise_str = prompt_json(premise_json)
+        cast_arc_str = prompt_json(cast_arc_json)
 
         try:
             result = self.run(
@@ -96,16 +97,6 @@ class ConflictOutlineAgent(BaseAgent):
             log.error(f"ConflictOutlineAgent 处理失败: {e}")
             raise RuntimeError(f"冲突大纲生成失败: {e}") from e
 
-    def _format_world_setting_for_prompt(self, steps: Dict[str, Any]) -> str:
-        """将世界观数据格式化为prompt字符串（每个元素当str处理，不解析）"""
-        lines = []
-        for key, value in steps.items():
-            # 直接转字符串，不做JSON序列化
-            lines.append(f"【{key}】")
-            lines.append(str(value))
-            lines.append("")  # 空行分隔
-        return "\n".join(lines)
-
     def _log_success(self, outline: Dict[str, Any]) -> None:
         """记录成功日志"""
         log.info("冲突大纲生成成功:")
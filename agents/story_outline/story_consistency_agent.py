@@ -12,7 +12,14 @@ from prompts.story_outline.consistency_prompt import (
     STORY_CONSISTENCY_HUMAN_PROMPT
 )
 from models.story_outline.consistency import StoryConsistencyReport
+from utils.consistency_delta import (
+    build_delta_scope,
+    carry_forward_issues,
+    compact_items,
+    merge_carried_issues
+)
 from utils.logger import log
+from utils.world_digest import build_world_digest
 
 
 class StoryConsistencyAgent(BaseAgent):
@@ -39,6 +46,13 @@ class StoryConsistencyAgent(BaseAgent):
     SEVERITIES = ["low", "medium", "high", "critical"]
     # 状态
     STATUSES = ["passed", "warning", "failed"]
+    # 步骤key -> 负责该步骤的Agent（与问题的source_agent对应）
+    STEP_AGENTS = {
+        "premise": "StoryPremiseAgent",
+        "cast_arc": "CastArcAgent",
+        "conflict_outline": "ConflictOutlineAgent",
+        "conflict_engine": "ConflictEngineAgent",
+    }
 
     def process(
         self,
@@ -48,11 +62,16 @@ class StoryConsistencyAgent(BaseAgent):
         cast_arc: Dict[str, Any],
         conflict_map: Dict[str, Any],
         conflict_outline: Optional[Dict[str, Any]] = None,
-        validate: bool = True
+        validate: bool = True,
+        changed_steps: Optional[List[str]] = None,
+        prior_issues: Optional[List] = None
     ) -> StoryConsistencyReport:
         """
         处理一致性和有趣度检查
 
+        传入changed_steps时为增量复查：未修改步骤的长文本只发送摘要，
+        prior_issues中来源步骤未被修改的问题直接保留到本次报告
+
         Args:
             user_idea: 用户原始创意
             world_setting_json: 完整的世界观数据（用于一致性检查）
@@ -61,14 +80,20 @@ class StoryConsistencyAgent(BaseAgent):
             conflict_map: 矛盾引擎（包含outline和map的结构）
             conflict_outline: 冲突大纲（可选，如果conflict_map是完整结构则从中提取）
             validate: 是否验证输出
+            changed_steps: 本轮被修改的步骤key（None表示完整检查）
+            prior_issues: 上一轮检查发现的问题（增量复查时使用）
 
         Returns:
             StoryConsistencyReport: 检查报告
         """
-        log.info("执行故事大纲检查...")
+        delta = changed_steps is not None
+        if delta:
+            log.info(f"执行增量故事大纲检查 (修改步骤: {', '.join(changed_steps) or '无'})...")
+        else:
+            log.info("执行故事大纲检查...")
 
-        # 构建世界观字符串（每个元素当str处理，不解析）
-        world_setting_str = self._format_world_setting(world_setting_json)
+        # 世界观摘要（去重、紧凑、按内容哈希缓存）
+        world_setting_str = build_world_digest(world_setting_json)
 
         # 如果conflict_outline没传，尝试从conflict_map中提取
         if conflict_outline is None and isinstance(conflict_map, dict):
@@ -89,14 +114,16 @@ class StoryConsistencyAgent(BaseAgent):
             main_conflicts_count = len(main_conflicts_outline)
             secondary_conflicts_count = len(conflict_outline.get("secondary_conflicts_outline", []))
             critical_choices_count = len(conflict_outline.get("critical_choice_outline", []))
-            conflict_chain_summary = "; ".join(conflict_outline.get("conflict_chain_outline", [])[:3])
+            conflict_chain = conflict_outline.get("conflict_chain_outline", [])
+            conflict_chain_summary = "; ".join(conflict_chain[:3])
         else:
             main_conflicts_list = conflict_map.get("main_conflicts", [])
             main_conflict_type = ", ".join([mc.get("conflict_type", "") for mc in main_conflicts_list])
             main_conflicts_count = len(main_conflicts_list)
             secondary_conflicts_count = len(conflict_map.get("secondary_conflicts", []))
             critical_choices_count = self._count_critical_choices(conflict_map.get("escalation_curve", []))
-            conflict_chain_summary = self._format_conflict_chain(conflict_map.get("conflict_chain", []))
+            conflict_chain = conflict_map.get("conflict_chain", [])
+            conflict_chain_summary = self._format_conflict_chain(conflict_chain)
 
         # 冲突细节信息
         main_conflicts_list = conflict_map.get("main_conflicts", [])
@@ -108,6 +135,23 @@ class StoryConsistencyAgent(BaseAgent):
         secondary_conflicts = self._format_secondary_conflicts(secondary_conflicts_list)
         background_conflicts = self._format_background_conflicts(background_conflicts_list)
         escalation_summary = self._format_escalation_curve(conflict_map.get("escalation_curve", []))
+        creative_boundaries = premise.get("creative_boundaries", "")
+
+        # 增量复查：未修改步骤的长文本只发送紧凑摘要（保留ID/名称，用于交叉检查），保留与修改无关的旧问题
+        check_scope = ""
+        carried_issues = []
+        if delta:
+            changed_sources = [self.STEP_AGENTS.get(step, step) for step in changed_steps]
+            carried_issues = carry_forward_issues(prior_issues, changed_sources)
+            check_scope = build_delta_scope(changed_sources, carried_issues)
+            if "premise" not in changed_steps:
+                creative_boundaries = compact_items([creative_boundaries] if creative_boundaries else [])
+            if "conflict_outline" not in changed_steps:
+                conflict_chain_summary = compact_items(conflict_chain)
+            if "conflict_engine" not in changed_steps:
+                secondary_conflicts = compact_items(secondary_conflicts_list)
+                background_conflicts = compact_items(background_conflicts_list)
+                escalation_summary = compact_items(conflict_map.get("escalation_curve", []))
 
         try:
             result = self.run(
@@ -120,7 +164,7 @@ class StoryConsistencyAgent(BaseAgent):
                 emotional_tone=premise.get("emotional_tone", ""),
                 must_have_elements=premise.get("must_have_elements", []),
                 forbidden_elements=premise.get("forbidden_elements", []),
-                creative_boundaries=premise.get("creative_boundaries", ""),
+                creative_boundaries=creative_boundaries,
                 protagonist_summary=protagonist_summary,
                 heroines_summary=heroines_summary,
                 supporting_summary=supporting_summary,
@@ -135,9 +179,13 @@ class StoryConsistencyAgent(BaseAgent):
                 main_conflict=main_conflict_summary,
                 secondary_conflicts=secondary_conflicts,
                 background_conflicts=background_conflicts,
-                escalation_summary=escalation_summary
+                escalation_summary=escalation_summary,
+                check_scope=check_scope
             )
 
+            if delta:
+                result = merge_carried_issues(result, carried_issues)
+
             if "report_id" not in result:
                 result["report_id"] = f"story_consistency_{uuid.uuid4().hex[:8]}"
 
@@ -278,13 +326,3 @@ class StoryConsistencyAgent(BaseAgent):
             "fallback": True
         }
 
-    def _format_world_setting(self, world_setting: Dict[str, Any]) -> str:
-        """格式化世界观数据为字符串（每个元素当str处理，不解析）"""
-        lines = []
-        # 只需要steps部分
-        steps = world_setting.get("steps", {})
-        for key, value in steps.items():
-            lines.append(f"【{key}】")
-            lines.append(str(value))
-            lines.append("")  # 空行分隔
-        return "\n".join(lines)
@@ -38,7 +38,7 @@ class AtmosphereAgent(BaseAgent):
         story_constraints: Dict[str, Any],
         world_setting: Dict[str, Any],
         key_elements: Dict[str, Any],
-        timeline: Dict[str, Any],
+        timeline: Optional[Dict[str, Any]] = None,
         user_idea: str = "",
         validate: bool = True
     ) -> WorldAtmosphere:
@@ -49,7 +49,7 @@ class AtmosphereAgent(BaseAgent):
             story_constraints: 故事约束条件
             world_setting: 世界观设定
             key_elements: 关键元素
-            timeline: 时间线(必选)
+            timeline: 时间线（与时间线并发生成时为None）
             user_idea: 用户原始创意
             validate: 是否验证输出
 
@@ -58,8 +58,6 @@ class AtmosphereAgent(BaseAgent):
         """
         if not world_setting:
             raise ValueError("world_setting不能为空")
-        if not timeline:
-            raise ValueError("timeline不能为空")
 
         log.info("生成氛围设定...")
 
@@ -72,9 +70,11 @@ class AtmosphereAgent(BaseAgent):
             ]) if locations else "无"
 
             # 提取时间线信息
-            events = timeline.get("events", [])
+            events = (timeline or {}).get("events", [])
             critical_events = [e for e in events if e.get("importance") == "critical"]
-            if critical_events:
+            if not timeline:
+                timeline_summary = "历史背景: 时间线尚未生成，以世界观设定为准"
+            elif critical_events:
                 timeline_summary = "关键历史事件: " + ", ".join([
                     e.get("name", "") for e in critical_events[:3]
                 ])
@@ -44,8 +44,8 @@ class NpcFactionAgent(BaseAgent):
         story_constraints: Dict[str, Any],
         world_setting: Dict[str, Any],
         key_elements: Dict[str, Any],
-        timeline: Dict[str, Any],
-        atmosphere: Dict[str, Any],
+        timeline: Optional[Dict[str, Any]] = None,
+        atmosphere: Optional[Dict[str, Any]] = None,
         user_idea: str = "",
         validate: bool = True
     ) -> WorldFactions:
@@ -56,8 +56,8 @@ class NpcFactionAgent(BaseAgent):
             story_constraints: 故事约束条件
             world_setting: 世界观设定
             key_elements: 关键元素
-            timeline: 时间线(必选)
-            atmosphere: 氛围设定(必选)
+            timeline: 时间线（并发生成时为None）
+            atmosphere: 氛围设定（并发生成时为None）
             user_idea: 用户原始创意
             validate: 是否验证输出
 
@@ -66,10 +66,6 @@ class NpcFactionAgent(BaseAgent):
         """
         if not world_setting:
             raise ValueError("world_setting不能为空")
-        if not timeline:
-            raise ValueError("timeline不能为空")
-        if not atmosphere:
-            raise ValueError("atmosphere不能为空")
 
         log.info("生成势力体系...")
 
@@ -82,11 +78,18 @@ class NpcFactionAgent(BaseAgent):
             ]) if orgs else "无特殊组织"
 
             # 提取时间线信息
-            timeline_summary = "历史背景: " + timeline.get("era_summary", "无特殊历史")
+            if timeline:
+                timeline_summary = "历史背景: " + timeline.get("era_summary", "无特殊历史")
+            else:
+                timeline_summary = "历史背景: 时间线尚未生成，以世界观设定为准"
 
             # 提取氛围信息
-            mood_info = f"整体基调: {atmosphere.get('overall_mood', '')}"
-            visual_style = f"视觉风格: {atmosphere.get('visual_style', '')}"
+            if atmosphere:
+                mood_info = f"整体基调: {atmosphere.get('overall_mood', '')}"
+                visual_style = f"视觉风格: {atmosphere.get('visual_style', '')}"
+            else:
+                mood_info = f"整体基调: 氛围设定尚未生成，以故事基调（{story_constraints.get('tone', '')}）为准"
+                visual_style = "视觉风格: 未指定"
 
             result = self.run(
                 genre=story_constraints.get("genre", ""),
@@ -4,7 +4,6 @@ World Consistency Agent
 """
 from typing import Dict, Any, List, Optional, Union
 import uuid
-import json
 
 from agents.base_agent import BaseAgent
 from prompts.worldbuilding.consistency_prompt import (
@@ -12,7 +11,14 @@ from prompts.worldbuilding.consistency_prompt import (
     CONSISTENCY_HUMAN_PROMPT
 )
 from models.worldbuilding.consistency import ConsistencyReport
+from utils.consistency_delta import (
+    build_delta_scope,
+    carry_forward_issues,
+    compact_items,
+    merge_carried_issues
+)
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class WorldConsistencyAgent(BaseAgent):
@@ -41,6 +47,14 @@ class WorldConsistencyAgent(BaseAgent):
     SEVERITIES = ["low", "medium", "high", "critical"]
     # 状态
     STATUSES = ["passed", "warning", "failed"]
+    # 步骤key -> 负责该步骤的Agent（与问题的source_agent对应）
+    STEP_AGENTS = {
+        "worldbuilding": "WorldbuildingAgent",
+        "key_element": "KeyElementAgent",
+        "timeline": "TimelineAgent",
+        "atmosphere": "AtmosphereAgent",
+        "npc_faction": "NpcFactionAgent",
+    }
 
     def process(
         self,
@@ -50,11 +64,16 @@ class WorldConsistencyAgent(BaseAgent):
         timeline: Dict[str, Any],
         atmosphere: Dict[str, Any],
         factions: Dict[str, Any],
-        validate: bool = True
+        validate: bool = True,
+        changed_steps: Optional[List[str]] = None,
+        prior_issues: Optional[List] = None
     ) -> ConsistencyReport:
         """
         处理一致性检查
 
+        传入changed_steps时为增量复查：被修改的步骤发送完整数据，其余步骤只发送摘要，
+        prior_issues中来源步骤未被修改的问题直接保留到本次报告
+
         Args:
             story_constraints: 故事约束条件
             world_setting: 世界观设定
@@ -63,11 +82,17 @@ class WorldConsistencyAgent(BaseAgent):
             atmosphere: 氛围设定
             factions: 势力设定
             validate: 是否验证输出
+            changed_steps: 本轮被修改的步骤key（None表示完整检查）
+            prior_issues: 上一轮检查发现的问题（增量复查时使用）
 
         Returns:
             ConsistencyReport: 一致性检查报告
         """
-        log.info("执行一致性检查...")
+        delta = changed_steps is not None
+        if delta:
+            log.info(f"执行增量一致性检查 (修改步骤: {', '.join(changed_steps) or '无'})...")
+        else:
+            log.info("执行一致性检查...")
 
         # 参数检查
         for name, value in [
@@ -96,6 +121,23 @@ class WorldConsistencyAgent(BaseAgent):
             key_npcs = factions.get("key_npcs", [])
             relation_map = factions.get("relation_map", {})
 
+            # 增量复查：未修改的步骤只发送摘要
+            check_scope = ""
+            carried_issues = []
+            if delta:
+                changed_sources = [self.STEP_AGENTS.get(step, step) for step in changed_steps]
+                carried_issues = carry_forward_issues(prior_issues, changed_sources)
+                check_scope = build_delta_scope(changed_sources, carried_issues)
+
+            def dump(step: str, data: Any) -> str:
+                if delta and step not in changed_steps:
+                    return compact_items(data)
+                return prompt_json(data)
+
+            world_description = world_setting.get("description", "")
+            if delta and "worldbuilding" not in changed_steps:
+                world_description = "（未修改，略）"
+
             result = self.run(
                 genre=story_constraints.get("genre", ""),
                 themes=", ".join(story_constraints.get("themes", [])),
@@ -105,28 +147,32 @@ class WorldConsistencyAgent(BaseAgent):
                 era=world_setting.get("era", ""),
                 location=world_setting.get("location", ""),
                 core_conflict=world_setting.get("core_conflict_source", ""),
-                world_description=world_setting.get("description", ""),
-                world_rules=json.dumps(world_rules, ensure_ascii=False),
+                world_description=world_description,
+                world_rules=dump("worldbuilding", world_rules),
                 # 关键元素完整数据
-                key_items=json.dumps(key_items, ensure_ascii=False),
-                key_locations=json.dumps(key_locations, ensure_ascii=False),
-                organizations=json.dumps(organizations, ensure_ascii=False),
-                terms=json.dumps(terms, ensure_ascii=False),
+                key_items=dump("key_element", key_items),
+                key_locations=dump("key_element", key_locations),
+                organizations=dump("key_element", organizations),
+                terms=dump("key_element", terms),
                 # 时间线完整数据
                 current_year=timeline.get("current_year", ""),
                 era_summary=timeline.get("era_summary", ""),
-                events=json.dumps(events, ensure_ascii=False),
+                events=dump("timeline", events),
                 # 氛围完整数据
                 overall_mood=atmosphere.get("overall_mood", ""),
                 visual_style=atmosphere.get("visual_style", ""),
-                scene_presets=json.dumps(scene_presets, ensure_ascii=False),
+                scene_presets=dump("atmosphere", scene_presets),
                 # 势力完整数据
-                factions_json=json.dumps(factions_list, ensure_ascii=False),
-                key_npcs=json.dumps(key_npcs, ensure_ascii=False),
-                relation_map=json.dumps(relation_map, ensure_ascii=False),
-                conflict_points=", ".join(factions.get("conflict_points", []))
+                factions_json=dump("npc_faction", factions_list),
+                key_npcs=dump("npc_faction", key_npcs),
+                relation_map=dump("npc_faction", relation_map),
+                conflict_points=", ".join(factions.get("conflict_points", [])),
+                check_scope=check_scope
             )
 
+            if delta:
+                result = merge_carried_issues(result, carried_issues)
+
             if "report_id" not in result:
                 result["report_id"] = f"consistency_{uuid.uuid4().hex[:8]}"
 
@@ -4,7 +4,6 @@ World Summary Agent
 """
 from typing import Dict, Any, List, Optional, Union
 import uuid
-import json
 
 from agents.base_agent import BaseAgent
 from prompts.worldbuilding.world_summary_prompt import (
@@ -13,6 +12,7 @@ from prompts.worldbuilding.world_summary_prompt import (
 )
 from models.worldbuilding.world_summary import WorldSummary
 from utils.logger import log
+from utils.json_utils import prompt_json
 
 
 class WorldSummaryAgent(BaseAgent):
@@ -108,24 +108,24 @@ class WorldSummaryAgent(BaseAgent):
                 world_type=world_setting.get("type", ""),
                 core_conflict=world_setting.get("core_conflict_source", ""),
                 world_description=world_setting.get("description", ""),
-                world_rules=json.dumps(world_rules, ensure_ascii=False),
+                world_rules=prompt_json(world_rules),
                 # 关键元素
-                key_items=json.dumps(key_items, ensure_ascii=False),
-                key_locations=json.dumps(key_locations, ensure_ascii=False),
-                organizations=json.dumps(organizations, ensure_ascii=False),
-                terms=json.dumps(terms, ensure_ascii=False),
+                key_items=prompt_json(key_items),
+                key_locations=prompt_json(key_locations),
+                organizations=prompt_json(organizations),
+                terms=prompt_json(terms),
                 # 时间线
                 current_year=timeline.get("current_year", ""),
                 era_summary=timeline.get("era_summary", ""),
-                events=json.dumps(events, ensure_ascii=False),
+                events=prompt_json(events),
                 # 氛围
                 overall_mood=atmosphere.get("overall_mood", ""),
                 visual_style=atmosphere.get("visual_style", ""),
-                scene_presets=json.dumps(scene_presets, ensure_ascii=False),
+                scene_presets=prompt_json(scene_presets),
                 # 势力
-                factions_json=json.dumps(factions_list, ensure_ascii=False),
-                key_npcs=json.dumps(key_npcs, ensure_ascii=False),
-                relation_map=json.dumps(relation_map, ensure_ascii=False),
+                factions_json=prompt_json(factions_list),
+                key_npcs=prompt_json(key_npcs),
+                relation_map=prompt_json(relation_map),
                 conflict_points=", ".join(factions.get("conflict_points", []))
             )
 
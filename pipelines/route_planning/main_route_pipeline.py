@@ -16,6 +16,9 @@ from agents.route_planning.route_fixer_agent import RouteFixerAgent
 # 数据模型
 from utils.logger import log
 from utils.config import config
+from utils.fix_convergence import FixConvergenceTracker
+from utils.route_auto_fixer import RouteAutoFixer, auto_fix_route
+from utils.route_simulator import simulate_route, check_route_simulation
 
 
 class MainRoutePipeline:
@@ -25,13 +28,17 @@ class MainRoutePipeline:
     处理流程:
     1. MainRouteAgent      → 生成主线框架（基于策略文本）
     2. RouteConsistencyAgent → 检查路线设计问题
-    3. RouteFixerAgent      → 修复问题（循环直到无关键问题）
+    3. 自动修复            → 数值/跨度问题直接修复（不使用LLM）
+    4. RouteFixerAgent      → 修复剩余问题（循环直到无关键问题）
+    5. RouteSimulator       → 可选，蒙特卡洛游玩模拟（结局分布/死路率），
+                              关键/高优先级问题交给RouteFixerAgent修复后重新模拟
 
     输入: 故事大纲数据 + 策略文本
     输出: 修复后的主线框架JSON
     """
 
     MAX_FIX_ROUNDS = 3
+    MAX_SIMULATION_FIX_ROUNDS = 2
 
     def __init__(self):
         """初始化 Pipeline"""
@@ -47,7 +54,9 @@ class MainRoutePipeline:
         story_outline_data: Dict[str, Any],
         strategy_text: str,
         output_dir: Optional[str] = None,
-        show_progress: bool = True
+        show_progress: bool = True,
+        simulate: bool = False,
+        simulation_runs: int = 100000
     ) -> Dict[str, Any]:
         """
         生成主线框架
@@ -57,6 +66,8 @@ class MainRoutePipeline:
             strategy_text: 路线策略文本
             output_dir: 输出目录
             show_progress: 是否显示进度
+            simulate: 是否对最终路线做蒙特卡洛游玩模拟（需要numpy）
+            simulation_runs: 每种策略的模拟次数
 
         Returns:
             处理结果字典
@@ -70,6 +81,7 @@ class MainRoutePipeline:
             },
             "steps": {},
             "fix_history": [],
+            "auto_fixes": [],
             "final_output": {},
         }
 
@@ -92,6 +104,7 @@ class MainRoutePipeline:
 
         route_dict = main_route.model_dump() if hasattr(main_route, "model_dump") else main_route
         consistency_report = self.agents["consistency"].process(route_framework=route_dict)
+        route_dict, consistency_report = self._auto_fix(route_dict, consistency_report, result)
         result["steps"]["consistency"] = consistency_report
 
         # 3. 修复循环
@@ -106,7 +119,11 @@ class MainRoutePipeline:
             print("\n✅ 无需要修复的问题")
             result["final_output"] = route_dict
 
-        # 4. 保存结果
+        # 4. 游玩模拟（未通过时修复后重新模拟）
+        if simulate:
+            route_dict = self._simulate_and_fix(route_dict, result, simulation_runs)
+
+        # 5. 保存结果
         if output_dir:
             self._save_results(result, output_dir)
 
@@ -116,6 +133,9 @@ class MainRoutePipeline:
         """执行修复循环"""
         fix_round = 0
         current_route = route_dict
+        tracker = FixConvergenceTracker("主线路线")
+        initial_report = result["steps"]["consistency"]
+        tracker.start(self._get_critical_issues(initial_report) + self._get_high_issues(initial_report))
 
         while fix_round < self.MAX_FIX_ROUNDS:
             consistency_report = result["steps"]["consistency"]
@@ -130,23 +150,27 @@ class MainRoutePipeline:
             fix_round += 1
             print(f"\n🔧 第{fix_round}轮修复...")
 
-            # 执行修复
+            # 执行修复（数值/跨度问题已在检查后自动修复，这里只剩需要LLM判断的问题）
             all_issues = critical_issues + high_issues
-            fixed_route = self.agents["fixer"].process(
+            # 只发送问题涉及的章节/分支/结局，互不重叠的窗口并发修复
+            fixed_route = self.agents["fixer"].process_windows(
                 route_framework=current_route,
-                issues=all_issues
+                issues=all_issues,
+                fix_round=fix_round
             )
 
             # 记录修复历史
             result["fix_history"].append({
                 "round": fix_round,
                 "issues_count": len(all_issues),
-                "fix_count": fixed_route.get("fix_count", len(all_issues))
+                "fix_count": fixed_route.get("fix_count", len(all_issues)),
+                "fix_windows": fixed_route.get("fix_windows")
             })
 
             # 重新检查
             print("   重新检查...")
-            new_report = self.agents["consistency"].process(route_framework=fixed_route)
+            new_report = self.agents["consistency"].process(route_framework=fixed_route, incremental=True)
+            fixed_route, new_report = self._auto_fix(fixed_route, new_report, result)
             result["steps"]["consistency"] = new_report
 
             # 更新当前路线
@@ -158,15 +182,110 @@ class MainRoutePipeline:
             new_high = self._get_high_issues(new_report)
             print(f"   修复后: {len(new_critical)}个关键问题, {len(new_high)}个高优先级问题")
 
+            # 记录本轮解决情况
+            convergence = tracker.record_round(fix_round, new_critical + new_high)
+            result["fix_history"][-1]["convergence"] = convergence
+
             if len(new_critical) == 0 and len(new_high) == 0:
                 print("   修复完成，结束循环")
                 break
 
+            stop_reason = tracker.should_stop(convergence)
+            if stop_reason:
+                print(f"   {stop_reason}，结束循环")
+                result["fix_history"][-1]["stop_reason"] = stop_reason
+                break
+
         if fix_round >= self.MAX_FIX_ROUNDS:
             print(f"\n⚠️ 已达到最大修复轮次({self.MAX_FIX_ROUNDS})")
 
         return result
 
+    def _auto_fix(self, route: Dict, report: Dict, result: Dict):
+        """
+        自动修复报告中的数值和跨度问题，修复后增量复查
+
+        Returns:
+            (修复后的路线, 复查后的报告)
+        """
+        fixable = [i for i in report.get("issues", []) if RouteAutoFixer.can_fix(i)]
+        if not fixable:
+            return route, report
+
+        fixed_route, changes = auto_fix_route(route, fixable)
+        if not changes:
+            return route, report
+
+        print(f"   🔧 自动修复{len(changes)}处数值/跨度问题")
+        result["auto_fixes"].extend(changes)
+        new_report = self.agents["consistency"].process(route_framework=fixed_route, incremental=True)
+        return fixed_route, new_report
+
+    def _simulate_and_fix(self, route: Dict, result: Dict, runs: int) -> Dict:
+        """
+        游玩模拟关卡：模拟发现关键/高优先级问题时交给修复Agent，修复后复查并重新模拟
+
+        Returns:
+            修复后的路线（模拟结果写入result["simulation"]）
+        """
+        simulation = self._simulate(route, runs)
+        fix_round = len(result["fix_history"])
+
+        for _ in range(self.MAX_SIMULATION_FIX_ROUNDS):
+            if simulation["passed"]:
+                break
+            blocking = [i for i in simulation["issues"] if i["severity"] in ("critical", "high")]
+
+            fix_round += 1
+            print(f"\n🔧 第{fix_round}轮修复（模拟问题）...")
+            fixed_route = self.agents["fixer"].process_windows(
+                route_framework=route,
+                issues=blocking,
+                fix_round=fix_round
+            )
+            result["fix_history"].append({
+                "round": fix_round,
+                "source": "simulation",
+                "issues_count": len(blocking),
+                "fix_count": fixed_route.get("fix_count", len(blocking)),
+                "fix_windows": fixed_route.get("fix_windows")
+            })
+
+            # 修复可能引入新的规则问题，复查后再模拟
+            new_report = self.agents["consistency"].process(route_framework=fixed_route, incremental=True)
+            route, new_report = self._auto_fix(fixed_route, new_report, result)
+            result["steps"]["consistency"] = new_report
+            result["final_output"] = route
+            simulation = self._simulate(route, runs)
+
+        if not simulation["passed"]:
+            log.warning("游玩模拟仍未通过，请检查 simulation_report.json")
+        result["simulation"] = simulation
+        return route
+
+    def _simulate(self, route: Dict, runs: int) -> Dict[str, Any]:
+        """对最终路线做游玩模拟，作为结局可达性和死路的检查关卡"""
+        print("\n" + "=" * 60)
+        print("📍 步骤4: 游玩模拟")
+        print("=" * 60)
+
+        reports = simulate_route(route, n=runs)
+        issues = check_route_simulation(reports, route_framework=route)
+        random_report = reports.get("random", {})
+        print(f"   随机游玩死路率: {random_report.get('dead_end_rate', 0):.2%}")
+        for ending_id, rate in random_report.get("ending_rates", {}).items():
+            print(f"   {ending_id}: {rate:.2%}")
+
+        passed = not any(i["severity"] in ("critical", "high") for i in issues)
+        if passed:
+            print("   ✅ 模拟检查通过")
+        else:
+            print(f"   ⚠️ 模拟发现{len(issues)}个问题")
+            for issue in issues:
+                log.warning(f"[{issue['severity']}] {issue['description']}")
+
+        return {"passed": passed, "issues": issues, "reports": reports}
+
     def _get_critical_issues(self, report: Dict) -> list:
         """获取关键问题列表"""
         issues = report.get("issues", []) if isinstance(report, dict) else []
@@ -203,6 +322,14 @@ class MainRoutePipeline:
                 json.dump(report_dict, f, ensure_ascii=False, indent=2)
             log.info(f"检查报告已保存到: {report_file}")
 
+        # 保存模拟报告
+        simulation = result.get("simulation")
+        if simulation:
+            simulation_file = timestamped_dir / "simulation_report.json"
+            with open(simulation_file, 'w', encoding='utf-8') as f:
+                json.dump(simulation, f, ensure_ascii=False, indent=2)
+            log.info(f"模拟报告已保存到: {simulation_file}")
+
         # 保存完整结果
         full_file = timestamped_dir / "full_result.json"
         with open(full_file, 'w', encoding='utf-8') as f:
@@ -220,6 +347,8 @@ def main():
     parser.add_argument("--strategy", "-t", help="路线策略文本文件路径")
     parser.add_argument("--output", "-o", help="输出目录", default="./output/main_route")
     parser.add_argument("--no-progress", action="store_true", help="不显示进度条")
+    parser.add_argument("--simulate", action="store_true", help="对最终路线做蒙特卡洛游玩模拟（需要numpy）")
+    parser.add_argument("--simulation-runs", type=int, default=100000, help="每种策略的模拟次数")
 
     args = parser.parse_args()
 
@@ -273,7 +402,9 @@ def main():
         story_outline_data=story_outline_data,
         strategy_text=strategy_text,
         output_dir=args.output,
-        show_progress=not args.no_progress
+        show_progress=not args.no_progress,
+        simulate=args.simulate,
+        simulation_runs=args.simulation_runs
     )
 
     print("\n" + "=" * 60)
@@ -295,6 +426,11 @@ def main():
     print(f"\n📊 检查状态: {consistency_status}")
     print(f"📊 问题数: {consistency_issues}")
 
+    simulation = result.get("simulation")
+    if simulation and not simulation["passed"]:
+        print(f"\n❌ 游玩模拟未通过（{len(simulation['issues'])}个问题）")
+        return 1
+
     return 0
 
 
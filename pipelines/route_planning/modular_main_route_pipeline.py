@@ -2,6 +2,7 @@
 GAL-Dreamer 模块化主线路线 Pipeline
 基于四模块（起承转合）结构生成主线框架 - 支持分模块生成避免上下文过长
 """
+import copy
 import json
 from pathlib import Path
 from typing import Optional, Dict, Any, List
@@ -13,6 +14,9 @@ from agents.route_planning.modular_main_route_agent import ModularMainRouteAgent
 
 from utils.logger import log
 from utils.config import config
+from utils.concurrency import run_parallel
+from utils.route_consistency_checker import check_route_consistency
+from utils.route_auto_fixer import RouteAutoFixer, auto_fix_route
 
 
 class ModularMainRoutePipeline:
@@ -25,6 +29,10 @@ class ModularMainRoutePipeline:
     3. ModularMainRouteAgent → 逐个生成各模块框架（每模块6-8章）
     4. 合并所有模块为完整框架
 
+    并发模式（parallel=True）:
+    - 四个模块按各自的模块策略同时生成
+    - 合并时调和ID冲突和跨模块分支回归点，并用规则检查器验证
+
     输入: 故事大纲数据
     输出: 主线框架JSON
     """
@@ -57,7 +65,9 @@ class ModularMainRoutePipeline:
         story_outline_data: Dict[str, Any],
         total_chapters: int = 27,
         output_dir: Optional[str] = None,
-        show_progress: bool = True
+        show_progress: bool = True,
+        parallel: bool = False,
+        max_workers: Optional[int] = None
     ) -> Dict[str, Any]:
         """
         生成主线框架
@@ -67,6 +77,8 @@ class ModularMainRoutePipeline:
             total_chapters: 总章节数
             output_dir: 输出目录
             show_progress: 是否显示进度
+            parallel: 是否并发生成四个模块（生成后统一调和）
+            max_workers: 并发数（默认使用 config.LLM_MAX_CONCURRENCY）
 
         Returns:
             处理结果字典
@@ -132,7 +144,31 @@ class ModularMainRoutePipeline:
         result["module_allocation"] = module_allocation
         result["recommended_chapters"] = recommended_chapters
 
-        # 2. 逐个生成各模块框架
+        # 2. 生成各模块框架
+        if parallel:
+            complete_framework = self._generate_modules_parallel(
+                module_allocation, story_outline_data, user_idea, result, max_workers
+            )
+        else:
+            complete_framework = self._generate_modules_serial(
+                module_allocation, story_outline_data, user_idea, result
+            )
+        result["final_output"] = complete_framework
+
+        # 4. 保存结果
+        if output_dir:
+            self._save_results(result, output_dir)
+
+        return result
+
+    def _generate_modules_serial(
+        self,
+        module_allocation: List[Dict[str, Any]],
+        story_outline_data: Dict[str, Any],
+        user_idea: str,
+        result: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """逐个生成各模块框架（后一模块承接前一模块的状态/分支/结局）"""
         print("\n" + "=" * 60)
         print("📍 步骤2: 逐个生成各模块框架")
         print("=" * 60)
@@ -190,14 +226,182 @@ class ModularMainRoutePipeline:
         print("📍 步骤3: 合并所有模块")
         print("=" * 60)
 
-        complete_framework = self._merge_modules(global_state, global_branches, global_endings)
-        result["final_output"] = complete_framework
+        return self._merge_modules(global_state, global_branches, global_endings)
 
-        # 4. 保存结果
-        if output_dir:
-            self._save_results(result, output_dir)
+    def _generate_modules_parallel(
+        self,
+        module_allocation: List[Dict[str, Any]],
+        story_outline_data: Dict[str, Any],
+        user_idea: str,
+        result: Dict[str, Any],
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        并发生成各模块框架
 
-        return result
+        各模块的章节范围和目标已由模块策略确定，前序上下文改用模块策略构建，
+        生成后统一调和ID冲突和跨模块的分支回归点，再用规则检查器验证
+        """
+        print("\n" + "=" * 60)
+        print("📍 步骤2: 并发生成各模块框架")
+        print("=" * 60)
+
+        agent = self.agents["modular_main_route"]
+
+        def generate_module(module_info: Dict[str, Any]):
+            module_name = module_info["name"]
+            print(f"\n--- 生成 {module_name} 模块（第{module_info['start']}-{module_info['end']}章）---")
+            return agent.process_module(
+                story_outline_data=story_outline_data,
+                module_name=module_name,
+                module_type=module_info["type"],
+                chapter_start=module_info["start"],
+                chapter_end=module_info["end"],
+                module_strategy=self.module_strategies.get(module_name, {}),
+                user_idea=user_idea,
+                route_strategy_text=self.route_strategy,
+                main_plot_summary=self.main_plot_summary,
+                chapters=self.chapters,
+                previous_context=agent.build_strategy_context(module_name, self.module_strategies)
+            )
+
+        frameworks = run_parallel(generate_module, module_allocation, max_workers)
+
+        for module_info, module_framework in zip(module_allocation, frameworks):
+            self.module_frameworks[module_info["name"]] = module_framework
+            result["module_frameworks"][module_info["name"]] = module_framework.model_dump()
+
+        # 3. 调和并合并所有模块
+        print("\n" + "=" * 60)
+        print("📍 步骤3: 调和并合并所有模块")
+        print("=" * 60)
+
+        all_chapters, global_branches, global_endings, reconcile_log = self._reconcile_modules(
+            module_allocation, frameworks
+        )
+
+        global_state = None
+        for module_framework in frameworks:
+            if not global_state:
+                global_state = self._initialize_state(module_framework)
+            else:
+                global_state = self._update_state(global_state, module_framework)
+
+        complete_framework = self._merge_modules(global_state, global_branches, global_endings, all_chapters)
+
+        consistency_report = check_route_consistency(complete_framework)
+
+        # 数值/跨度问题直接自动修复（不使用LLM），修复后复查
+        fixable = [i for i in consistency_report["issues"] if RouteAutoFixer.can_fix(i)]
+        complete_framework, auto_fixes = auto_fix_route(complete_framework, fixable)
+        if auto_fixes:
+            consistency_report = check_route_consistency(complete_framework)
+
+        result["reconcile"] = {
+            "changes": reconcile_log,
+            "auto_fixes": auto_fixes,
+            "consistency": consistency_report
+        }
+        log.info(f"模块调和: {len(reconcile_log)}处修改，自动修复{len(auto_fixes)}处，"
+                 f"规则检查: {consistency_report['overall_status']} ({consistency_report['total_issues']}个问题)")
+
+        blocking = [i for i in consistency_report["issues"] if i.get("severity") in ("critical", "high")]
+        if blocking:
+            log.warning(f"调和后的主线框架仍有{len(blocking)}个关键/高优先级问题，生成章节前需要处理:")
+            for issue in blocking:
+                log.warning(f"  [{issue['severity']}] {issue.get('location', '')}: {issue.get('description', '')}")
+
+        return complete_framework
+
+    def _reconcile_modules(
+        self,
+        module_allocation: List[Dict[str, Any]],
+        frameworks: List[Any]
+    ) -> tuple:
+        """
+        调和并发生成的模块
+
+        - 章节ID统一为 common_ch{序号}（按模块章节范围）
+        - 分支/结局/选项ID跨模块重复时加模块后缀，并同步更新引用
+        - 分支回归点不存在或不在入口之后时，改为入口后的合法章节
+
+        Returns:
+            (章节列表, 分支列表, 结局列表, 修改记录)
+        """
+        reconcile_log = []
+        all_chapters, all_branches, all_endings = [], [], []
+        used_branch_ids, used_ending_ids, used_choice_ids = set(), set(), set()
+
+        for module_index, (module_info, module_framework) in enumerate(zip(module_allocation, frameworks), 1):
+            chapters = copy.deepcopy(module_framework.chapters)
+            branches = copy.deepcopy(module_framework.branches)
+            endings = copy.deepcopy(module_framework.endings)
+
+            # 1. 章节ID：按模块章节范围重新编号
+            chapter_id_map = {}
+            for offset, ch in enumerate(chapters):
+                expected_id = f"common_ch{module_info['start'] + offset}"
+                old_id = ch.get("id")
+                if old_id != expected_id:
+                    chapter_id_map[old_id] = expected_id
+                    ch["id"] = expected_id
+                    reconcile_log.append(f"{module_info['name']}模块章节 {old_id} → {expected_id}")
+
+            # 2. 分支/结局ID去重
+            route_id_map = {}
+            for items, used_ids in ((branches, used_branch_ids), (endings, used_ending_ids)):
+                for item in items:
+                    old_id = item.get("id")
+                    new_id = old_id
+                    if new_id in used_ids:
+                        new_id = f"{old_id}_m{module_index}"
+                        route_id_map[old_id] = new_id
+                        item["id"] = new_id
+                        reconcile_log.append(f"{module_info['name']}模块 {old_id} 重复 → {new_id}")
+                    used_ids.add(new_id)
+
+            # 3. 选项ID去重，同步分支引用
+            for ch in chapters:
+                for choice in ch.get("choices", []):
+                    choice_id = choice.get("id")
+                    if choice_id in used_choice_ids:
+                        choice["id"] = f"{choice_id}_m{module_index}"
+                        reconcile_log.append(f"{ch['id']} 选项 {choice_id} 重复 → {choice['id']}")
+                    used_choice_ids.add(choice.get("id"))
+                    if choice.get("branch") in route_id_map:
+                        choice["branch"] = route_id_map[choice["branch"]]
+
+            for branch in branches:
+                if branch.get("return") in chapter_id_map:
+                    branch["return"] = chapter_id_map[branch["return"]]
+
+            all_chapters.extend(chapters)
+            all_branches.extend(branches)
+            all_endings.extend(endings)
+
+        # 4. 分支回归点：必须是入口之后的已有章节（不超过入口+3章）
+        chapter_index = {ch.get("id"): idx for idx, ch in enumerate(all_chapters)}
+        entry_index = {}
+        for idx, ch in enumerate(all_chapters):
+            for choice in ch.get("choices", []):
+                branch_id = choice.get("branch")
+                if branch_id and branch_id not in entry_index:
+                    entry_index[branch_id] = idx
+
+        for branch in all_branches:
+            entry = entry_index.get(branch.get("id"))
+            return_index = chapter_index.get(branch.get("return"))
+            if entry is None or not all_chapters:
+                continue
+            if return_index is None or return_index <= entry or return_index - entry > 3:
+                fixed_index = min(entry + 3, len(all_chapters) - 1)
+                if fixed_index <= entry:
+                    continue
+                fixed_return = all_chapters[fixed_index].get("id")
+                reconcile_log.append(f"分支 {branch.get('id')} 回归点 {branch.get('return')} → {fixed_return}")
+                branch["return"] = fixed_return
+
+        return all_chapters, all_branches, all_endings, reconcile_log
 
     def _allocate_chapters(self, total_chapters: int) -> List[Dict[str, Any]]:
         """分配各模块的章节数，每个模块6-8章"""
@@ -296,10 +500,12 @@ class ModularMainRoutePipeline:
         self,
         global_state: Dict[str, Any],
         global_branches: List[Dict[str, Any]],
-        global_endings: List[Dict[str, Any]]
+        global_endings: List[Dict[str, Any]],
+        all_chapters: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """合并所有模块为完整框架"""
-        all_chapters = self.agents["modular_main_route"].get_all_chapters()
+        if all_chapters is None:
+            all_chapters = self.agents["modular_main_route"].get_all_chapters()
 
         # 构建完整框架
         framework = {
@@ -353,6 +559,8 @@ def main():
     parser.add_argument("--story-outline", "-s", help="故事大纲JSON文件路径")
     parser.add_argument("--chapters", "-c", type=int, default=27, help="总章节数（默认27章）")
     parser.add_argument("--output", "-o", help="输出目录", default="./output/modular_main_route")
+    parser.add_argument("--parallel", "-p", action="store_true", help="并发生成四个模块（生成后统一调和）")
+    parser.add_argument("--workers", type=int, help="并发数（默认LLM_MAX_CONCURRENCY）")
 
     args = parser.parse_args()
 
@@ -387,7 +595,9 @@ def main():
     result = pipeline.generate(
         story_outline_data=story_outline_data,
         total_chapters=args.chapters,
-        output_dir=args.output
+        output_dir=args.output,
+        parallel=args.parallel,
+        max_workers=args.workers
     )
 
     print("\n" + "=" * 60)
@@ -14,6 +14,8 @@ from agents.story_orchestration.chapter_detail_agent import ChapterDetailAgent
 # 数据模型
 from utils.logger import log
 from utils.config import config
+from utils.concurrency import run_parallel
+from utils.chapter_dependency_graph import ChapterDependencyGraph
 
 
 class ChapterDetailPipeline:
@@ -25,6 +27,19 @@ class ChapterDetailPipeline:
     Agent依赖关系:
     1. ChapterDetailAgent → 章节详情（逐章生成）
 
+    并发模式（parallel=True）:
+    - 提供路线框架时：按章节依赖图调度，前驱完成后立即生成后继，
+      不同分支/个人线互不等待，每章都能拿到真实的前一章
+    - 未提供路线框架时：所有章节仅基于各自的chapter_plan和路线概览并发生成，
+      再对每章做一次轻量衔接：只改写第一幕，承接前一章的真实结尾
+
+    增量重建（previous_run_dir）:
+    - 每章记录输入哈希（章节规划、大纲片段、场景列表、prompt版本）
+    - 哈希未变的章节直接复用上次运行的结果，只重新生成变化的章节及其直接后继
+
+    分幕模式（scene_level=True）:
+    - 每章先生成分幕骨架，再并发生成每一幕，单幕失败只重试该幕
+
     输入: 路线战略JSON + 故事大纲JSON + 世界观JSON
     输出: 章节详情JSON
     """
@@ -44,10 +59,16 @@ class ChapterDetailPipeline:
         story_outline_data: Optional[Dict[str, Any]] = None,
         world_setting_path: Optional[str] = None,
         world_setting_data: Optional[Dict[str, Any]] = None,
+        route_framework_path: Optional[str] = None,
+        route_framework_data: Optional[Dict[str, Any]] = None,
         output_dir: Optional[str] = None,
         show_progress: bool = True,
         start_chapter: int = 1,
-        end_chapter: Optional[int] = None
+        end_chapter: Optional[int] = None,
+        parallel: bool = False,
+        max_workers: Optional[int] = None,
+        scene_level: bool = False,
+        previous_run_dir: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         生成章节详情
@@ -59,10 +80,16 @@ class ChapterDetailPipeline:
             story_outline_data: 直接传入的故事大纲数据
             world_setting_path: 世界观JSON文件路径
             world_setting_data: 直接传入的世界观数据
+            route_framework_path: 主线框架JSON文件路径（可选，用于构建章节依赖图）
+            route_framework_data: 直接传入的主线框架数据（可包含heroine_route_frameworks）
             output_dir: 输出目录
             show_progress: 是否显示进度
             start_chapter: 起始章节（默认1）
             end_chapter: 结束章节（默认全部）
+            parallel: 是否并发生成章节（生成后衔接开场）
+            max_workers: 并发数（默认使用 config.LLM_MAX_CONCURRENCY）
+            scene_level: 是否分幕生成（骨架 + 并发分幕）
+            previous_run_dir: 上次运行的输出目录（含chapters/），提供时增量重建
 
         Returns:
             章节详情结果字典
@@ -94,6 +121,14 @@ class ChapterDetailPipeline:
         else:
             raise ValueError("必须提供 world_setting_path 或 world_setting_data")
 
+        # 加载主线框架数据（可选）
+        route_framework_json = None
+        if route_framework_data:
+            route_framework_json = route_framework_data
+        elif route_framework_path:
+            with open(route_framework_path, 'r', encoding='utf-8') as f:
+                route_framework_json = json.load(f)
+
         # 提取章节规划
         route_strategy = route_strategy_json.get("steps", {}).get("route_strategy", {})
         chapters = route_strategy.get("chapters", [])
@@ -108,21 +143,62 @@ class ChapterDetailPipeline:
 
         target_chapters = chapters[start_chapter - 1:end_chapter]
 
+        # 构建章节依赖图（路线框架提供共通/分支/个人线依赖，框架外的章节按路线战略顺序承接）
+        dependency_graph = ChapterDependencyGraph.from_route_framework(
+            route_framework_json, chapter_ids=[ch.get("id", "") for ch in chapters]
+        )
+
         result = {
             "input": {
                 "route_strategy_source": route_strategy_path or "direct_data",
                 "story_outline_source": story_outline_path or "direct_data",
                 "world_setting_source": world_setting_path or "direct_data",
+                "route_framework_source": route_framework_path or ("direct_data" if route_framework_json else None),
                 "user_idea": route_strategy_json.get("input", {}).get("user_idea", "")
             },
             "steps": {},
             "final_output": {},
         }
 
+        # 增量重建：复用哈希未变的章节
+        pending_chapters = target_chapters
+        previous_chapters = {}
+        if previous_run_dir:
+            pending_chapters, previous_chapters = self._reuse_previous_chapters(
+                target_chapters, previous_run_dir, dependency_graph,
+                route_strategy_json, story_outline_json, world_setting_json, result
+            )
+
         # 生成章节详情
-        self._run_chapter_steps(
-            target_chapters, route_strategy_json, story_outline_json, world_setting_json, result, show_progress
-        )
+        if not pending_chapters:
+            log.info("所有章节均未变化，无需重新生成")
+        elif parallel and route_framework_json and self._has_parallel_branches(pending_chapters, dependency_graph):
+            self._run_chapter_steps_scheduled(
+                pending_chapters, dependency_graph, route_strategy_json, story_outline_json, world_setting_json,
+                result, show_progress, max_workers, scene_level
+            )
+        elif parallel:
+            self._run_chapter_steps_parallel(
+                pending_chapters, route_strategy_json, story_outline_json, world_setting_json,
+                result, show_progress, max_workers, scene_level, dependency_graph
+            )
+        else:
+            self._run_chapter_steps(
+                pending_chapters, route_strategy_json, story_outline_json, world_setting_json, result, show_progress,
+                max_workers, scene_level, dependency_graph
+            )
+
+        # 增量重建：前一章节结尾变化的复用章节只重新衔接开场
+        if previous_run_dir:
+            self._restitch_reused_chapters(
+                target_chapters, dependency_graph, previous_chapters, story_outline_json, result
+            )
+
+        # 按章节规划顺序整理结果
+        result["steps"] = {
+            ch.get("id", ""): result["steps"][ch.get("id", "")]
+            for ch in target_chapters if ch.get("id", "") in result["steps"]
+        }
 
         # 格式化最终输出
         result["final_output"] = self._format_output(result)
@@ -135,15 +211,20 @@ class ChapterDetailPipeline:
 
     def _run_chapter_steps(
         self, chapters: list, route_strategy_json: Dict, story_outline_json: Dict,
-        world_setting_json: Dict, result: Dict, show_progress: bool
+        world_setting_json: Dict, result: Dict, show_progress: bool,
+        max_workers: Optional[int] = None, scene_level: bool = False,
+        dependency_graph: Optional[ChapterDependencyGraph] = None
     ):
         """执行章节生成步骤"""
         agent = self.agents["chapter_detail"]
 
+        # 按依赖顺序生成，保证前驱章节先完成
+        if dependency_graph is not None:
+            plans_by_id = {ch.get("id", ""): ch for ch in chapters}
+            chapters = [plans_by_id[cid] for cid in dependency_graph.topological_order(plans_by_id)]
+
         # 创建临时保存目录
-        temp_save_dir = Path(result.get("temp_save_dir", "./temp_chapters"))
-        temp_save_dir.mkdir(parents=True, exist_ok=True)
-        result["temp_save_dir"] = str(temp_save_dir)
+        temp_save_dir = self._prepare_temp_dir(result)
 
         pbar = tqdm(chapters, desc="ChapterDetailPipeline: 章节生成", disable=not show_progress)
         for chapter_plan in pbar:
@@ -153,7 +234,7 @@ class ChapterDetailPipeline:
 
             try:
                 # 获取前一章节
-                previous_chapter = agent.get_previous_chapter(chapter_id)
+                previous_chapter = agent.get_previous_chapter(chapter_id, dependency_graph)
                 if not previous_chapter:
                     previous_chapter = None
 
@@ -162,16 +243,16 @@ class ChapterDetailPipeline:
                     route_strategy_data=route_strategy_json,
                     story_outline_data=story_outline_json,
                     world_setting_data=world_setting_json,
-                    previous_chapter=previous_chapter
+                    previous_chapter=previous_chapter,
+                    scene_level=scene_level,
+                    max_workers=max_workers
                 )
 
                 result["steps"][chapter_id] = chapter_detail.model_dump()
                 pbar.write(f"✅ 第{chapter_num}章 完成 ({len(chapter_detail.scenes)}幕)")
 
                 # 立即保存当前章节
-                chapter_file = temp_save_dir / f"{chapter_id}.json"
-                with open(chapter_file, "w", encoding="utf-8") as f:
-                    json.dump(chapter_detail.model_dump(), f, ensure_ascii=False, indent=2)
+                chapter_file = self._save_chapter_file(temp_save_dir, chapter_id, chapter_detail.model_dump())
                 pbar.write(f"   💾 已保存: {chapter_file}")
 
             except Exception as e:
@@ -179,6 +260,245 @@ class ChapterDetailPipeline:
                 log.error(f"第{chapter_num}章 失败: {e}")
                 raise
 
+    @staticmethod
+    def _has_parallel_branches(chapters: list, dependency_graph: ChapterDependencyGraph) -> bool:
+        """依赖图中是否存在可并发的章节（一条直线时依赖调度退化为串行）"""
+        if dependency_graph.max_parallelism(ch.get("id", "") for ch in chapters) > 1:
+            return True
+        log.info("章节依赖为单线，依赖调度无法并发，改用并发生成+开场衔接")
+        return False
+
+    def _run_chapter_steps_scheduled(
+        self, chapters: list, dependency_graph: ChapterDependencyGraph, route_strategy_json: Dict,
+        story_outline_json: Dict, world_setting_json: Dict, result: Dict, show_progress: bool,
+        max_workers: Optional[int] = None, scene_level: bool = False
+    ):
+        """按章节依赖图并发执行章节生成步骤（前驱完成后立即生成后继）"""
+        agent = self.agents["chapter_detail"]
+        temp_save_dir = self._prepare_temp_dir(result)
+        plans_by_id = {ch.get("id", ""): ch for ch in chapters}
+
+        pbar = tqdm(total=len(chapters), desc="ChapterDetailPipeline: 依赖调度", disable=not show_progress)
+
+        def generate_chapter(chapter_id: str):
+            chapter_plan = plans_by_id[chapter_id]
+            chapter_num = chapter_plan.get("chapter", 0)
+            try:
+                chapter_detail = agent.process(
+                    chapter_plan=chapter_plan,
+                    route_strategy_data=route_strategy_json,
+                    story_outline_data=story_outline_json,
+                    world_setting_data=world_setting_json,
+                    previous_chapter=agent.get_previous_chapter(chapter_id, dependency_graph),
+                    scene_level=scene_level,
+                    max_workers=max_workers
+                )
+            except Exception as e:
+                pbar.write(f"❌ 第{chapter_num}章 失败: {e}")
+                log.error(f"第{chapter_num}章 失败: {e}")
+                raise
+
+            chapter_dict = chapter_detail.model_dump()
+            chapter_file = self._save_chapter_file(temp_save_dir, chapter_id, chapter_dict)
+            pbar.update(1)
+            pbar.write(f"✅ 第{chapter_num}章 完成 ({len(chapter_detail.scenes)}幕)  💾 {chapter_file}")
+            return chapter_dict
+
+        generated = dependency_graph.schedule(generate_chapter, plans_by_id, max_workers)
+        pbar.close()
+
+        # 按路线战略顺序写入结果
+        for chapter_id in plans_by_id:
+            result["steps"][chapter_id] = generated[chapter_id]
+
+    def _run_chapter_steps_parallel(
+        self, chapters: list, route_strategy_json: Dict, story_outline_json: Dict,
+        world_setting_json: Dict, result: Dict, show_progress: bool, max_workers: Optional[int] = None,
+        scene_level: bool = False, dependency_graph: Optional[ChapterDependencyGraph] = None
+    ):
+        """并发执行章节生成步骤（先并发生成，再逐章衔接开场）"""
+        agent = self.agents["chapter_detail"]
+        temp_save_dir = self._prepare_temp_dir(result)
+
+        # 1. 并发生成：不传前一章节，只依赖chapter_plan和路线概览
+        pbar = tqdm(total=len(chapters), desc="ChapterDetailPipeline: 并发生成", disable=not show_progress)
+
+        def generate_chapter(chapter_plan: Dict[str, Any]):
+            chapter_num = chapter_plan.get("chapter", 0)
+            try:
+                chapter_detail = agent.process(
+                    chapter_plan=chapter_plan,
+                    route_strategy_data=route_strategy_json,
+                    story_outline_data=story_outline_json,
+                    world_setting_data=world_setting_json,
+                    previous_chapter=None,
+                    scene_level=scene_level,
+                    max_workers=max_workers
+                )
+            except Exception as e:
+                pbar.write(f"❌ 第{chapter_num}章 失败: {e}")
+                log.error(f"第{chapter_num}章 失败: {e}")
+                raise
+            pbar.update(1)
+            pbar.write(f"✅ 第{chapter_num}章 初稿完成 ({len(chapter_detail.scenes)}幕)")
+            return chapter_detail.model_dump()
+
+        drafts = run_parallel(generate_chapter, chapters, max_workers)
+        pbar.close()
+
+        # 2. 衔接：每章第一幕对照前一章的真实结尾改写（前一章结尾不会被改写，可并发）
+        drafts_by_id = {ch.get("id", ""): draft for ch, draft in zip(chapters, drafts)}
+        stitch_bar = tqdm(total=len(chapters), desc="ChapterDetailPipeline: 开场衔接", disable=not show_progress)
+
+        def stitch_chapter(index: int):
+            chapter_id = chapters[index].get("id", "")
+            previous_id = dependency_graph.primary_predecessor(chapter_id) if dependency_graph else None
+            previous_chapter = drafts_by_id.get(previous_id) or agent.get_previous_chapter(chapter_id, dependency_graph)
+            chapter_detail = agent.stitch_opening(
+                chapter_detail=drafts[index],
+                previous_chapter=previous_chapter,
+                chapter_plan=chapters[index],
+                story_outline_data=story_outline_json
+            )
+            stitch_bar.update(1)
+            return chapter_detail.model_dump()
+
+        stitched = run_parallel(stitch_chapter, range(len(drafts)), max_workers)
+        stitch_bar.close()
+
+        for chapter_plan, chapter_dict in zip(chapters, stitched):
+            chapter_id = chapter_plan.get("id", "")
+            result["steps"][chapter_id] = chapter_dict
+            chapter_file = self._save_chapter_file(temp_save_dir, chapter_id, chapter_dict)
+            log.info(f"💾 已保存: {chapter_file}")
+
+    def _reuse_previous_chapters(
+        self, chapters: list, previous_run_dir: str, dependency_graph: ChapterDependencyGraph,
+        route_strategy_json: Dict, story_outline_json: Dict, world_setting_json: Dict, result: Dict
+    ) -> tuple:
+        """
+        复用上次运行中输入哈希未变的章节
+
+        只重新生成plan_hash变化的章节及其直接后继，更后面的章节直接复用，
+        生成完成后由 _restitch_reused_chapters 重新衔接前一章节结尾变化的章节开场
+
+        Returns:
+            (需要重新生成的章节规划列表, 上次运行的章节 {chapter_id: 章节详情})
+        """
+        agent = self.agents["chapter_detail"]
+        previous_chapters = self._load_previous_chapters(previous_run_dir)
+
+        dirty = set()
+        for chapter_plan in chapters:
+            chapter_id = chapter_plan.get("id", "")
+            plan_hash = agent.compute_plan_hash(
+                chapter_plan, route_strategy_json, story_outline_json, world_setting_json
+            )
+            if previous_chapters.get(chapter_id, {}).get("plan_hash") != plan_hash:
+                dirty.add(chapter_id)
+
+        # 前一章重新生成后结尾会变化，直接后继也需要重新生成
+        regenerate = dirty | set(dependency_graph.direct_successors(dirty))
+
+        temp_save_dir = self._prepare_temp_dir(result)
+        pending = []
+        for chapter_plan in chapters:
+            chapter_id = chapter_plan.get("id", "")
+            if chapter_id in regenerate:
+                pending.append(chapter_plan)
+                continue
+            chapter_detail = agent.register_chapter(previous_chapters[chapter_id])
+            result["steps"][chapter_id] = chapter_detail.model_dump()
+            self._save_chapter_file(temp_save_dir, chapter_id, result["steps"][chapter_id])
+
+        result["incremental"] = {
+            "previous_run_dir": str(previous_run_dir),
+            "reused": [ch.get("id", "") for ch in chapters if ch.get("id", "") not in regenerate],
+            "regenerated": [ch.get("id", "") for ch in pending]
+        }
+        log.info(f"增量重建: 复用{len(chapters) - len(pending)}章, 重新生成{len(pending)}章")
+        return pending, previous_chapters
+
+    def _restitch_reused_chapters(
+        self, chapters: list, dependency_graph: ChapterDependencyGraph,
+        previous_chapters: Dict[str, Dict[str, Any]], story_outline_json: Dict, result: Dict
+    ):
+        """
+        重新衔接复用章节的开场
+
+        按依赖顺序比较复用章节记录的input_hash与当前前一章节结尾，
+        不一致时用stitch_opening改写第一幕（同时写入新的input_hash）
+        """
+        agent = self.agents["chapter_detail"]
+        plans_by_id = {ch.get("id", ""): ch for ch in chapters}
+        reused = set(result.get("incremental", {}).get("reused", []))
+        temp_save_dir = self._prepare_temp_dir(result)
+
+        restitched = []
+        for chapter_id in dependency_graph.topological_order(plans_by_id):
+            chapter_dict = result["steps"].get(chapter_id)
+            if chapter_id not in reused or not chapter_dict or not chapter_dict.get("plan_hash"):
+                continue
+
+            # 前一章节：本次已登记的章节优先，生成范围外的前驱使用上次运行的结果
+            predecessor = agent.get_previous_chapter(chapter_id, dependency_graph)
+            predecessor_id = dependency_graph.primary_predecessor(chapter_id)
+            if predecessor is None and predecessor_id:
+                predecessor = previous_chapters.get(predecessor_id)
+
+            input_hash = agent.compute_input_hash(chapter_dict["plan_hash"], predecessor)
+            if chapter_dict.get("input_hash") in (None, input_hash):
+                continue
+
+            log.info(f"{chapter_id} 的前一章节结尾已变化，重新衔接开场")
+            chapter_detail = agent.stitch_opening(
+                chapter_detail=chapter_dict,
+                previous_chapter=predecessor,
+                chapter_plan=plans_by_id[chapter_id],
+                story_outline_data=story_outline_json
+            )
+            result["steps"][chapter_id] = chapter_detail.model_dump()
+            self._save_chapter_file(temp_save_dir, chapter_id, result["steps"][chapter_id])
+            restitched.append(chapter_id)
+
+        result["incremental"]["restitched"] = restitched
+        if restitched:
+            log.info(f"增量重建: 重新衔接{len(restitched)}章开场")
+
+    def _load_previous_chapters(self, previous_run_dir: str) -> Dict[str, Dict[str, Any]]:
+        """读取上次运行的章节文件（支持传入输出目录或其chapters/子目录）"""
+        run_path = Path(previous_run_dir)
+        chapters_dir = run_path / "chapters" if (run_path / "chapters").is_dir() else run_path
+        if not chapters_dir.is_dir():
+            log.warning(f"上次运行目录不存在: {chapters_dir}，将全部重新生成")
+            return {}
+
+        previous_chapters = {}
+        for chapter_file in chapters_dir.glob("*.json"):
+            try:
+                with open(chapter_file, "r", encoding="utf-8") as f:
+                    chapter_detail = json.load(f)
+            except (OSError, json.JSONDecodeError) as e:
+                log.warning(f"读取章节文件失败 {chapter_file}: {e}")
+                continue
+            chapter_id = chapter_detail.get("chapter_id") or chapter_file.stem
+            previous_chapters[chapter_id] = chapter_detail
+        return previous_chapters
+
+    def _prepare_temp_dir(self, result: Dict) -> Path:
+        """创建临时保存目录"""
+        temp_save_dir = Path(result.get("temp_save_dir", "./temp_chapters"))
+        temp_save_dir.mkdir(parents=True, exist_ok=True)
+        result["temp_save_dir"] = str(temp_save_dir)
+        return temp_save_dir
+
+    def _save_chapter_file(self, temp_save_dir: Path, chapter_id: str, chapter_dict: Dict[str, Any]) -> Path:
+        """保存单个章节到临时目录"""
+        chapter_file = temp_save_dir / f"{chapter_id}.json"
+        with open(chapter_file, "w", encoding="utf-8") as f:
+            json.dump(chapter_dict, f, ensure_ascii=False, indent=2)
+        return chapter_file
+
     def _format_output(self, result: Dict) -> Dict[str, Any]:
         """格式化最终输出"""
         output = {
@@ -261,10 +581,15 @@ def main():
     parser.add_argument("--route-strategy", "-r", help="路线战略JSON文件路径")
     parser.add_argument("--story-outline", "-s", help="故事大纲JSON文件路径")
     parser.add_argument("--world-setting", "-w", help="世界观JSON文件路径")
+    parser.add_argument("--route-framework", "-f", help="主线框架JSON文件路径（可选，用于章节依赖调度）")
     parser.add_argument("--output", "-o", help="输出目录", default="./output")
     parser.add_argument("--start", "-st", type=int, default=1, help="起始章节")
     parser.add_argument("--end", "-e", type=int, help="结束章节")
     parser.add_argument("--no-progress", action="store_true", help="不显示进度条")
+    parser.add_argument("--parallel", "-p", action="store_true", help="并发生成章节（生成后衔接开场）")
+    parser.add_argument("--workers", type=int, help="并发数（默认LLM_MAX_CONCURRENCY）")
+    parser.add_argument("--scene-level", action="store_true", help="分幕生成（先生成骨架，再并发生成每一幕）")
+    parser.add_argument("--previous-run", help="上次运行的输出目录（增量重建，只重新生成变化的章节）")
 
     args = parser.parse_args()
 
@@ -316,10 +641,15 @@ def main():
         route_strategy_path=args.route_strategy,
         story_outline_path=args.story_outline,
         world_setting_path=args.world_setting,
+        route_framework_path=args.route_framework,
         output_dir=args.output,
         show_progress=not args.no_progress,
         start_chapter=args.start,
-        end_chapter=args.end
+        end_chapter=args.end,
+        parallel=args.parallel,
+        max_workers=args.workers,
+        scene_level=args.scene_level,
+        previous_run_dir=args.previous_run
     )
 
     print("\n" + "=" * 60)
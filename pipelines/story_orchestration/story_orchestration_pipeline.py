@@ -55,13 +55,13 @@ class StoryOrchestrationPipeline:
         character_states = self._get_character_states()
 
         # 调用规划 Agent
-        result = self.planner.run(
-            outline=json.dumps(outline, ensure_ascii=False),
-            world_setting=json.dumps(world_setting, ensure_ascii=False),
-            characters=json.dumps(characters, ensure_ascii=False),
-            conflicts=json.dumps(conflicts or [], ensure_ascii=False),
-            timeline_history=json.dumps(timeline_history, ensure_ascii=False),
-            character_states=json.dumps(character_states, ensure_ascii=False),
+        result = self.planner.plan_story(
+            outline=outline,
+            world_setting=world_setting,
+            characters=characters,
+            conflicts=conflicts,
+            timeline_history=timeline_history,
+            character_states=character_states,
             chapter_count=chapter_count
         )
 
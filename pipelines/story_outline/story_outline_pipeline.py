@@ -3,8 +3,9 @@ GAL-Dreamer 故事大纲 Pipeline (Phase 0)
 基于世界观JSON生成故事大纲 - 包含5个Agent + 修复循环
 """
 import json
+from concurrent.futures import Future
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable
 from datetime import datetime
 from tqdm import tqdm
 
@@ -19,6 +20,12 @@ from agents.story_outline.story_fixer_agent import StoryFixerAgent
 # 数据模型
 from utils.logger import log
 from utils.config import config
+from utils.concurrency import run_in_background
+from utils.fix_convergence import FixConvergenceTracker, _issue_get
+from utils.consistency_delta import merge_carried_issues
+from utils.story_consistency_checker import check_story_consistency, is_rule_report
+from utils.world_digest import build_world_digest
+from utils.json_utils import prompt_json
 from models.story_outline.premise import StoryPremise
 from models.story_outline.cast_arc import CastArc
 from models.story_outline.conflict_map import ConflictMap
@@ -42,14 +49,32 @@ class StoryOutlinePipeline:
     - 发现问题先修复，再生成具体冲突
     - 避免生成大量具体冲突后发现框架问题需要重做
 
+    推测执行（speculative_conflicts）:
+    - 大纲一致性检查的同时在后台生成主冲突列表
+    - 检查没有关键问题时直接使用，有关键问题（进入修复循环）时丢弃
+
     输入: 世界观JSON文件路径或数据
     输出: 故事大纲JSON
     """
 
     MAX_FIX_ROUNDS = 4
+    # 涉及整个角色阵容的规则问题，CastArcAgent修复时需要完整重做
+    CAST_STRUCTURAL_ISSUES = ("rule_cast_no_protagonist", "rule_cast_no_heroines", "rule_cast_duplicate")
+    # 被点名的角色超过阵容的这个比例时直接完整重做
+    CAST_PARTIAL_REDO_MAX_SHARE = 0.5
+
+    def __init__(self, speculative_conflicts: Optional[bool] = None):
+        """
+        初始化 Pipeline
+
+        Args:
+            speculative_conflicts: 是否在大纲一致性检查的同时推测生成主冲突
+                （默认使用 config.STORY_OUTLINE_SPECULATIVE_CONFLICTS）
+        """
+        if speculative_conflicts is None:
+            speculative_conflicts = config.STORY_OUTLINE_SPECULATIVE_CONFLICTS
+        self.speculative_conflicts = speculative_conflicts
 
-    def __init__(self):
-        """初始化 Pipeline"""
         self.agents = {
             "premise": StoryPremiseAgent(),
             "cast_arc": CastArcAgent(),
@@ -58,7 +83,7 @@ class StoryOutlinePipeline:
             "consistency": StoryConsistencyAgent(),
             "fixer": StoryFixerAgent(),
         }
-        log.info("StoryOutlinePipeline 初始化完成")
+        log.info(f"StoryOutlinePipeline 初始化完成 (推测生成冲突: {speculative_conflicts})")
 
     def generate(
         self,
@@ -102,12 +127,16 @@ class StoryOutlinePipeline:
             "final_output": {},
         }
 
-        # 生成世界观摘要（用于日志）
-        world_summary = self._format_world_summary(world_setting_json.get("steps", {}))
+        # 生成世界观摘要（下游Agent共用，按内容哈希缓存）
+        build_world_digest(world_setting_json)
 
         # 1. 执行基础生成步骤（前提 + 角色 + 冲突大纲）
         self._run_outline_steps(world_setting_json, result, show_progress)
 
+        # 推测执行：检查期间在后台生成主冲突
+        speculation = self._start_speculative_main_conflicts(world_setting_json, result) \
+            if self.speculative_conflicts else None
+
         # 2. 大纲阶段一致性检查（基于前提+角色+大纲）
         outline_consistency = self._run_outline_consistency_check(
             world_setting_json, result
@@ -120,13 +149,20 @@ class StoryOutlinePipeline:
         should_fix = len(critical_issues) > 0
 
         if should_fix:
+            if speculation is not None:
+                speculation.cancel()
+                speculation = None
+                log.info("大纲需要修复，丢弃推测生成的主冲突")
             print(f"\n🔧 大纲阶段发现{len(critical_issues)}个关键问题，开始修复循环...")
             result = self._run_outline_fix_loop(
                 world_setting_json, result, show_progress
             )
 
         # 4. 生成具体冲突（基于已验证的大纲）
-        self._generate_conflict_details(world_setting_json, result, show_progress)
+        self._generate_conflict_details(
+            world_setting_json, result, show_progress,
+            main_conflicts=self._take_speculative_main_conflicts(speculation)
+        )
 
         # 5. 格式化最终输出
         result["final_output"] = self._format_output(result)
@@ -137,14 +173,6 @@ class StoryOutlinePipeline:
 
         return result
 
-    def _format_world_summary(self, steps: Dict) -> str:
-        """格式化世界观摘要"""
-        lines = ["世界观摘要:"]
-        for key, value in steps.items():
-            # 直接把每个元素当字符串处理，不截断
-            lines.append(f"- {key}: {str(value)}")
-        return "\n".join(lines)
-
     def _run_outline_steps(self, world_setting_json: Dict, result: Dict, show_progress: bool):
         """执行大纲生成步骤（前提 + 角色 + 冲突大纲）"""
         steps = [
@@ -166,9 +194,18 @@ class StoryOutlinePipeline:
                 raise
 
     def _run_outline_consistency_check(
-        self, world_setting_json: Dict, result: Dict
+        self,
+        world_setting_json: Dict,
+        result: Dict,
+        changed_steps: Optional[List[str]] = None,
+        prior_issues: Optional[List] = None
     ) -> StoryConsistencyReport:
-        """大纲阶段一致性检查（基于前提+角色+大纲，不含具体冲突细节）"""
+        """
+        大纲阶段一致性检查（基于前提+角色+大纲，不含具体冲突细节）
+
+        修复后复查时传入changed_steps和prior_issues，只完整检查被修改的步骤。
+        先执行规则检查，发现关键引用问题时直接交给修复循环，跳过LLM检查
+        """
         log.info("执行大纲阶段一致性检查...")
 
         user_idea = world_setting_json.get("input", {}).get("user_idea", "")
@@ -195,13 +232,29 @@ class StoryOutlinePipeline:
             "conflict_constraints": []
         }
 
-        report = self.agents["consistency"].process(
-            user_idea=user_idea,
-            world_setting_json=world_setting_json,
-            premise=premise_dict,
-            cast_arc=cast_arc_dict,
-            conflict_map=empty_conflict_map,
-            conflict_outline=conflict_outline
+        rule_report = check_story_consistency(
+            premise_dict, cast_arc_dict, empty_conflict_map, conflict_outline, world_setting_json
+        )
+
+        # 上一次只做了规则检查时，LLM还没有完整检查过，不能增量复查
+        if changed_steps is not None and is_rule_report(result["steps"].get("outline_consistency")):
+            changed_steps, prior_issues = None, None
+
+        report = self._check_with_rules(
+            result,
+            rule_report,
+            lambda prior: self.agents["consistency"].process(
+                user_idea=user_idea,
+                world_setting_json=world_setting_json,
+                premise=premise_dict,
+                cast_arc=cast_arc_dict,
+                conflict_map=empty_conflict_map,
+                conflict_outline=conflict_outline,
+                changed_steps=changed_steps,
+                prior_issues=prior
+            ),
+            prior_issues=prior_issues,
+            delta=changed_steps is not None
         )
 
         # 打印检查结果
@@ -242,13 +295,20 @@ class StoryOutlinePipeline:
             conflict_outline = None
             conflict_map_dict = conflict_data.model_dump() if hasattr(conflict_data, "model_dump") else conflict_data
 
-        report = self.agents["consistency"].process(
-            user_idea=user_idea,
-            world_setting_json=world_setting_json,
-            premise=premise_dict,
-            cast_arc=cast_arc_dict,
-            conflict_map=conflict_map_dict,
-            conflict_outline=conflict_outline  # 传递冲突大纲
+        rule_report = check_story_consistency(
+            premise_dict, cast_arc_dict, conflict_map_dict, conflict_outline, world_setting_json
+        )
+        report = self._check_with_rules(
+            result,
+            rule_report,
+            lambda prior: self.agents["consistency"].process(
+                user_idea=user_idea,
+                world_setting_json=world_setting_json,
+                premise=premise_dict,
+                cast_arc=cast_arc_dict,
+                conflict_map=conflict_map_dict,
+                conflict_outline=conflict_outline  # 传递冲突大纲
+            )
         )
 
         # 打印检查结果
@@ -262,12 +322,54 @@ class StoryOutlinePipeline:
 
         return report
 
+    def _check_with_rules(
+        self,
+        result: Dict,
+        rule_report: Dict[str, Any],
+        llm_check: Callable[[Optional[List]], StoryConsistencyReport],
+        prior_issues: Optional[List] = None,
+        delta: bool = False
+    ) -> StoryConsistencyReport:
+        """
+        结合规则检查和LLM检查
+
+        规则检查发现critical问题时直接返回规则报告（交给修复循环，不花费LLM检查）；
+        否则执行LLM检查，并把规则问题合并进LLM报告
+
+        Args:
+            result: 结果字典（记录本次检查方式）
+            rule_report: 规则检查报告
+            llm_check: LLM检查函数，参数为需要保留的上一轮问题
+            prior_issues: 上一轮问题（增量复查时使用）
+            delta: 是否为增量复查
+
+        Returns:
+            一致性报告
+        """
+        critical_rules = [i for i in rule_report["issues"] if i["severity"] == "critical"]
+        if critical_rules:
+            print(f"   规则检查发现{len(critical_rules)}个关键问题，跳过LLM检查")
+            result["consistency_check_mode"] = "rule"
+            return StoryConsistencyReport(**rule_report)
+
+        # 规则问题每次重新计算，不从上一轮保留
+        if prior_issues:
+            prior_issues = [i for i in prior_issues if not str(i.issue_id).startswith("rule_")]
+
+        report = llm_check(prior_issues)
+        if rule_report["issues"]:
+            report = StoryConsistencyReport(**merge_carried_issues(report.model_dump(), rule_report["issues"]))
+        result["consistency_check_mode"] = "delta" if delta else "full"
+        return report
+
     def _run_outline_fix_loop(
         self, world_setting_json: Dict, result: Dict, show_progress: bool
     ) -> Dict:
         """大纲阶段修复循环（只修复前提、角色、大纲，不涉及具体冲突）"""
         user_idea = world_setting_json.get("input", {}).get("user_idea", "")
         fix_round = 0
+        tracker = FixConvergenceTracker("大纲阶段")
+        tracker.start(result["steps"]["outline_consistency"].get_critical_issues())
 
         while fix_round < self.MAX_FIX_ROUNDS:
             consistency_report = result["steps"]["outline_consistency"]
@@ -305,25 +407,64 @@ class StoryOutlinePipeline:
             })
 
             # 执行大纲修复
-            self._apply_outline_fixes(world_setting_json, result, fix_plan.fix_tasks)
+            changed_steps = self._apply_outline_fixes(
+                world_setting_json, result, fix_plan.fix_tasks, consistency_report.issues
+            )
 
-            # 重新检查大纲
-            print("   重新检查大纲...")
-            new_report = self._run_outline_consistency_check(world_setting_json, result)
+            # 重新检查大纲（最后一轮完整检查，其余轮次只复查被修改的步骤）
+            full_check = fix_round >= self.MAX_FIX_ROUNDS
+            if full_check:
+                print("   重新检查大纲...")
+                new_report = self._run_outline_consistency_check(world_setting_json, result)
+            else:
+                print("   增量复查大纲...")
+                new_report = self._run_outline_consistency_check(
+                    world_setting_json, result,
+                    changed_steps=changed_steps,
+                    prior_issues=consistency_report.issues
+                )
             result["steps"]["outline_consistency"] = new_report
+            result["fix_history"][-1]["check_mode"] = result["consistency_check_mode"]
+
+            # 记录本轮解决情况
+            convergence = tracker.record_round(fix_round, new_report.get_critical_issues())
+            result["fix_history"][-1]["convergence"] = convergence
 
             if not fix_plan.should_continue:
                 print("   大纲修复完成，结束循环")
                 break
 
+            stop_reason = tracker.should_stop(convergence)
+            if stop_reason:
+                print(f"   {stop_reason}，结束循环")
+                result["fix_history"][-1]["stop_reason"] = stop_reason
+                break
+
         if fix_round >= self.MAX_FIX_ROUNDS:
             print(f"\n⚠️ 已达到最大修复轮次({self.MAX_FIX_ROUNDS})")
 
+        # 最终结果以完整检查为准
+        outline_history = [h for h in result["fix_history"] if h.get("stage") == "outline"]
+        if outline_history and outline_history[-1].get("check_mode") == "delta":
+            print("   最终完整检查大纲...")
+            result["steps"]["outline_consistency"] = self._run_outline_consistency_check(world_setting_json, result)
+            outline_history[-1]["check_mode"] = f"delta+{result['consistency_check_mode']}"
+
         return result
 
-    def _apply_outline_fixes(self, world_setting_json: Dict, result: Dict, fix_tasks):
-        """应用大纲阶段的修复"""
-        user_idea = world_setting_json.get("input", {}).get("user_idea", "")
+    def _apply_outline_fixes(
+        self, world_setting_json: Dict, result: Dict, fix_tasks, issues: Optional[List] = None
+    ) -> List[str]:
+        """
+        应用大纲阶段的修复
+
+        Args:
+            issues: 本轮检查报告中的问题（用于定位角色问题涉及的角色）
+
+        Returns:
+            被修改（或需要重新检查）的步骤key
+        """
+        changed_steps = []
 
         for task in fix_tasks:
             agent_name = task.agent_name
@@ -331,14 +472,22 @@ class StoryOutlinePipeline:
             if agent_name == "StoryPremiseAgent":
                 premise = self._redo_premise(world_setting_json, result, task.fix_instructions)
                 result["steps"]["premise"] = premise
+                step_keys = ["premise"]
 
             elif agent_name == "CastArcAgent":
-                cast_arc = self._redo_cast_arc(world_setting_json, result, task.fix_instructions)
-                result["steps"]["cast_arc"] = cast_arc
+                step_keys = self._fix_cast_arc(world_setting_json, result, task, issues, ["conflict_outline"])
 
             elif agent_name == "ConflictOutlineAgent":
                 conflict_outline = self._redo_conflict_outline_only(world_setting_json, result, task.fix_instructions)
                 result["steps"]["conflict_outline"] = conflict_outline
+                step_keys = ["conflict_outline"]
+
+            else:
+                continue
+
+            changed_steps.extend(key for key in step_keys if key not in changed_steps)
+
+        return changed_steps
 
     def _redo_conflict_outline_only(self, world_setting_json: Dict, result: Dict, fix_instructions: str):
         """重新生成冲突大纲（不带具体冲突）"""
@@ -358,8 +507,37 @@ class StoryOutlinePipeline:
         )
         return conflict_outline
 
-    def _generate_conflict_details(self, world_setting_json: Dict, result: Dict, show_progress: bool):
-        """基于已验证的大纲生成具体冲突"""
+    def _start_speculative_main_conflicts(self, world_setting_json: Dict, result: Dict) -> Future:
+        """在后台基于当前大纲生成主冲突列表（与大纲一致性检查重叠）"""
+        user_idea = world_setting_json.get("input", {}).get("user_idea", "")
+        premise = result["steps"]["premise"]
+        cast_arc = result["steps"]["cast_arc"]
+
+        premise_dict = premise.model_dump() if hasattr(premise, "model_dump") else premise
+        cast_arc_dict = cast_arc.model_dump() if hasattr(cast_arc, "model_dump") else cast_arc
+
+        log.info("推测生成主冲突（与大纲一致性检查并行）...")
+        return run_in_background(
+            self._generate_main_conflicts,
+            world_setting_json, premise_dict, cast_arc_dict, result["steps"]["conflict_outline"], user_idea
+        )
+
+    def _take_speculative_main_conflicts(self, speculation: Optional[Future]) -> Optional[List]:
+        """取回推测生成的主冲突（没有推测或推测失败时返回None，由正常流程生成）"""
+        if speculation is None:
+            return None
+        try:
+            main_conflicts = speculation.result()
+        except Exception as e:
+            log.warning(f"推测生成主冲突失败，重新生成: {e}")
+            return None
+        log.info(f"使用推测生成的主冲突: {len(main_conflicts)}个")
+        return main_conflicts
+
+    def _generate_conflict_details(
+        self, world_setting_json: Dict, result: Dict, show_progress: bool, main_conflicts: Optional[List] = None
+    ):
+        """基于已验证的大纲生成具体冲突（main_conflicts为推测生成的主冲突）"""
         print("\n📝 生成具体冲突...")
         user_idea = world_setting_json.get("input", {}).get("user_idea", "")
         premise = result["steps"]["premise"]
@@ -370,7 +548,8 @@ class StoryOutlinePipeline:
         cast_arc_dict = cast_arc.model_dump() if hasattr(cast_arc, "model_dump") else cast_arc
 
         conflict_map = self._generate_conflicts_from_outline(
-            world_setting_json, premise_dict, cast_arc_dict, conflict_outline, user_idea
+            world_setting_json, premise_dict, cast_arc_dict, conflict_outline, user_idea,
+            main_conflicts=main_conflicts
         )
 
         result["steps"]["conflict_engine"] = {
@@ -385,6 +564,8 @@ class StoryOutlinePipeline:
         """执行修复循环"""
         user_idea = world_setting_json.get("input", {}).get("user_idea", "")
         fix_round = 0
+        tracker = FixConvergenceTracker("故事大纲")
+        tracker.start(result["steps"]["consistency"].get_critical_issues())
 
         while fix_round < self.MAX_FIX_ROUNDS:
             consistency_report = result["steps"]["consistency"]
@@ -421,26 +602,34 @@ class StoryOutlinePipeline:
             })
 
             # 执行修复
-            self._apply_fixes(world_setting_json, result, fix_plan)
+            self._apply_fixes(world_setting_json, result, fix_plan, consistency_report.issues)
 
             # 重新检查
             print("   重新检查...")
             new_report = self._run_consistency_check(world_setting_json, result)
             result["steps"]["consistency"] = new_report
 
+            # 记录本轮解决情况
+            convergence = tracker.record_round(fix_round, new_report.get_critical_issues())
+            result["fix_history"][-1]["convergence"] = convergence
+
             if not fix_plan.should_continue:
                 print("   修复完成，结束循环")
                 break
 
+            stop_reason = tracker.should_stop(convergence)
+            if stop_reason:
+                print(f"   {stop_reason}，结束循环")
+                result["fix_history"][-1]["stop_reason"] = stop_reason
+                break
+
         if fix_round >= self.MAX_FIX_ROUNDS:
             print(f"\n⚠️ 已达到最大修复轮次({self.MAX_FIX_ROUNDS})")
 
         return result
 
-    def _apply_fixes(self, world_setting_json: Dict, result: Dict, fix_plan):
+    def _apply_fixes(self, world_setting_json: Dict, result: Dict, fix_plan, issues: Optional[List] = None):
         """应用修复"""
-        user_idea = world_setting_json.get("input", {}).get("user_idea", "")
-
         for task in fix_plan.fix_tasks:
             agent_name = task.agent_name
 
@@ -449,8 +638,7 @@ class StoryOutlinePipeline:
                 result["steps"]["premise"] = premise
 
             elif agent_name == "CastArcAgent":
-                cast_arc = self._redo_cast_arc(world_setting_json, result, task.fix_instructions)
-                result["steps"]["cast_arc"] = cast_arc
+                self._fix_cast_arc(world_setting_json, result, task, issues)
 
             elif agent_name == "ConflictOutlineAgent":
                 # 重新生成冲突大纲和冲突细节
@@ -486,6 +674,96 @@ class StoryOutlinePipeline:
         )
         return cast_arc
 
+    def _fix_cast_arc(
+        self,
+        world_setting_json: Dict,
+        result: Dict,
+        task,
+        issues: Optional[List] = None,
+        downstream_steps: Optional[List[str]] = None
+    ) -> List[str]:
+        """
+        执行CastArcAgent修复任务
+
+        问题只涉及少数角色时只重新生成这些角色（按character_id合并回原阵容），
+        无法定位、涉及整个阵容或局部重做失败时完整重做
+
+        Args:
+            task: 修复任务
+            issues: 本轮检查报告中的问题
+            downstream_steps: 依赖角色弧光的下游步骤key
+
+        Returns:
+            被修改（或需要重新检查）的步骤key：cast_arc，以及引用了被修改角色的下游步骤
+            （完整重做时为所有已生成的下游步骤）
+        """
+        cast_arc = result["steps"]["cast_arc"]
+        cast_dict = cast_arc.model_dump() if hasattr(cast_arc, "model_dump") else cast_arc
+        downstream = [key for key in downstream_steps or [] if result["steps"].get(key)]
+
+        character_ids = self._cast_fix_targets(cast_dict, task, issues)
+        if character_ids:
+            print(f"     🔧 局部重做角色: {', '.join(character_ids)}")
+            cast_arc = self._redo_cast_characters(world_setting_json, result, task.fix_instructions, character_ids)
+            if cast_arc is not None:
+                result["steps"]["cast_arc"] = cast_arc
+                return ["cast_arc"] + [
+                    key for key in downstream
+                    if CastArcAgent.find_characters(cast_dict, [prompt_json(result["steps"][key])], character_ids)
+                ]
+
+        result["steps"]["cast_arc"] = self._redo_cast_arc(world_setting_json, result, task.fix_instructions)
+        return ["cast_arc"] + downstream
+
+    def _cast_fix_targets(self, cast_dict: Dict, task, issues: Optional[List]) -> List[str]:
+        """
+        找出修复任务涉及的角色（在修复指令和对应问题的描述/建议中按ID或名称查找）
+
+        Returns:
+            角色ID；无法定位、涉及整个阵容或涉及角色过多时返回空列表（完整重做）
+        """
+        issue_ids = set(getattr(task, "issues_to_fix", None) or [])
+        related = [
+            issue for issue in issues or []
+            if (_issue_get(issue, "issue_id") in issue_ids if issue_ids
+                else _issue_get(issue, "source_agent") == "CastArcAgent")
+        ]
+        if any(str(_issue_get(issue, "issue_id") or "").startswith(self.CAST_STRUCTURAL_ISSUES) for issue in related):
+            return []
+
+        texts = [task.fix_instructions] + [
+            text for issue in related
+            for text in (_issue_get(issue, "description"), _issue_get(issue, "fix_suggestion"))
+        ]
+        character_ids = CastArcAgent.find_characters(cast_dict, texts)
+        cast_size = (1 if cast_dict.get("protagonist") else 0) + sum(
+            len(cast_dict.get(key) or []) for key in ("heroines", "supporting_cast", "antagonists")
+        )
+        if len(character_ids) > cast_size * self.CAST_PARTIAL_REDO_MAX_SHARE:
+            return []
+        return character_ids
+
+    def _redo_cast_characters(
+        self, world_setting_json: Dict, result: Dict, fix_instructions: str, character_ids: List[str]
+    ) -> Optional[CastArc]:
+        """只重新生成指定角色（失败时返回None）"""
+        user_idea = world_setting_json.get("input", {}).get("user_idea", "")
+        premise = result["steps"]["premise"]
+        premise_dict = premise.model_dump() if hasattr(premise, "model_dump") else premise
+
+        try:
+            return self.agents["cast_arc"].redo_characters(
+                world_setting_json=world_setting_json,
+                premise_json=premise_dict,
+                cast_arc=result["steps"]["cast_arc"],
+                character_ids=character_ids,
+                user_idea=user_idea,
+                fix_instructions=fix_instructions
+            )
+        except Exception as e:
+            log.warning(f"角色局部重做失败，改为完整重做: {e}")
+            return None
+
     def _redo_conflict_outline(self, world_setting_json: Dict, result: Dict, fix_instructions: str):
         """重新执行conflict_outline和conflict_engine（带修复指令）- 修复框架层面问题"""
         user_idea = world_setting_json.get("input", {}).get("user_idea", "")
@@ -629,29 +907,41 @@ class StoryOutlinePipeline:
             "map": conflict_map
         }
 
-    def _generate_conflicts_from_outline(
+    def _generate_main_conflicts(
         self, world_setting_json: Dict, premise_dict: Dict, cast_arc_dict: Dict,
         conflict_outline: Dict, user_idea: str, fix_instructions: str = ""
+    ) -> List:
+        """基于冲突大纲生成主冲突列表（至少3个）"""
+        return self.agents["conflict_engine"].generate_main_conflicts(
+            world_setting_json=build_world_digest(world_setting_json),
+            premise_json=prompt_json(premise_dict),
+            cast_arc_json=prompt_json(cast_arc_dict),
+            main_conflicts_outline=prompt_json(conflict_outline.get("main_conflicts_outline", [])),
+            user_idea=user_idea,
+            fix_instructions=fix_instructions
+        )
+
+    def _generate_conflicts_from_outline(
+        self, world_setting_json: Dict, premise_dict: Dict, cast_arc_dict: Dict,
+        conflict_outline: Dict, user_idea: str, fix_instructions: str = "",
+        main_conflicts: Optional[List] = None
     ) -> ConflictMap:
-        """基于冲突大纲生成具体冲突"""
+        """基于冲突大纲生成具体冲突（传入main_conflicts时跳过主冲突生成）"""
         from models.story_outline.conflict_map import ConflictMap
         import uuid
-        import json
 
         # 格式化世界观数据
-        world_setting_str = self._format_world_setting(world_setting_json.get("steps", {}))
+        world_setting_str = build_world_digest(world_setting_json)
 
         # 第一阶段：生成主冲突列表（至少3个）
-        print("   📌 生成主冲突列表...")
-        main_conflicts = self.agents["conflict_engine"].generate_main_conflicts(
-            world_setting_json=world_setting_str,
-            premise_json=json.dumps(premise_dict, ensure_ascii=False),
-            cast_arc_json=json.dumps(cast_arc_dict, ensure_ascii=False),
-            main_conflicts_outline=json.dumps(conflict_outline.get("main_conflicts_outline", []), ensure_ascii=False),
-            user_idea=user_idea,
-            fix_instructions=fix_instructions
-        )
-        print(f"     生成了 {len(main_conflicts)} 个主冲突")
+        if main_conflicts is None:
+            print("   📌 生成主冲突列表...")
+            main_conflicts = self._generate_main_conflicts(
+                world_setting_json, premise_dict, cast_arc_dict, conflict_outline, user_idea, fix_instructions
+            )
+            print(f"     生成了 {len(main_conflicts)} 个主冲突")
+        else:
+            print(f"   📌 使用推测生成的主冲突列表（{len(main_conflicts)}个）")
 
         # 第二阶段：生成次要冲突
         print("   📌 生成次要冲突...")
@@ -665,9 +955,9 @@ class StoryOutlinePipeline:
             }
             new_conflict = self.agents["conflict_engine"].generate_secondary_conflict(
                 world_setting_json=world_setting_str,
-                premise_json=json.dumps(premise_dict, ensure_ascii=False),
-                previous_conflicts=json.dumps(prev_conflicts, ensure_ascii=False),
-                conflict_outline=json.dumps(sec_outline, ensure_ascii=False),
+                premise_json=prompt_json(premise_dict),
+                previous_conflicts=prompt_json(prev_conflicts),
+                conflict_outline=prompt_json(sec_outline),
                 conflict_index=i+1,
                 user_idea=user_idea,
                 fix_instructions=fix_instructions
@@ -687,8 +977,8 @@ class StoryOutlinePipeline:
             }
             new_conflict = self.agents["conflict_engine"].generate_background_conflict(
                 world_setting_json=world_setting_str,
-                previous_conflicts=json.dumps(prev_conflicts, ensure_ascii=False),
-                conflict_outline=json.dumps(bg_outline, ensure_ascii=False),
+                previous_conflicts=prompt_json(prev_conflicts),
+                conflict_outline=prompt_json(bg_outline),
                 conflict_index=i+1,
                 user_idea=user_idea,
                 fix_instructions=fix_instructions
@@ -704,10 +994,10 @@ class StoryOutlinePipeline:
         }
         escalation_curve = self.agents["conflict_engine"].generate_escalation_curve(
             world_setting_json=world_setting_str,
-            premise_json=json.dumps(premise_dict, ensure_ascii=False),
-            all_conflicts_json=json.dumps(all_conflicts, ensure_ascii=False),
-            escalation_structure=json.dumps(conflict_outline.get("escalation_structure", {}), ensure_ascii=False),
-            critical_choices=json.dumps(conflict_outline.get("critical_choice_outline", []), ensure_ascii=False),
+            premise_json=prompt_json(premise_dict),
+            all_conflicts_json=prompt_json(all_conflicts),
+            escalation_structure=prompt_json(conflict_outline.get("escalation_structure", {})),
+            critical_choices=prompt_json(conflict_outline.get("critical_choice_outline", [])),
             user_idea=user_idea,
             fix_instructions=fix_instructions
         )
@@ -715,8 +1005,8 @@ class StoryOutlinePipeline:
         # 第五阶段：生成冲突链和势力博弈
         print("   📌 生成冲突链和势力博弈...")
         conflict_chain_data = self.agents["conflict_engine"].generate_conflict_chain(
-            all_conflicts_json=json.dumps(all_conflicts, ensure_ascii=False),
-            cast_arc_json=json.dumps(cast_arc_dict, ensure_ascii=False),
+            all_conflicts_json=prompt_json(all_conflicts),
+            cast_arc_json=prompt_json(cast_arc_dict),
             user_idea=user_idea,
             fix_instructions=fix_instructions
         )
@@ -736,16 +1026,6 @@ class StoryOutlinePipeline:
 
         return conflict_map
 
-    def _format_world_setting(self, steps: Dict) -> str:
-        """格式化世界观数据为字符串（每个元素当str处理，不解析）"""
-        lines = []
-        for key, value in steps.items():
-            # 直接转字符串，不做JSON序列化
-            lines.append(f"【{key}】")
-            lines.append(str(value))
-            lines.append("")  # 空行分隔
-        return "\n".join(lines)
-
     def _format_output(self, result: Dict) -> Dict[str, Any]:
         """格式化最终输出"""
         premise = result["steps"]["premise"]
@@ -857,6 +1137,10 @@ def main():
     parser.add_argument("--world-setting", "-w", help="世界观JSON文件路径")
     parser.add_argument("--output", "-o", help="输出目录", default="./output")
     parser.add_argument("--no-progress", action="store_true", help="不显示进度条")
+    parser.add_argument(
+        "--speculative", action="store_true", default=None,
+        help="大纲一致性检查的同时推测生成主冲突（默认读取 STORY_OUTLINE_SPECULATIVE_CONFLICTS）"
+    )
 
     args = parser.parse_args()
 
@@ -878,7 +1162,7 @@ def main():
         print("错误: 请提供有效的世界观JSON文件路径")
         return 1
 
-    pipeline = StoryOutlinePipeline()
+    pipeline = StoryOutlinePipeline(speculative_conflicts=args.speculative)
 
     print("\n" + "=" * 60)
     print("GAL-Dreamer 故事大纲生成 (Phase 0)")
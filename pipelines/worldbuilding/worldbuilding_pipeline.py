@@ -22,6 +22,10 @@ from agents.worldbuilding.world_summary_agent import WorldSummaryAgent
 # 数据模型
 from utils.logger import log
 from utils.config import config
+from utils.concurrency import run_parallel
+from utils.fix_convergence import FixConvergenceTracker
+from utils.consistency_delta import merge_carried_issues
+from utils.world_consistency_checker import check_world_consistency, is_rule_report
 from models.story import StoryConstraints
 from models.worldbuilding.world import WorldSetting
 from models.worldbuilding.key_element import KeyElements
@@ -47,19 +51,29 @@ class WorldbuildingPipeline:
     7. WorldConsistencyAgent  → 基于步骤1,2,3,4,5,6 (一致性检查)
     8. WorldFixerAgent        → 基于所有步骤 (协调修复，最多4轮)
     9. WorldSummaryAgent      → 基于所有步骤 (生成自然语言摘要)
+
+    宽松依赖模式（relaxed_dependencies）:
+    - 步骤4-6（时间线、氛围、势力NPC）只基于步骤1-3并发生成，三次串行调用变为一轮
+    - 三者之间的偏差交给一致性检查和修复循环处理（修复时按完整依赖提供上下文）
     """
 
     # 最大修复轮次
     MAX_FIX_ROUNDS = 4
+    # 宽松依赖模式下并发生成的步骤
+    RELAXED_STEPS = ("timeline", "atmosphere", "npc_faction")
 
-    def __init__(self, enable_auto_fix: bool = True):
+    def __init__(self, enable_auto_fix: bool = True, relaxed_dependencies: Optional[bool] = None):
         """
         初始化 Pipeline
 
         Args:
             enable_auto_fix: 是否启用自动修复功能
+            relaxed_dependencies: 步骤4-6是否并发生成（默认使用 config.WORLDBUILDING_RELAXED_DEPS）
         """
         self.enable_auto_fix = enable_auto_fix
+        if relaxed_dependencies is None:
+            relaxed_dependencies = config.WORLDBUILDING_RELAXED_DEPS
+        self.relaxed_dependencies = relaxed_dependencies
 
         self.agents = {
             "story_intake": StoryIntakeAgent(),
@@ -72,7 +86,9 @@ class WorldbuildingPipeline:
             "fixer": WorldFixerAgent(),
             "summary": WorldSummaryAgent(),
         }
-        log.info(f"WorldbuildingPipeline 初始化完成 (自动修复: {enable_auto_fix})")
+        log.info(
+            f"WorldbuildingPipeline 初始化完成 (自动修复: {enable_auto_fix}, 宽松依赖: {relaxed_dependencies})"
+        )
 
     def generate(
         self,
@@ -102,13 +118,27 @@ class WorldbuildingPipeline:
             ("7️⃣ 一致性检查", "consistency", self._step_consistency),
         ]
 
+        # 宽松依赖模式：步骤4-6合并为一组并发执行
+        stages = []
+        for step in initial_steps:
+            if self.relaxed_dependencies and step[1] in self.RELAXED_STEPS:
+                if not stages or not isinstance(stages[-1], list):
+                    stages.append([])
+                stages[-1].append(step)
+            else:
+                stages.append(step)
+
         # 执行初始生成
-        pbar = tqdm(initial_steps, desc="WorldbuildingPipeline", disable=not show_progress)
-        for step_name, step_key, step_func in pbar:
+        pbar = tqdm(stages, desc="WorldbuildingPipeline", disable=not show_progress)
+        for stage in pbar:
+            group = stage if isinstance(stage, list) else [stage]
+            step_name = " + ".join(name for name, _, _ in group)
             pbar.set_description(f"{step_name}")
             try:
-                step_result = step_func(result)
-                result["steps"][step_key] = step_result
+                # 同组步骤都基于组开始前的数据，结果收集后统一写回
+                step_results = run_parallel(lambda step: step[2](result), group)
+                for (_, step_key, _), step_result in zip(group, step_results):
+                    result["steps"][step_key] = step_result
                 pbar.write(f"✅ {step_name} 完成")
             except Exception as e:
                 pbar.write(f"❌ {step_name} 失败: {e}")
@@ -138,6 +168,9 @@ class WorldbuildingPipeline:
 
     def _run_fix_loop(self, result: Dict, show_progress: bool) -> Dict:
         """运行修复循环"""
+        tracker = FixConvergenceTracker("世界观")
+        tracker.start(self._get_priority_issues(result["steps"]["consistency"]))
+
         for round_num in range(1, self.MAX_FIX_ROUNDS + 1):
             consistency = result["steps"]["consistency"]
 
@@ -172,32 +205,24 @@ class WorldbuildingPipeline:
                 log.info(f"修复完成 (共{round_num}轮)")
                 break
 
-            # 执行修复任务
-            for task in fix_result.fix_tasks:
-                agent_name = task.agent_name
-                if show_progress:
-                    print(f"   ⚙️  修复 {agent_name}...")
-
-                # 获取完整的问题对象
-                all_issues = result["steps"]["consistency"].issues
-                issue_objects = [issue for issue in all_issues if issue.issue_id in task.issues_to_fix]
-
-                updated_data = self._apply_fix(result, task, issue_objects)
+            # 执行修复任务（不同步骤并发，同一步骤按顺序），全部完成后统一写回
+            updates = self._run_fix_tasks(result, fix_result.fix_tasks, show_progress)
+            result["steps"].update(updates)
 
-                # 更新结果
-                if updated_data:
-                    result["steps"][self._get_step_key(agent_name)] = updated_data
-                    if show_progress:
-                        print(f"      ✅ 完成")
-                else:
-                    if show_progress:
-                        print(f"      ⚠️  修复未执行 (Agent不支持redo_with_feedback)")
-
-            # 重新进行一致性检查
+            # 重新进行一致性检查（最后一轮完整LLM检查，其余轮次只复查被修改的步骤）
+            full_check = round_num >= self.MAX_FIX_ROUNDS
             if show_progress:
-                print(f"   🔄 重新检查一致性...")
-            consistency = self._step_consistency(result)
+                print(f"   🔄 重新检查一致性{'' if full_check else ' (增量)'}...")
+            if full_check:
+                consistency = self._step_consistency(result, force_llm=True)
+            else:
+                consistency = self._step_consistency(
+                    result,
+                    changed_steps=list(updates),
+                    prior_issues=consistency.issues
+                )
             result["steps"]["consistency"] = consistency
+            result["fix_history"][-1]["check_mode"] = result["consistency_check_mode"]
 
             # 显示修复后的一致性状态
             if show_progress:
@@ -205,6 +230,13 @@ class WorldbuildingPipeline:
                 priority_issues = len(consistency.get_critical_issues()) + len(consistency.get_issues_by_severity("high"))
                 print(f"      {status_icon} 状态: {consistency.overall_status}, 高优先级问题: {priority_issues}个")
 
+            # 记录本轮解决情况
+            convergence = tracker.record_round(round_num, self._get_priority_issues(consistency))
+            result["fix_history"][-1]["convergence"] = convergence
+            if show_progress:
+                print(f"      📈 解决{convergence['resolved']}个, 新增{convergence['introduced']}个, "
+                      f"复现{convergence['reintroduced']}个")
+
             # 检查是否需要继续下一轮（由一致性检查结果决定）
             if consistency.overall_status == "passed":
                 log.info(f"✅ 一致性检查通过，修复完成")
@@ -215,12 +247,73 @@ class WorldbuildingPipeline:
                 log.info(f"✅ 无高优先级问题，修复完成")
                 break
 
+            stop_reason = tracker.should_stop(convergence)
+            if stop_reason:
+                result["fix_history"][-1]["stop_reason"] = stop_reason
+                break
+
             if round_num >= self.MAX_FIX_ROUNDS:
                 log.info(f"⚠️ 达到最大修复轮次({self.MAX_FIX_ROUNDS})，修复结束")
                 break
 
+        # 最终结果以完整LLM检查为准（增量复查或只做了规则检查时补一次）
+        last_mode = result.get("consistency_check_mode")
+        if last_mode != "full":
+            if show_progress:
+                print(f"   🔄 最终完整一致性检查...")
+            result["steps"]["consistency"] = self._step_consistency(result, force_llm=True)
+            if result["fix_history"]:
+                result["fix_history"][-1]["check_mode"] = f"{last_mode}+{result['consistency_check_mode']}"
+
         return result
 
+    def _get_priority_issues(self, consistency: ConsistencyReport) -> List:
+        """获取需要修复的高优先级问题（critical + high）"""
+        return consistency.get_critical_issues() + consistency.get_issues_by_severity("high")
+
+    def _run_fix_tasks(self, result: Dict, fix_tasks: List, show_progress: bool) -> Dict[str, Any]:
+        """
+        执行一轮修复任务
+
+        按目标步骤分组：不同步骤的任务并发执行，同一步骤的任务按计划顺序执行
+        （后一个任务基于前一个任务的修复结果）。所有任务都基于本轮开始时的数据，
+        结果收集后由调用方统一写回，保证一致性重检看到的是完整的一轮修复
+
+        Returns:
+            {步骤key: 修复后的数据}
+        """
+        all_issues = result["steps"]["consistency"].issues
+        task_groups: Dict[str, List] = {}
+        for task in fix_tasks:
+            step_key = self._get_step_key(task.agent_name)
+            if not step_key:
+                log.warning(f"未找到Agent: {task.agent_name}")
+                continue
+            task_groups.setdefault(step_key, []).append(task)
+
+        def run_group(step_key: str) -> Optional[Any]:
+            current_data = None
+            for task in task_groups[step_key]:
+                if show_progress:
+                    print(f"   ⚙️  修复 {task.agent_name}...")
+
+                # 获取完整的问题对象
+                issue_objects = [issue for issue in all_issues if issue.issue_id in task.issues_to_fix]
+
+                updated_data = self._apply_fix(result, task, issue_objects, current_data)
+                if updated_data:
+                    current_data = updated_data
+                    if show_progress:
+                        print(f"      ✅ {task.agent_name} 完成")
+                elif show_progress:
+                    print(f"      ⚠️  {task.agent_name} 修复未执行 (Agent不支持redo_with_feedback)")
+            return current_data
+
+        step_keys = list(task_groups)
+        fixed = run_parallel(run_group, step_keys)
+
+        return {step_key: data for step_key, data in zip(step_keys, fixed) if data}
+
     def _get_step_key(self, agent_name: str) -> str:
         """获取Agent对应的步骤key"""
         mapping = {
@@ -232,8 +325,8 @@ class WorldbuildingPipeline:
         }
         return mapping.get(agent_name)
 
-    def _apply_fix(self, result: Dict, task, issue_objects: List) -> Optional[Any]:
-        """应用修复任务"""
+    def _apply_fix(self, result: Dict, task, issue_objects: List, current_data: Optional[Any] = None) -> Optional[Any]:
+        """应用修复任务（current_data为同一步骤上一个任务的修复结果）"""
         agent_name = task.agent_name
         fix_instructions = task.fix_instructions
         step_key = self._get_step_key(agent_name)
@@ -243,7 +336,8 @@ class WorldbuildingPipeline:
             return None
 
         # 获取当前数据
-        current_data = result["steps"][step_key]
+        if current_data is None:
+            current_data = result["steps"][step_key]
         if hasattr(current_data, "model_dump"):
             current_data = current_data.model_dump()
 
@@ -351,49 +445,86 @@ class WorldbuildingPipeline:
         return timeline
 
     def _step_atmosphere(self, result: Dict) -> WorldAtmosphere:
-        """步骤5: 氛围基调生成 (基于步骤1,2,3,4)"""
+        """步骤5: 氛围基调生成 (基于步骤1,2,3,4；宽松依赖模式下基于步骤1,2,3)"""
         constraints = result["steps"]["story_intake"]
         world = result["steps"]["worldbuilding"]
         elements = result["steps"]["key_element"]
-        timeline = result["steps"]["timeline"]
+        timeline = result["steps"].get("timeline")
 
         atmosphere = self.agents["atmosphere"].process(
             story_constraints=constraints.model_dump(),
             world_setting=world.model_dump(),
             key_elements=elements.model_dump(),
-            timeline=timeline.model_dump()
+            timeline=timeline.model_dump() if timeline else None
         )
         result["atmosphere"] = atmosphere.model_dump()
         return atmosphere
 
     def _step_npc_faction(self, result: Dict) -> WorldFactions:
-        """步骤6: 势力NPC生成 (基于步骤1,2,3,4,5)"""
+        """步骤6: 势力NPC生成 (基于步骤1,2,3,4,5；宽松依赖模式下基于步骤1,2,3)"""
         constraints = result["steps"]["story_intake"]
         world = result["steps"]["worldbuilding"]
         elements = result["steps"]["key_element"]
-        timeline = result["steps"]["timeline"]
-        atmosphere = result["steps"]["atmosphere"]
+        timeline = result["steps"].get("timeline")
+        atmosphere = result["steps"].get("atmosphere")
 
         factions = self.agents["npc_faction"].process(
             story_constraints=constraints.model_dump(),
             world_setting=world.model_dump(),
             key_elements=elements.model_dump(),
-            timeline=timeline.model_dump(),
-            atmosphere=atmosphere.model_dump()
+            timeline=timeline.model_dump() if timeline else None,
+            atmosphere=atmosphere.model_dump() if atmosphere else None
         )
         result["factions"] = factions.model_dump()
         return factions
 
-    def _step_consistency(self, result: Dict) -> ConsistencyReport:
-        """步骤7: 一致性检查 (基于所有前置步骤)"""
-        report = self.agents["consistency"].process(
-            story_constraints=self._to_dict(result["steps"]["story_intake"]),
-            world_setting=self._to_dict(result["steps"]["worldbuilding"]),
+    def _step_consistency(
+        self,
+        result: Dict,
+        changed_steps: Optional[List[str]] = None,
+        prior_issues: Optional[List] = None,
+        force_llm: bool = False
+    ) -> ConsistencyReport:
+        """
+        步骤7: 一致性检查 (基于所有前置步骤)
+
+        修复后复查时传入changed_steps和prior_issues，只完整发送被修改的步骤。
+        先执行规则检查，发现高优先级规则问题时直接交给修复循环，跳过LLM检查；
+        force_llm=True时（修复循环的最终检查）无论规则检查结果都执行LLM检查
+        """
+        rule_report = check_world_consistency(
             key_elements=self._to_dict(result["steps"]["key_element"]),
             timeline=self._to_dict(result["steps"]["timeline"]),
             atmosphere=self._to_dict(result["steps"]["atmosphere"]),
             factions=self._to_dict(result["steps"]["npc_faction"])
         )
+        blocking_issues = [i for i in rule_report["issues"] if i["severity"] in ("critical", "high")]
+
+        if blocking_issues and not force_llm:
+            log.info(f"规则检查发现{len(blocking_issues)}个高优先级问题，跳过LLM一致性检查")
+            report = ConsistencyReport(**rule_report)
+            result["consistency_check_mode"] = "rule"
+        else:
+            # 上一次只做了规则检查时，LLM还没有完整检查过，不能增量复查
+            if changed_steps is not None and is_rule_report(result["steps"].get("consistency")):
+                changed_steps, prior_issues = None, None
+            # 规则问题每次重新计算，不从上一轮保留
+            if prior_issues:
+                prior_issues = [i for i in prior_issues if not str(i.issue_id).startswith("rule_")]
+
+            report = self.agents["consistency"].process(
+                story_constraints=self._to_dict(result["steps"]["story_intake"]),
+                world_setting=self._to_dict(result["steps"]["worldbuilding"]),
+                key_elements=self._to_dict(result["steps"]["key_element"]),
+                timeline=self._to_dict(result["steps"]["timeline"]),
+                atmosphere=self._to_dict(result["steps"]["atmosphere"]),
+                factions=self._to_dict(result["steps"]["npc_faction"]),
+                changed_steps=changed_steps,
+                prior_issues=prior_issues
+            )
+            if rule_report["issues"]:
+                report = ConsistencyReport(**merge_carried_issues(report.model_dump(), rule_report["issues"]))
+            result["consistency_check_mode"] = "full" if changed_steps is None else "delta"
         result["consistency"] = report
 
         # 如果一致性检查失败，发出警告
@@ -547,10 +678,14 @@ def main():
     parser.add_argument("--output", "-o", help="输出目录")
     parser.add_argument("--no-progress", action="store_true", help="不显示进度条")
     parser.add_argument("--no-fix", action="store_true", help="禁用自动修复")
+    parser.add_argument(
+        "--relaxed-deps", action="store_true", default=None,
+        help="时间线/氛围/势力NPC只基于前三步并发生成（默认读取 WORLDBUILDING_RELAXED_DEPS）"
+    )
 
     args = parser.parse_args()
 
-    pipeline = WorldbuildingPipeline(enable_auto_fix=not args.no_fix)
+    pipeline = WorldbuildingPipeline(enable_auto_fix=not args.no_fix, relaxed_dependencies=args.relaxed_deps)
 
     print("\n" + "=" * 60)
     print("GAL-Dreamer 世界观构建 (完整版)")
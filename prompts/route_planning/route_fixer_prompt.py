@@ -46,6 +46,7 @@ ROUTE_FIXER_SYSTEM_PROMPT = """你是一位专业的GALGAME游戏策划，擅长
 - 可以添加新的choice选项（但不添加新章节）
 
 **输出格式：**
+如果用户只提供了局部修复窗口，按窗口要求只输出修改的片段；否则
 输出修复后的完整主线框架JSON，必须包含以下字段：
 - structure_id: 结构ID
 - state: 状态框架（好感度等）
@@ -84,4 +85,29 @@ ROUTE_FIXER_HUMAN_PROMPT = """【主线框架数据】
 4. **只输出JSON，不要添加任何markdown代码块标记或解释文字**
 """
 
+ROUTE_FIXER_WINDOW_HUMAN_PROMPT = """【局部修复窗口 - 可修改的章节/分支/结局】
+{editable_json}
+
+【相邻章节 - 只读上下文，不要输出】
+{context_json}
+
+【全路线索引 - 好感度状态、章节顺序、分支回归章节、结局ID】
+{route_index_json}
+
+【检查报告 - 本窗口需要修复的问题】
+{issues_json}
+
+{fix_round_info}
+
+这里只给出了与问题相关的局部路线，请只在窗口内修复上述问题。
+
+修复要求：
+1. 只修改窗口中的choices、branches、endings的结构和数值字段，不修改summary、scene、desc等剧情内容
+2. 不添加新章节；选项的branch只能指向全路线索引中的分支/结局或本窗口新增的分支
+3. 分支的return必须是全路线索引中的章节，且在入口章节+3以内
+4. 输出格式：{{"chapters": [修改后的窗口章节], "branches": [修改后的窗口分支], "endings": [修改后的窗口结局]}}，
+   每个元素保留id，章节必须包含完整的choices；没有修改的元素可以省略
+5. **只输出JSON，不要添加任何markdown代码块标记或解释文字**
+"""
+
 ROUTE_FIXER_PROMPT = ROUTE_FIXER_SYSTEM_PROMPT + "\n\n" + ROUTE_FIXER_HUMAN_PROMPT
@@ -60,7 +60,7 @@ CHAPTER_DETAIL_HUMAN_PROMPT = """【用户创意】
 【故事数据】
 {steps_data}
 
-【完整章节规划】（全部章节概览，了解整体故事结构）
+【完整章节规划】（全部章节概览，了解整体故事结构；当前章节前后几章为详细规划，其余每章一行）
 {full_route_strategy}
 
 【当前章节规划】（需要详细生成的内容）
@@ -229,3 +229,138 @@ CHAPTER_DETAIL_HUMAN_PROMPT = """【用户创意】
 """
 
 CHAPTER_DETAIL_PROMPT = CHAPTER_DETAIL_SYSTEM_PROMPT + "\n\n" + CHAPTER_DETAIL_HUMAN_PROMPT
+
+CHAPTER_STITCH_HUMAN_PROMPT = """本章节是在不知道前一章真实结尾的情况下生成的，现在需要改写本章的第一幕，使其与前一章的结尾自然衔接。
+
+【当前章节规划】
+{chapter_plan}
+
+【角色列表】
+{character_list}
+
+【前一章节结尾】（真实内容，必须承接）
+{previous_chapter}
+
+【本章第一幕（待改写）】
+{opening_scene}
+
+【本章第二幕开头】（改写后的第一幕必须能自然过渡到这里）
+{next_scene}
+
+【要求】
+1. 只改写第一幕，保持幕号、标题方向和本幕在章节规划中的作用不变
+2. 开场要承接前一章结尾的时间、地点、情绪和悬念，不要重复前一章已经发生的事件
+3. 结尾要能自然过渡到第二幕
+4. 事件数量与原第一幕相当（至少8个事件），文风保持一致
+5. 只使用【角色列表】中的角色ID
+
+**只输出改写后的这一幕JSON，不要输出任何其他文字：**
+
+{{
+    "scene": 1,
+    "title": "第一幕标题",
+    "location": "场景名称",
+    "time_of_day": "时间段",
+    "background": "场景背景描述",
+    "narration": "开场旁白",
+    "events": [
+        {{"type": "narration", "speaker": null, "content": "旁白内容", "emotion": null, "action": null}},
+        {{"type": "dialogue", "speaker": "角色ID", "content": "对话内容", "emotion": "表情", "action": "动作"}}
+    ]
+}}
+"""
+
+CHAPTER_SKELETON_HUMAN_PROMPT = """【用户创意】
+{user_idea}
+
+【故事数据】
+{steps_data}
+
+【完整章节规划】（全部章节概览，了解整体故事结构；当前章节前后几章为详细规划，其余每章一行）
+{full_route_strategy}
+
+【当前章节规划】（需要拆分的内容）
+{chapter_plan}
+
+【可用场景列表】
+{locations}
+
+【角色列表】
+{character_list}
+
+【前一章节内容】（仅用于承接剧情，不可重复）
+{previous_chapter}
+
+请先为当前章节设计分幕骨架，暂时不要写具体事件，每一幕的详细内容会在之后单独生成。
+
+【要求】
+1. 每章5-20幕，每幕应有明确的场景或时间转换，或剧情重点切换
+2. location必须从【可用场景列表】中选择
+3. purpose写清这一幕要推进的剧情、出场角色和情绪变化，后续将严格按它展开
+4. 第一幕要承接前一章节（如有），最后一幕要按中间章节的要求留下符合整体走向的悬念
+5. 只使用【角色列表】中的角色ID
+
+**只输出以下JSON格式，不要输出任何其他文字：**
+
+{{
+    "characters": [
+        {{"character_id": "heroine_001", "character_name": "XXX1"}},
+        {{"character_id": "protagonist_main", "character_name": "XXX2"}}
+    ],
+    "scenes": [
+        {{
+            "scene": 1,
+            "title": "第一幕标题（简短描述）",
+            "location": "场景名称",
+            "time_of_day": "时间段",
+            "purpose": "本幕作用：推进什么剧情、哪些角色出场、情绪如何变化"
+        }}
+    ]
+}}
+"""
+
+CHAPTER_SCENE_HUMAN_PROMPT = """【当前章节规划】
+{chapter_plan}
+
+【本章分幕骨架】（全部幕的概览，保持前后连贯）
+{chapter_skeleton}
+
+【当前要生成的幕】
+{scene_skeleton}
+
+【可用场景列表】
+{locations}
+
+【场景预设详情】
+{scene_presets}
+
+【角色列表】
+{character_list}
+
+【前一章节内容】（仅第一幕需要承接，不可重复）
+{previous_chapter}
+
+请根据骨架生成这一幕的详细剧情内容。
+
+【要求】
+1. 严格按照骨架中本幕的purpose展开，不要写到其他幕的内容
+2. 本幕至少10-15个事件（绝对不能少于8个事件），旁白和对话交替
+3. 开头要接住上一幕的骨架，结尾要能过渡到下一幕的骨架
+4. location必须从【可用场景列表】中选择，参考场景预设中的visual_style和mood描述背景
+5. 只使用【角色列表】中的角色ID，GAL游戏文风与系统要求保持一致
+
+**只输出这一幕的JSON，不要输出任何其他文字：**
+
+{{
+    "scene": 幕号,
+    "title": "本幕标题",
+    "location": "场景名称",
+    "time_of_day": "时间段",
+    "background": "场景背景描述（视觉、氛围）",
+    "narration": "开场旁白，描述环境和氛围",
+    "events": [
+        {{"type": "narration", "speaker": null, "content": "旁白内容", "emotion": null, "action": null}},
+        {{"type": "dialogue", "speaker": "角色ID", "content": "对话内容", "emotion": "表情", "action": "动作"}}
+    ]
+}}
+"""
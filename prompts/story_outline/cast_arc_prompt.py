@@ -169,6 +169,48 @@ CAST_ARC_HUMAN_PROMPT = """请基于以下用户原始创意、世界观数据
 - relationship_matrix要构建复杂的关系网，包括暗恋、竞争、背叛、救赎等
 """
 
+CAST_ARC_CHARACTER_FIX_PROMPT = """请根据修复指令，只重新设计下面列出的角色，其余角色保持不变。
+
+【用户原始创意 - 第一参考】
+{user_idea}
+
+【修复指令】
+{fix_instructions}
+
+【世界观设定 - 必须严格引用】
+{world_setting_json}
+
+【故事前提】
+{premise_json}
+
+【其余角色（保持不变，只能引用）】
+{cast_overview}
+
+【需要重新设计的角色（当前版本）】
+{target_characters}
+
+请以JSON格式输出重新设计的角色，包含以下结构:
+{{
+    "characters": [
+        // 需要重新设计的角色，字段格式与当前版本相同
+    ],
+    "relationship_matrix": {{
+        "被重新设计的角色ID": {{
+            "其他角色ID": "关系描述"
+        }}
+    }}
+}}
+
+要求:
+1. characters必须恰好包含这些角色: {target_ids}，不能增加或删除角色
+2. 每个角色的character_id和role_type必须与当前版本相同
+3. relationships和relationship_matrix只能引用已有的角色ID
+4. faction_affiliation 必须引用 worldbuilding.factions 中已有的 faction_id
+5. relationship_type只能使用: love_interest, mentor, rival, ally, family, enemy, complex
+6. character_arc_type只能使用: positive, negative, flat, tragic, redemptive
+7. 修复指令未涉及的设定尽量保留，不要与其余角色的设定产生矛盾
+"""
+
 CAST_ARC_PROMPT = (
     CAST_ARC_SYSTEM_PROMPT +
     "\n\n" +
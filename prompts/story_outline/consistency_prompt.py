@@ -96,7 +96,7 @@ STORY_CONSISTENCY_HUMAN_PROMPT = """请对以下完整故事大纲进行一致
 背景矛盾: {background_conflicts}
 危机升级曲线: {escalation_summary}
 
-请以JSON格式输出检查报告，包含以下结构：
+{check_scope}请以JSON格式输出检查报告，包含以下结构：
 {{
     "overall_status": "passed",
     "total_issues": 问题总数,
@@ -83,7 +83,7 @@ CONSISTENCY_HUMAN_PROMPT = """请对以下完整世界观设定进行一致性
 
 冲突点：{conflict_points}
 
-请以JSON格式输出一致性报告，包含以下结构：
+{check_scope}请以JSON格式输出一致性报告，包含以下结构：
 {{
     "overall_status": "passed",  // passed=通过, warning=有警告, failed=失败
     "total_issues": 问题总数,
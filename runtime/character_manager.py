@@ -19,12 +19,21 @@ from models.runtime.character import (
     CharacterItem,
     RelationshipState
 )
+from utils.entity_registry import EntityRegistry, registry_from_data
 from utils.logger import log
 
 
 class CharacterManager:
     """角色管理器"""
 
+    # cast_arc中的角色集合 -> (角色类型, 日志标签)
+    CAST_COLLECTIONS = [
+        ("protagonist", "protagonist", "主角"),
+        ("heroines", "heroine", "女主"),
+        ("supporting_cast", "supporting", "配角"),
+        ("antagonists", "antagonist", "反派"),
+    ]
+
     def __init__(self, save_dir: str = "runtime_data/characters"):
         """
         初始化角色管理器
@@ -45,12 +54,17 @@ class CharacterManager:
 
     # ========== 批量加载/创建 ==========
 
-    def load_from_outline(self, outline_path: str) -> Dict[str, RuntimeCharacter]:
+    def load_from_outline(
+        self,
+        outline_path: str,
+        registry: Optional[EntityRegistry] = None
+    ) -> Dict[str, RuntimeCharacter]:
         """
         从story_outline.json加载所有角色
 
         Args:
             outline_path: story_outline.json文件路径
+            registry: 项目实体注册表（不提供时从outline构建）
 
         Returns:
             创建的角色字典 {character_id: RuntimeCharacter}
@@ -58,44 +72,22 @@ class CharacterManager:
         with open(outline_path, 'r', encoding='utf-8') as f:
             outline = json.load(f)
 
-        cast_arc = outline.get("steps", {}).get("cast_arc", {})
         source_outline_id = outline.get("steps", {}).get("premise", {}).get("premise_id", "")
+        if registry is None:
+            registry = registry_from_data(outline)
 
         loaded = {}
 
-        # 加载主角
-        protagonist = cast_arc.get("protagonist")
-        if protagonist:
-            char = self._create_character_from_outline(
-                protagonist, "protagonist", source_outline_id
-            )
-            loaded[char.character_id] = char
-            self._protagonist_id = char.character_id
-            log.info(f"加载主角: {char.character_name}")
-
-        # 加载女主
-        for heroine in cast_arc.get("heroines", []):
-            char = self._create_character_from_outline(
-                heroine, "heroine", source_outline_id
-            )
-            loaded[char.character_id] = char
-            log.info(f"加载女主: {char.character_name}")
-
-        # 加载配角
-        for supporting in cast_arc.get("supporting_cast", []):
-            char = self._create_character_from_outline(
-                supporting, "supporting", source_outline_id
-            )
-            loaded[char.character_id] = char
-            log.info(f"加载配角: {char.character_name}")
-
-        # 加载反派
-        for antagonist in cast_arc.get("antagonists", []):
-            char = self._create_character_from_outline(
-                antagonist, "antagonist", source_outline_id
-            )
-            loaded[char.character_id] = char
-            log.info(f"加载反派: {char.character_name}")
+        # 按主角、女主、配角、反派的顺序加载
+        for collection, role_type, label in self.CAST_COLLECTIONS:
+            for record in registry.entities("character", collection):
+                char = self._create_character_from_outline(
+                    record["definitions"][0]["data"], role_type, source_outline_id
+                )
+                loaded[char.character_id] = char
+                if role_type == "protagonist":
+                    self._protagonist_id = char.character_id
+                log.info(f"加载{label}: {char.character_name}")
 
         # 添加到缓存并保存
         for char in loaded.values():
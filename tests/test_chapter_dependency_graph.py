@@ -0,0 +1,51 @@
+"""章节依赖图测试"""
+from utils.chapter_dependency_graph import ChapterDependencyGraph
+
+
+def _framework():
+    return {
+        "chapters": [
+            {"id": "common_ch1"},
+            {"id": "common_ch2", "choices": [
+                {"id": "c1", "branch": "branch_a"},
+                {"id": "c2", "branch": "branch_b"},
+            ]},
+            {"id": "common_ch3"},
+        ],
+        "branches": [
+            {"id": "branch_a", "chapters": 2, "return": "common_ch3"},
+            {"id": "branch_b", "chapters": 1, "return": "common_ch3"},
+        ],
+        "endings": [],
+    }
+
+
+def test_chapter_order_does_not_serialize_framework_branches():
+    """路线战略的章节顺序不应把框架中互不依赖的分支串成一条线"""
+    chapter_ids = ["common_ch1", "common_ch2", "branch_a_ch1", "branch_a_ch2", "branch_b_ch1", "common_ch3"]
+    graph = ChapterDependencyGraph.from_route_framework(_framework(), chapter_ids=chapter_ids)
+
+    assert graph.predecessors("branch_b_ch1") == ["common_ch2"]
+    assert graph.predecessors("common_ch3") == ["common_ch2", "branch_a_ch2", "branch_b_ch1"]
+    assert graph.max_parallelism(chapter_ids) == 2
+
+
+def test_uncovered_chapters_follow_chapter_order():
+    """路线框架未覆盖的章节接在章节顺序中的前一章之后"""
+    chapter_ids = ["common_ch1", "extra_ch1", "extra_ch2"]
+    graph = ChapterDependencyGraph.from_route_framework(_framework(), chapter_ids=chapter_ids)
+
+    assert graph.predecessors("extra_ch1") == ["common_ch1"]
+    assert graph.predecessors("extra_ch2") == ["extra_ch1"]
+    assert graph.max_parallelism(chapter_ids) == 1
+
+
+def test_direct_successors_of_edited_chapter():
+    """增量重建只重新生成修改的章节及其直接后继，更后面的章节不受影响"""
+    chapter_ids = [f"common_ch{i}" for i in range(1, 7)]
+    graph = ChapterDependencyGraph.from_route_framework({"chapters": [{"id": cid} for cid in chapter_ids]})
+
+    dirty = {"common_ch3"}
+    regenerate = dirty | set(graph.direct_successors(dirty))
+
+    assert regenerate == {"common_ch3", "common_ch4"}
@@ -0,0 +1,28 @@
+"""并发工具测试"""
+import threading
+import time
+
+from utils.concurrency import llm_call_slot, run_parallel
+from utils.config import config
+
+
+def test_nested_run_parallel_respects_llm_slots():
+    """嵌套run_parallel时同时进行的LLM调用数不超过全局上限"""
+    lock = threading.Lock()
+    in_flight = {"current": 0, "peak": 0}
+
+    def fake_llm_call(_):
+        with llm_call_slot():
+            with lock:
+                in_flight["current"] += 1
+                in_flight["peak"] = max(in_flight["peak"], in_flight["current"])
+            time.sleep(0.01)
+            with lock:
+                in_flight["current"] -= 1
+
+    def chapter(_):
+        run_parallel(fake_llm_call, range(config.LLM_MAX_CONCURRENCY * 2), config.LLM_MAX_CONCURRENCY * 2)
+
+    run_parallel(chapter, range(config.LLM_MAX_CONCURRENCY * 2), config.LLM_MAX_CONCURRENCY * 2)
+
+    assert in_flight["peak"] <= config.LLM_MAX_CONCURRENCY
@@ -0,0 +1,12 @@
+"""JSON工具函数测试"""
+from utils.json_utils import prompt_json
+
+
+def test_prompt_json_key_aliases_add_legend():
+    """字段缩写只在实际使用时附上缩写说明"""
+    data = {"character_name": "小雪", "traits": [{"character_name": "小月", "note": None}]}
+
+    assert prompt_json(data, drop_empty=True, key_aliases={"character_name": "n"}) == (
+        '（字段缩写: n=character_name）\n{"n":"小雪","traits":[{"n":"小月"}]}'
+    )
+    assert prompt_json({"id": 1}, key_aliases={"character_name": "n"}) == '{"id":1}'
@@ -0,0 +1,48 @@
+"""结局可达性分析测试"""
+from utils.route_reachability import RouteReachabilityAnalyzer, analyze_ending_reachability
+
+
+def _route(chapters, endings=("ending_a", "ending_b")):
+    return {
+        "state": {"heroine_a": {"initial": 0, "min": 0, "max": 100}},
+        "chapters": chapters,
+        "branches": [],
+        "endings": [{"id": e} for e in endings],
+    }
+
+
+def test_chapter_without_choices_carries_state_to_next_chapter():
+    """没有选项的章节（只有summary）不应让后续结局变成不可达"""
+    route = _route([
+        {"id": "common_ch1", "summary": "开场"},
+        {"id": "common_ch2", "summary": "抉择", "choices": [
+            {"id": "c1", "branch": "ending_a"},
+            {"id": "c2", "branch": "ending_b"},
+        ]},
+    ])
+
+    results = analyze_ending_reachability(route)
+
+    assert results["ending_a"]["status"] == "reachable"
+    assert results["ending_b"]["status"] == "reachable"
+    assert results["ending_a"]["path"] == [{"chapter": "common_ch2", "choice": "c1"}]
+
+
+def test_chapter_without_choices_keeps_interval():
+    """区间传播穿过没有选项的章节时保持好感度区间不变"""
+    route = _route([
+        {"id": "common_ch1", "choices": [{"id": "c1", "effect": {"heroine_a": 10}}]},
+        {"id": "common_ch2", "summary": "过渡"},
+        {"id": "common_ch3", "choices": [
+            {"id": "c1", "visible": {"heroine_a": 10}, "branch": "ending_a"},
+            {"id": "c2", "visible": {"heroine_a": 50}, "branch": "ending_b"},
+        ]},
+    ])
+
+    analyzer = RouteReachabilityAnalyzer(route)
+    intervals = analyzer.propagate_intervals()
+    assert intervals[2] == ((10,), (10,))
+
+    results = analyzer.analyze()
+    assert results["ending_a"]["status"] == "reachable"
+    assert results["ending_b"]["status"] == "unreachable"
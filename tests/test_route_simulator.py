@@ -0,0 +1,35 @@
+"""路线模拟检查测试"""
+from utils.route_simulator import check_route_simulation
+
+
+def _report(ending_rates):
+    return {
+        "playthroughs": 1000,
+        "ending_rates": ending_rates,
+        "dead_end_rate": 0.0,
+        "dead_end_chapters": {},
+        "unreachable_choices": [],
+    }
+
+
+def test_unobserved_ending_is_critical_only_when_proven_unreachable():
+    """模拟中没有到达的结局只有被可达性分析证明不可达时才是critical"""
+    route = {
+        "state": {"heroine_a": {"initial": 0, "min": 0, "max": 100}},
+        "chapters": [
+            {"id": "common_ch1", "choices": [
+                {"id": "c1", "branch": "ending_a"},
+                {"id": "c2", "visible": {"heroine_a": 0}, "branch": "ending_rare"},
+                {"id": "c3", "visible": {"heroine_a": 50}, "branch": "ending_locked"},
+            ]},
+        ],
+        "branches": [],
+        "endings": [{"id": "ending_a"}, {"id": "ending_rare"}, {"id": "ending_locked"}],
+    }
+    simulation = {"random": _report({"ending_a": 1.0, "ending_rare": 0.0, "ending_locked": 0.0})}
+
+    issues = {i["issue_id"]: i for i in check_route_simulation(simulation, route_framework=route)}
+
+    assert issues["sim_ending_ending_locked"]["severity"] == "critical"
+    assert issues["sim_ending_ending_rare"]["severity"] == "medium"
+    assert "1000" in issues["sim_ending_ending_rare"]["description"]
@@ -0,0 +1,319 @@
+"""
+章节依赖图
+根据路线框架计算每个章节的真实前驱章节，并按依赖关系调度章节生成
+
+章节ID约定:
+- 共通线: 路线框架 chapters[].id（如 common_ch1）
+- 分支线: {branch_id}_ch{k}（如 branch_heroine_001_1_ch1），k 从1到 branches[].chapters
+- 结局线: {ending_id}_ch{k}（如 ending_heroine_001_good_ch1）
+- 个人线: heroine_route_frameworks[].interlude_chapters[].chapter_id / ending_chapter.chapter_id
+"""
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from utils.config import config
+
+
+class ChapterDependencyGraph:
+    """
+    章节依赖图
+
+    每个章节的前驱按优先级排列，第一个为主前驱（剧情直接承接的章节），
+    其余为附加前驱（如分支回归主线时，分支最后一章）。
+    没有依赖关系的章节（不同分支、不同女主的个人线）可以并发生成
+    """
+
+    def __init__(self):
+        self.order: List[str] = []  # 章节插入顺序（稳定输出用）
+        self._predecessors: Dict[str, List[str]] = {}
+
+    # ========== 构建 ==========
+
+    @classmethod
+    def from_route_framework(
+        cls,
+        route_framework: Optional[Dict[str, Any]] = None,
+        route_structure: Optional[Dict[str, Any]] = None,
+        chapter_ids: Optional[Iterable[str]] = None
+    ) -> "ChapterDependencyGraph":
+        """
+        从路线框架构建依赖图
+
+        Args:
+            route_framework: 主线框架（chapters/branches/endings）
+            route_structure: 路线结构（heroine_route_frameworks，可选，
+                未提供时从route_framework中读取）
+            chapter_ids: 额外的章节顺序（如路线战略的章节列表），
+                只有路线框架中不存在的章节才按此顺序接在前一章之后
+
+        Returns:
+            章节依赖图
+        """
+        graph = cls()
+        route_framework = route_framework or {}
+
+        # 1. 共通线：按顺序串联
+        common_ids = [ch.get("id") for ch in route_framework.get("chapters", []) if ch.get("id")]
+        graph.add_sequence(common_ids)
+
+        # 2. 分支/结局入口：触发选项所在的章节
+        entry_chapters: Dict[str, str] = {}
+        for ch in route_framework.get("chapters", []):
+            for choice in ch.get("choices", []):
+                branch = choice.get("branch")
+                if branch and branch not in entry_chapters and ch.get("id"):
+                    entry_chapters[branch] = ch["id"]
+
+        # 3. 分支线：入口章节 → 分支各章 → 回归章节
+        for branch in route_framework.get("branches", []):
+            branch_id = branch.get("id")
+            if not branch_id:
+                continue
+            branch_chapters = cls.expand_chapter_ids(branch_id, branch.get("chapters", 1))
+            graph.add_sequence(branch_chapters, entry_chapters.get(branch_id))
+
+            return_chapter = branch.get("return")
+            if return_chapter and branch_chapters:
+                graph.add_chapter(return_chapter, [branch_chapters[-1]])
+
+        # 4. 结局线：入口章节 → 结局各章
+        for ending in route_framework.get("endings", []):
+            ending_id = ending.get("id")
+            if not ending_id:
+                continue
+            ending_chapters = cls.expand_chapter_ids(ending_id, ending.get("chapters", 1))
+            graph.add_sequence(ending_chapters, entry_chapters.get(ending_id))
+
+        # 5. 个人线：插曲按sequence_order插在共通线之后，同一女主的插曲和结局串联
+        if route_structure is None and "heroine_route_frameworks" in route_framework:
+            route_structure = route_framework
+        if route_structure:
+            graph._add_heroine_routes(route_structure, common_ids)
+
+        # 6. 路线框架未覆盖的章节：接在章节顺序中的前一章之后（已覆盖的章节保留框架依赖）
+        if chapter_ids:
+            graph._add_uncovered_chapters([cid for cid in chapter_ids if cid])
+
+        return graph
+
+    def _add_uncovered_chapters(self, chapter_ids: List[str]):
+        """添加路线框架未覆盖的章节，主前驱为章节顺序中的前一章"""
+        covered = set(self._predecessors)
+        previous = None
+        for chapter_id in chapter_ids:
+            if chapter_id not in covered:
+                self.add_chapter(chapter_id, [previous] if previous else [])
+            previous = chapter_id
+
+    @staticmethod
+    def expand_chapter_ids(route_id: str, chapter_count: Any) -> List[str]:
+        """展开分支/结局的章节ID"""
+        try:
+            count = max(int(chapter_count), 1)
+        except (TypeError, ValueError):
+            count = 1
+        return [f"{route_id}_ch{k}" for k in range(1, count + 1)]
+
+    def _add_heroine_routes(self, route_structure: Dict[str, Any], common_ids: List[str]):
+        """添加个人线章节"""
+        common_chapters = route_structure.get("common_route_framework", {}).get("chapter_outlines", [])
+        common_by_order = sorted(
+            (ch.get("sequence_order", 0), ch.get("chapter_id"))
+            for ch in common_chapters if ch.get("chapter_id")
+        )
+        if not common_by_order:
+            common_by_order = [(idx, cid) for idx, cid in enumerate(common_ids, 1)]
+
+        for framework in route_structure.get("heroine_route_frameworks", []):
+            interludes = sorted(
+                framework.get("interlude_chapters", []),
+                key=lambda ch: ch.get("sequence_order", 0)
+            )
+            previous = None
+            for interlude in interludes:
+                chapter_id = interlude.get("chapter_id")
+                if not chapter_id:
+                    continue
+                anchor = self._common_before(common_by_order, interlude.get("sequence_order", 0))
+                # 主前驱为插曲之前最近的共通章节，同一女主的上一插曲作为附加前驱
+                self.add_chapter(chapter_id, [p for p in (anchor, previous) if p])
+                previous = chapter_id
+
+            ending = framework.get("ending_chapter") or {}
+            ending_id = ending.get("chapter_id")
+            if ending_id:
+                anchor = previous or (common_by_order[-1][1] if common_by_order else None)
+                self.add_chapter(ending_id, [anchor] if anchor else [])
+
+    @staticmethod
+    def _common_before(common_by_order: List, sequence_order: Any) -> Optional[str]:
+        """查找sequence_order之前最近的共通章节"""
+        anchor = None
+        for order, chapter_id in common_by_order:
+            try:
+                if order < sequence_order:
+                    anchor = chapter_id
+            except TypeError:
+                break
+        return anchor
+
+    def add_chapter(self, chapter_id: str, predecessors: Optional[List[str]] = None):
+        """添加章节及其前驱（已存在时追加前驱）"""
+        if chapter_id not in self._predecessors:
+            self._predecessors[chapter_id] = []
+            self.order.append(chapter_id)
+        for pred in predecessors or []:
+            if pred and pred != chapter_id and pred not in self._predecessors[chapter_id]:
+                self._predecessors[chapter_id].append(pred)
+                if pred not in self._predecessors:
+                    self._predecessors[pred] = []
+                    self.order.append(pred)
+
+    def add_sequence(self, chapter_ids: List[str], entry: Optional[str] = None):
+        """按顺序串联章节（entry为第一章的前驱）"""
+        previous = entry
+        for chapter_id in chapter_ids:
+            self.add_chapter(chapter_id, [previous] if previous else [])
+            previous = chapter_id
+
+    # ========== 查询 ==========
+
+    def __contains__(self, chapter_id: str) -> bool:
+        return chapter_id in self._predecessors
+
+    def predecessors(self, chapter_id: str) -> List[str]:
+        """获取章节的全部前驱（主前驱在前）"""
+        return list(self._predecessors.get(chapter_id, []))
+
+    def primary_predecessor(self, chapter_id: str) -> Optional[str]:
+        """获取章节的主前驱（剧情直接承接的章节）"""
+        predecessors = self._predecessors.get(chapter_id, [])
+        return predecessors[0] if predecessors else None
+
+    def direct_successors(self, chapter_ids: Iterable[str]) -> List[str]:
+        """获取以给定章节为主前驱的章节（剧情直接承接这些章节，按插入顺序）"""
+        sources = set(chapter_ids)
+        return [cid for cid in self.order if self.primary_predecessor(cid) in sources]
+
+    def topological_order(self, chapter_ids: Optional[Iterable[str]] = None) -> List[str]:
+        """
+        按依赖关系排序章节（只考虑给定章节集合内部的依赖）
+
+        Args:
+            chapter_ids: 需要排序的章节（默认全部）
+
+        Returns:
+            排序后的章节ID列表（存在环时剩余章节按原顺序追加）
+        """
+        targets = list(chapter_ids) if chapter_ids is not None else list(self.order)
+        target_set = set(targets)
+        done: Set[str] = set()
+        ordered = []
+
+        while len(ordered) < len(targets):
+            ready = self.ready_chapters(done, [cid for cid in targets if cid not in done], target_set)
+            if not ready:
+                ordered.extend(cid for cid in targets if cid not in done)
+                break
+            ordered.extend(ready)
+            done.update(ready)
+
+        return ordered
+
+    def max_parallelism(self, chapter_ids: Optional[Iterable[str]] = None) -> int:
+        """
+        计算给定章节集合按依赖分层后最宽一层的章节数
+
+        Returns:
+            可同时生成的最大章节数（1表示依赖是一条直线，调度无法并发）
+        """
+        targets = list(chapter_ids) if chapter_ids is not None else list(self.order)
+        target_set = set(targets)
+        done: Set[str] = set()
+        widest = 0
+
+        while len(done) < len(targets):
+            ready = self.ready_chapters(done, [cid for cid in targets if cid not in done], target_set)
+            if not ready:
+                break
+            widest = max(widest, len(ready))
+            done.update(ready)
+
+        return widest
+
+    def ready_chapters(
+        self,
+        done: Set[str],
+        pending: Iterable[str],
+        target_set: Optional[Set[str]] = None
+    ) -> List[str]:
+        """
+        获取可以开始生成的章节（目标集合内的前驱均已完成）
+
+        Args:
+            done: 已完成的章节
+            pending: 待生成的章节
+            target_set: 本次生成的章节集合（集合外的前驱视为已完成）
+
+        Returns:
+            可以开始生成的章节ID列表
+        """
+        ready = []
+        for chapter_id in pending:
+            predecessors = self._predecessors.get(chapter_id, [])
+            if all(p in done or (target_set is not None and p not in target_set) for p in predecessors):
+                ready.append(chapter_id)
+        return ready
+
+    # ========== 调度 ==========
+
+    def schedule(
+        self,
+        func: Callable[[str], Any],
+        chapter_ids: Iterable[str],
+        max_workers: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        按依赖关系并发执行 func(chapter_id)
+
+        前驱完成后立即提交后继章节，互不依赖的分支并发执行
+
+        Args:
+            func: 生成单个章节的函数
+            chapter_ids: 本次生成的章节
+            max_workers: 最大并发数（默认使用 config.LLM_MAX_CONCURRENCY）
+
+        Returns:
+            {chapter_id: func返回值}
+
+        Raises:
+            任一章节抛出的异常（已提交的章节会先执行完）
+        """
+        targets = self.topological_order(chapter_ids)
+        target_set = set(targets)
+        results: Dict[str, Any] = {}
+        if not targets:
+            return results
+
+        done: Set[str] = set()
+        pending = list(targets)
+        workers = max(min(max_workers or config.LLM_MAX_CONCURRENCY, len(targets)), 1)
+
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            running = {}
+            while pending or running:
+                for chapter_id in self.ready_chapters(done, pending, target_set):
+                    pending.remove(chapter_id)
+                    running[executor.submit(func, chapter_id)] = chapter_id
+
+                if not running:
+                    # 存在环，剩余章节无法调度
+                    raise RuntimeError(f"章节依赖存在环: {pending}")
+
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    chapter_id = running.pop(future)
+                    results[chapter_id] = future.result()
+                    done.add(chapter_id)
+
+        return results
@@ -0,0 +1,70 @@
+"""
+并发工具
+LLM调用是同步阻塞IO，使用线程池即可并发执行多个互不依赖的调用
+"""
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Iterable, Iterator, List, Optional
+
+from utils.config import config
+
+# 全局LLM调用名额：run_parallel嵌套（如章节并发内再分幕并发）时，
+# 同时进行的LLM调用总数仍不超过 config.LLM_MAX_CONCURRENCY
+_llm_slots = threading.BoundedSemaphore(max(config.LLM_MAX_CONCURRENCY, 1))
+
+
+@contextmanager
+def llm_call_slot() -> Iterator[None]:
+    """占用一个全局LLM调用名额，名额用尽时阻塞等待（只包住单次LLM调用，不要在其中再等待其他任务）"""
+    with _llm_slots:
+        yield
+
+
+def run_parallel(
+    func: Callable[[Any], Any],
+    items: Iterable[Any],
+    max_workers: Optional[int] = None
+) -> List[Any]:
+    """
+    并发执行 func(item)，按输入顺序返回结果
+
+    Args:
+        func: 对单个元素执行的函数
+        items: 输入元素
+        max_workers: 最大并发数（默认使用 config.LLM_MAX_CONCURRENCY）
+
+    Returns:
+        与输入顺序一致的结果列表
+
+    Raises:
+        任一任务抛出的异常（等待所有任务结束后按输入顺序抛出第一个）
+    """
+    items = list(items)
+    if not items:
+        return []
+
+    workers = min(max_workers or config.LLM_MAX_CONCURRENCY, len(items))
+    if workers <= 1:
+        return [func(item) for item in items]
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(func, item) for item in items]
+    return [future.result() for future in futures]
+
+
+def run_in_background(func: Callable[..., Any], *args: Any, **kwargs: Any) -> Future:
+    """
+    在后台线程执行 func(*args, **kwargs)，立即返回Future
+
+    用于推测执行：与关键路径上的调用重叠，结果不再需要时调用方直接丢弃
+    （已开始的LLM调用无法中断，只能忽略其结果）
+
+    Returns:
+        Future（result()返回函数结果或抛出其异常）
+    """
+    executor = ThreadPoolExecutor(max_workers=1)
+    try:
+        return executor.submit(func, *args, **kwargs)
+    finally:
+        executor.shutdown(wait=False)
@@ -26,7 +26,9 @@ class Config:
     LLM_MODEL: str = os.getenv("LLM_MODEL", "qwen-plus")
     LLM_TEMPERATURE: float = float(os.getenv("LLM_TEMPERATURE", "0.7"))
     LLM_MAX_TOKENS: int = int(os.getenv("LLM_MAX_TOKENS", "4000"))
+    LLM_CONTEXT_WINDOW: int = int(os.getenv("LLM_CONTEXT_WINDOW", "32000"))
     LLM_TIMEOUT: int = int(os.getenv("LLM_TIMEOUT", "120"))
+    LLM_MAX_CONCURRENCY: int = int(os.getenv("LLM_MAX_CONCURRENCY", "4"))
 
     # ================================
     # 项目配置
@@ -34,6 +36,12 @@ class Config:
     PROJECT_OUTPUT_DIR: Path = Path(os.getenv("PROJECT_OUTPUT_DIR", "./output"))
     PROJECT_TEMP_DIR: Path = Path(os.getenv("PROJECT_TEMP_DIR", "./temp"))
     PROJECT_LOG_DIR: Path = Path(os.getenv("PROJECT_LOG_DIR", "./logs"))
+    # 世界观构建：时间线、氛围、势力NPC三步只基于步骤1-3并发生成，由一致性检查和修复循环消除偏差
+    WORLDBUILDING_RELAXED_DEPS: bool = os.getenv("WORLDBUILDING_RELAXED_DEPS", "false").lower() == "true"
+    # 故事大纲：大纲一致性检查的同时推测生成主冲突，检查发现关键问题时丢弃
+    STORY_OUTLINE_SPECULATIVE_CONFLICTS: bool = (
+        os.getenv("STORY_OUTLINE_SPECULATIVE_CONFLICTS", "false").lower() == "true"
+    )
 
     # ================================
     # 日志配置
@@ -48,6 +56,8 @@ class Config:
     DEV_MODE: bool = os.getenv("DEV_MODE", "false").lower() == "true"
     DEBUG: bool = os.getenv("DEBUG", "false").lower() == "true"
     VERBOSE: bool = os.getenv("VERBOSE", "true").lower() == "true"
+    # 记录每次Agent调用的prompt组成，运行结束时写入报告
+    PROMPT_PROFILE: bool = os.getenv("PROMPT_PROFILE", "false").lower() == "true"
 
     @classmethod
     def validate(cls) -> bool:
@@ -85,6 +95,7 @@ LLM配置:
   API Key: {'*' * 10 + cls.LLM_API_KEY[-4:] if cls.LLM_API_KEY else '未设置'}
   Base URL: {cls.LLM_BASE_URL}
   温度: {cls.LLM_TEMPERATURE}
+  最大并发: {cls.LLM_MAX_CONCURRENCY}
 
 项目配置:
   输出目录: {cls.PROJECT_OUTPUT_DIR}
@@ -0,0 +1,140 @@
+"""
+增量一致性复查
+修复后只有部分步骤发生变化时，被修改的步骤发送完整数据，未修改的步骤只发送摘要，
+并保留上一轮中与被修改步骤无关、仍然有效的问题
+"""
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.fix_convergence import _issue_get, issue_fingerprint
+from utils.json_utils import prompt_json
+
+
+# 摘要中保留的字段（字段名以这些后缀结尾，如 item_id / event_name）
+SUMMARY_KEY_SUFFIXES = ("id", "name", "title", "year")
+# 状态严重程度排序
+STATUS_RANK = {"passed": 0, "warning": 1, "failed": 2}
+
+
+def _truncate(text: str, max_len: int = 40) -> str:
+    """截断过长文本"""
+    return text if len(text) <= max_len else text[:max_len] + "..."
+
+
+def compact_items(items: Any) -> str:
+    """
+    生成列表/字典数据的紧凑摘要（只保留ID、名称等标识字段）
+
+    Args:
+        items: 列表（元素为dict或字符串）或字典
+
+    Returns:
+        JSON字符串
+    """
+    if hasattr(items, "model_dump"):
+        items = items.model_dump()
+    if isinstance(items, dict):
+        return prompt_json(list(items.keys()))
+
+    compact = []
+    for item in items or []:
+        if hasattr(item, "model_dump"):
+            item = item.model_dump()
+        if isinstance(item, dict):
+            summary = {
+                key: value for key, value in item.items()
+                if isinstance(value, (str, int, float)) and key.lower().endswith(SUMMARY_KEY_SUFFIXES)
+            }
+            compact.append(summary or _truncate(prompt_json(item)))
+        else:
+            compact.append(_truncate(str(item)))
+    return prompt_json(compact)
+
+
+def carry_forward_issues(
+    prior_issues: Optional[Iterable[Any]],
+    changed_sources: Iterable[str]
+) -> List[Any]:
+    """
+    筛选上一轮中仍然有效的问题（来源步骤本轮未被修改）
+
+    Args:
+        prior_issues: 上一轮检查发现的问题
+        changed_sources: 本轮被修改步骤对应的source_agent
+
+    Returns:
+        需要保留的问题列表
+    """
+    changed = set(changed_sources)
+    return [
+        issue for issue in prior_issues or []
+        if _issue_get(issue, "source_agent") not in changed and not _issue_get(issue, "is_fixed")
+    ]
+
+
+def build_delta_scope(changed_labels: List[str], carried_issues: List[Any]) -> str:
+    """
+    生成增量复查的检查范围说明（插入到提示词中）
+
+    Args:
+        changed_labels: 被修改步骤的名称
+        carried_issues: 自动保留的上一轮问题
+
+    Returns:
+        检查范围说明文本
+    """
+    lines = [
+        "【本次检查范围 - 修复后增量复查】",
+        f"本轮只修改了: {', '.join(changed_labels) or '无'}。",
+        "被修改的部分提供完整数据，其余部分只提供摘要（上一轮已完整检查过）。",
+        "请重点检查被修改部分自身，以及它与其余部分之间的一致性；不要因为摘要缺少细节而报告问题。",
+    ]
+    if carried_issues:
+        lines.append("以下问题来自上一轮检查且与被修改部分无关，系统会自动保留，请不要重复报告：")
+        for issue in carried_issues:
+            lines.append(
+                f"- [{_issue_get(issue, 'severity')}] {_issue_get(issue, 'source_agent')}: "
+                f"{_issue_get(issue, 'description')}"
+            )
+    return "\n".join(lines) + "\n"
+
+
+def merge_carried_issues(result: Dict[str, Any], carried_issues: List[Any]) -> Dict[str, Any]:
+    """
+    把保留的问题合并回本次检查结果，并更新问题总数和整体状态
+
+    与本次新发现问题指纹相同的保留问题会被跳过（以本次结果为准）
+
+    Args:
+        result: 本次增量检查的输出（dict）
+        carried_issues: 自动保留的上一轮问题
+
+    Returns:
+        合并后的结果
+    """
+    issues = list(result.get("issues") or [])
+    seen = {issue_fingerprint(issue) for issue in issues}
+    added = []
+
+    for issue in carried_issues:
+        if issue_fingerprint(issue) in seen:
+            continue
+        added.append(issue.model_dump() if hasattr(issue, "model_dump") else dict(issue))
+        seen.add(issue_fingerprint(issue))
+    issues.extend(added)
+
+    result["issues"] = issues
+    result["total_issues"] = len(issues)
+
+    # 保留的问题决定状态下限
+    severities = {_issue_get(issue, "severity") for issue in added}
+    if "critical" in severities:
+        floor = "failed"
+    elif "high" in severities:
+        floor = "warning"
+    else:
+        floor = "passed"
+    status = result.get("overall_status", "passed")
+    if STATUS_RANK.get(floor, 0) > STATUS_RANK.get(status, 0):
+        result["overall_status"] = floor
+
+    return result
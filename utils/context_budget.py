@@ -0,0 +1,185 @@
+"""
+上下文预算
+本地估算prompt的token数，按优先级把各段上下文（世界观、前提、角色、冲突、路线概览、前一章节…）
+装进每个Agent的预算内：超出预算时从最低优先级的段开始先摘要、再截断
+
+token估算使用按字符类型校准的规则（不依赖分词器）:
+- 中日韩文字和全角标点: 约1 token/字
+- 其他字符（英文、数字、JSON符号）: 约1 token/3.5字符
+对Qwen/GPT系列分词器偏保守（略高估），用于预算足够
+"""
+import re
+from typing import Any, Callable, Dict, List, Optional
+
+from utils.config import config
+from utils.logger import log
+
+# 中日韩文字、全角标点
+_CJK_PATTERN = re.compile("[\u3000-\u303f\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]")
+
+CJK_TOKENS_PER_CHAR = 1.0
+OTHER_CHARS_PER_TOKEN = 3.5
+
+TRUNCATED_MARK = "\n…（上下文过长，已截断）"
+
+
+def estimate_tokens(text: str) -> int:
+    """估算文本的token数"""
+    if not text:
+        return 0
+    cjk = len(_CJK_PATTERN.findall(text))
+    other = len(text) - cjk
+    return int(cjk * CJK_TOKENS_PER_CHAR + other / OTHER_CHARS_PER_TOKEN) + 1
+
+
+def trim_to_tokens(text: str, max_tokens: int) -> str:
+    """
+    把文本截断到max_tokens以内（尽量在换行处截断）
+
+    Args:
+        text: 原文本
+        max_tokens: token上限
+
+    Returns:
+        截断后的文本（带截断标记）
+    """
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - estimate_tokens(TRUNCATED_MARK)
+    if budget <= 0:
+        return ""
+
+    # 二分查找能放下的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if estimate_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    cut = text.rfind("\n", 0, low)
+    if cut < low // 2:
+        cut = low
+    return text[:cut] + TRUNCATED_MARK
+
+
+def agent_context_budget(*prompt_texts: str, max_budget: Optional[int] = None) -> int:
+    """
+    计算Agent可用于上下文的token预算
+
+    预算 = 模型上下文窗口 - 输出预留(LLM_MAX_TOKENS) - prompt模板本身
+
+    Args:
+        prompt_texts: system prompt和human prompt模板
+        max_budget: Agent自身的预算上限
+
+    Returns:
+        token预算
+    """
+    budget = config.LLM_CONTEXT_WINDOW - config.LLM_MAX_TOKENS - sum(estimate_tokens(t) for t in prompt_texts)
+    if max_budget is not None:
+        budget = min(budget, max_budget)
+    return max(budget, 0)
+
+
+class ContextAssembler:
+    """
+    按优先级装配上下文
+
+    priority越小越重要；priority为0的段是必需内容，不会被摘要或截断。
+    超出预算时先从priority最大的段开始用摘要替换（有summarize的段），
+    仍然超出再从priority最大的段开始截断（至少保留min_tokens）
+    """
+
+    def __init__(self, budget: int, label: str = ""):
+        self.budget = budget
+        self.label = label
+        self._sections: List[Dict[str, Any]] = []
+        self.report: Dict[str, Dict[str, Any]] = {}
+
+    def add(
+        self,
+        name: str,
+        text: str,
+        priority: int = 1,
+        min_tokens: int = 0,
+        summarize: Optional[Callable[[], str]] = None
+    ) -> "ContextAssembler":
+        """
+        添加一段上下文
+
+        Args:
+            name: 段名（prompt变量名）
+            text: 内容
+            priority: 优先级（0为必需）
+            min_tokens: 截断时至少保留的token数
+            summarize: 返回摘要文本的函数（超出预算时先用摘要替换）
+        """
+        self._sections.append({
+            "name": name,
+            "text": text or "",
+            "priority": priority,
+            "min_tokens": min_tokens,
+            "summarize": summarize,
+        })
+        return self
+
+    def assemble(self) -> Dict[str, str]:
+        """
+        装配上下文
+
+        Returns:
+            {段名: 文本}（保持添加顺序）
+        """
+        tokens = {s["name"]: estimate_tokens(s["text"]) for s in self._sections}
+        texts = {s["name"]: s["text"] for s in self._sections}
+        self.report = {name: {"tokens": count, "action": "kept"} for name, count in tokens.items()}
+
+        overflow = sum(tokens.values()) - self.budget
+        if overflow > 0:
+            candidates = sorted(
+                (s for s in self._sections if s["priority"] > 0),
+                key=lambda s: -s["priority"]
+            )
+
+            # 第一轮：从低优先级开始用摘要替换
+            for section in candidates:
+                if overflow <= 0:
+                    break
+                if section["summarize"] is None:
+                    continue
+                name = section["name"]
+                summary = section["summarize"]() or ""
+                summary_tokens = estimate_tokens(summary)
+                if summary_tokens < tokens[name]:
+                    overflow -= tokens[name] - summary_tokens
+                    texts[name], tokens[name] = summary, summary_tokens
+                    self.report[name]["action"] = "summarized"
+
+            # 第二轮：仍然超出时从低优先级开始截断
+            for section in candidates:
+                if overflow <= 0:
+                    break
+                name = section["name"]
+                if tokens[name] <= section["min_tokens"]:
+                    continue
+                before = tokens[name]
+                texts[name] = trim_to_tokens(texts[name], max(section["min_tokens"], before - overflow))
+                tokens[name] = estimate_tokens(texts[name])
+                self.report[name]["action"] = "trimmed"
+                overflow -= before - tokens[name]
+
+            for name, count in tokens.items():
+                self.report[name]["final_tokens"] = count
+            changed = [f"{n}({r['action']})" for n, r in self.report.items() if r["action"] != "kept"]
+            log.info(
+                f"{self.label}上下文超出预算({self.budget} tokens)，已处理: {', '.join(changed)}"
+                + (f"；仍超出{overflow} tokens" if overflow > 0 else "")
+            )
+
+        return texts
+
+    @property
+    def total_tokens(self) -> int:
+        """当前装配结果的token数"""
+        return sum(r.get("final_tokens", r["tokens"]) for r in self.report.values())
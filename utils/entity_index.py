@@ -0,0 +1,206 @@
+"""
+实体检索索引
+对实体注册表中的实体（角色、冲突、场景、场景预设…）在进程内建立BM25索引，
+让各Agent只把与当前章节规划/模块相关的实体放进prompt（外加固定的核心内容）
+
+- 中文按字二元组（bigram）切分，英文/数字/ID按单词切分，不依赖分词库
+- 章节规划中直接点名的实体（ID或名称）一定命中，其余按BM25得分取前k个
+- 同一份大纲/世界观只建一次索引（按内容哈希缓存在内存中）
+"""
+import math
+import re
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional
+
+from utils.entity_registry import registry_from_data
+from utils.json_utils import stable_hash
+
+# 中日韩文字连续片段 / 英文数字单词
+_CJK_RUN = re.compile("[\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff]+")
+_WORD = re.compile(r"[A-Za-z0-9_]+")
+
+# 角色分组 -> 角色类型
+CAST_GROUPS = {
+    "protagonist": "protagonist",
+    "heroines": "heroine",
+    "supporting_cast": "supporting",
+    "antagonists": "antagonist",
+}
+
+_index_cache: Dict[str, "EntityIndex"] = {}
+_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """切分文本：中文取字二元组（单字片段取单字），英文数字取小写单词"""
+    if not text:
+        return []
+    tokens = [word.lower() for word in _WORD.findall(text)]
+    for run in _CJK_RUN.findall(text):
+        if len(run) == 1:
+            tokens.append(run)
+        else:
+            tokens.extend(run[i:i + 2] for i in range(len(run) - 1))
+    return tokens
+
+
+def _flatten_text(value: Any) -> str:
+    """拼接数据中的所有文本"""
+    if isinstance(value, dict):
+        return " ".join(_flatten_text(v) for v in value.values())
+    if isinstance(value, (list, tuple)):
+        return " ".join(_flatten_text(v) for v in value)
+    if value is None or isinstance(value, bool):
+        return ""
+    return str(value)
+
+
+class EntityIndex:
+    """
+    实体BM25索引
+
+    实体: {kind, id, name, data}；kind为实体类型（character/conflict/escalation_node/location/scene_preset）
+    """
+
+    K1 = 1.5
+    B = 0.75
+
+    def __init__(self):
+        self.entities: List[Dict[str, Any]] = []
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._lengths: List[int] = []
+        self._avg_length = 0.0
+
+    def add(self, kind: str, entity_id: str, data: Any, name: str = "") -> None:
+        """添加实体（ID为空的实体忽略）"""
+        if not entity_id:
+            return
+        position = len(self.entities)
+        self.entities.append({"kind": kind, "id": str(entity_id), "name": name or "", "data": data})
+
+        terms = Counter(tokenize(_flatten_text(data)))
+        for term, count in terms.items():
+            self._postings.setdefault(term, {})[position] = count
+        self._lengths.append(sum(terms.values()))
+        self._avg_length = sum(self._lengths) / len(self._lengths)
+
+    def __len__(self) -> int:
+        return len(self.entities)
+
+    def scores(self, query: str, kind: Optional[str] = None) -> Dict[int, float]:
+        """计算查询对各实体的BM25得分（只返回得分大于0的实体）"""
+        total = len(self.entities)
+        result: Dict[int, float] = {}
+        for term, query_count in Counter(tokenize(query)).items():
+            postings = self._postings.get(term)
+            if not postings:
+                continue
+            idf = math.log(1 + (total - len(postings) + 0.5) / (len(postings) + 0.5))
+            for position, count in postings.items():
+                if kind is not None and self.entities[position]["kind"] != kind:
+                    continue
+                norm = self.K1 * (1 - self.B + self.B * self._lengths[position] / (self._avg_length or 1))
+                result[position] = result.get(position, 0.0) + query_count * idf * count * (self.K1 + 1) / (count + norm)
+        return result
+
+    def select(
+        self,
+        kind: str,
+        query: str,
+        mentions: Iterable[str] = (),
+        top_k: int = 0,
+        core: Iterable[str] = ()
+    ) -> List[Any]:
+        """
+        选出与查询相关的实体
+
+        Args:
+            kind: 实体类型
+            query: 查询文本（章节规划等）
+            mentions: 直接点名的ID或名称（一定命中）
+            top_k: 点名之外按BM25得分追加的实体数
+            core: 固定包含的实体ID
+
+        Returns:
+            实体数据列表（保持原始顺序，输出稳定）
+        """
+        mentioned = {str(m) for m in mentions if m}
+        mentioned.update(str(c) for c in core if c)
+        selected = set()
+        for position, entity in enumerate(self.entities):
+            if entity["kind"] != kind:
+                continue
+            if entity["id"] in mentioned or entity["name"] in mentioned or (entity["name"] and entity["name"] in query):
+                selected.add(position)
+
+        if top_k > 0:
+            ranked = sorted(
+                (item for item in self.scores(query, kind).items() if item[0] not in selected),
+                key=lambda item: (-item[1], item[0])
+            )
+            selected.update(position for position, _ in ranked[:top_k])
+
+        return [self.entities[position]["data"] for position in sorted(selected)]
+
+
+# 进入检索索引的实体类型
+INDEXED_KINDS = ("character", "conflict", "escalation_node", "location", "scene_preset")
+
+
+def build_entity_index(story_outline_data: Dict[str, Any], world_setting_data: Dict[str, Any]) -> EntityIndex:
+    """
+    从故事大纲和世界观构建实体索引（带缓存）
+
+    实体取自实体注册表；角色数据附带role_type（protagonist/heroine/supporting/antagonist）
+
+    Args:
+        story_outline_data: 故事大纲数据（含steps）
+        world_setting_data: 世界观数据（steps或含steps的完整数据）
+
+    Returns:
+        实体索引
+    """
+    steps = story_outline_data.get("steps", {}) if story_outline_data else {}
+    world = (world_setting_data or {}).get("steps", world_setting_data) or {}
+    key = stable_hash({"outline": steps, "world": world})
+
+    with _lock:
+        if key in _index_cache:
+            return _index_cache[key]
+
+    registry = registry_from_data(steps, world)
+    index = EntityIndex()
+    for kind in INDEXED_KINDS:
+        for record in registry.entities(kind):
+            data = record["definitions"][0]["data"]
+            if kind == "character":
+                data = {**data, "role_type": CAST_GROUPS.get(record["definitions"][0]["collection"], "supporting")}
+            index.add(kind, record["id"], data, record["name"])
+
+    with _lock:
+        _index_cache[key] = index
+    return index
+
+
+def prune_entities(data: Any, id_key: str, keep: Iterable[str]) -> Any:
+    """
+    删除数据中未被选中的实体（带id_key且ID不在keep中的dict），其余内容原样保留
+
+    Args:
+        data: 原数据
+        id_key: 实体ID字段（如character_id、conflict_id）
+        keep: 保留的实体ID
+
+    Returns:
+        裁剪后的数据副本
+    """
+    keep = set(keep)
+    if isinstance(data, dict):
+        return {key: prune_entities(value, id_key, keep) for key, value in data.items()}
+    if isinstance(data, list):
+        return [
+            prune_entities(item, id_key, keep) for item in data
+            if not (isinstance(item, dict) and item.get(id_key) and item[id_key] not in keep)
+        ]
+    return data
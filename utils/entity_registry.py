@@ -0,0 +1,361 @@
+"""
+实体注册表
+把世界观、故事大纲、路线和章节中定义的实体（角色、地点、道具、势力、事件、冲突…）集中登记一次，
+记录每个实体的定义和所有被引用的位置，供prompt构建、检查器和运行时直接查询，不再各自遍历JSON
+
+- 按ID、名称/别名O(1)查找
+- 按阶段（phase）增量更新：某个阶段的数据变化时只替换该阶段的定义和引用
+- 引用按字符串值精确匹配（ID或名称），不扫描长文本
+- 位置格式: 阶段:路径，列表元素用其ID表示（如 story_outline:cast_arc.heroines.h1.faction_affiliation）
+"""
+import json
+import threading
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.logger import log
+
+# 定义实体的ID字段 -> 实体类型（按优先级：同一个dict有多个ID字段时，第一个是自身ID，其余是引用）
+ID_FIELDS = [
+    ("npc_id", "npc"),
+    ("character_id", "character"),
+    ("node_id", "escalation_node"),
+    ("conflict_id", "conflict"),
+    ("event_id", "event"),
+    ("item_id", "item"),
+    ("location_id", "location"),
+    ("org_id", "organization"),
+    ("faction_id", "faction"),
+    ("rule_id", "rule"),
+    ("chapter_id", "chapter"),
+    ("scene_type", "scene_preset"),
+    ("term", "term"),
+]
+# 用通用id字段定义实体的集合（路线数据）
+ID_COLLECTIONS = {"chapters": "chapter", "branches": "branch", "endings": "ending"}
+# 不在列表中、但本身是实体定义的字段
+SINGLE_DEFINITIONS = {"protagonist"}
+# 名称/别名字段
+NAME_FIELDS = ("name", "character_name", "conflict_name", "node_name", "event_name", "faction_name")
+ALIAS_FIELDS = ("aliases", "alias", "nicknames")
+# 只索引不超过该长度的字符串（ID、名称等短值）
+MAX_REF_LENGTH = 64
+
+# 项目文件 -> 阶段（只登记steps部分的阶段见STEPS_PHASES）
+PHASE_FILES = {
+    "world_setting": "world_setting.json",
+    "story_outline": "story_outline.json",
+    "route_strategy": "route_strategy.json",
+    "main_route": "main_route_framework.json",
+    "modular_main_route": "modular_main_route_framework.json",
+    "chapter_details": "chapter_details.json",
+}
+STEPS_PHASES = {"world_setting", "story_outline", "route_strategy"}
+
+EntityKey = Tuple[str, str]
+
+
+class EntityRegistry:
+    """
+    实体注册表
+
+    实体记录: {kind, id, name, aliases, definitions: [{phase, path, collection, data}]}
+    同一实体可以在多个阶段定义（如路线战略和主线框架中的同一章节），第一个定义为主定义
+    """
+
+    def __init__(self):
+        self._entities: Dict[EntityKey, Dict[str, Any]] = {}
+        self._by_id: Dict[str, Set[EntityKey]] = {}
+        self._by_alias: Dict[str, Set[EntityKey]] = {}
+        self._phase_entities: Dict[str, List[EntityKey]] = {}
+        self._phase_occurrences: Dict[str, Dict[str, List[str]]] = {}
+        self._file_mtimes: Dict[str, float] = {}
+        self._lock = threading.RLock()
+
+    # ==================== 登记 ====================
+
+    def update(self, phase: str, data: Any) -> None:
+        """
+        登记（或替换）一个阶段的数据
+
+        Args:
+            phase: 阶段名（如world_setting、story_outline、main_route、chapter:ch_01）
+            data: 阶段数据
+        """
+        if hasattr(data, "model_dump"):
+            data = data.model_dump()
+        with self._lock:
+            self.remove_phase(phase)
+            definitions: List[Tuple[EntityKey, Dict[str, Any]]] = []
+            occurrences: Dict[str, List[str]] = {}
+            self._walk(data, "", None, definitions, occurrences)
+
+            keys = []
+            for key, definition in definitions:
+                definition["phase"] = phase
+                record = self._entities.get(key)
+                if record is None:
+                    record = {"kind": key[0], "id": key[1], "name": "", "aliases": set(), "definitions": []}
+                    self._entities[key] = record
+                    self._by_id.setdefault(key[1], set()).add(key)
+                record["definitions"].append(definition)
+                self._reindex_aliases(key)
+                keys.append(key)
+
+            self._phase_entities[phase] = keys
+            self._phase_occurrences[phase] = occurrences
+
+    def remove_phase(self, phase: str) -> None:
+        """移除一个阶段登记的定义和引用"""
+        with self._lock:
+            for key in self._phase_entities.pop(phase, []):
+                record = self._entities.get(key)
+                if record is None:
+                    continue
+                record["definitions"] = [d for d in record["definitions"] if d["phase"] != phase]
+                if record["definitions"]:
+                    self._reindex_aliases(key)
+                    continue
+                for alias in record["aliases"]:
+                    self._discard(self._by_alias, alias, key)
+                self._discard(self._by_id, key[1], key)
+                del self._entities[key]
+            self._phase_occurrences.pop(phase, None)
+
+    def update_file(self, phase: str, path: str) -> bool:
+        """
+        从JSON文件登记阶段数据（文件未变化时跳过）
+
+        Returns:
+            是否重新登记
+        """
+        file_path = Path(path)
+        if not file_path.exists():
+            return False
+        mtime = file_path.stat().st_mtime
+        if self._file_mtimes.get(str(file_path)) == mtime:
+            return False
+        with open(file_path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        if phase in STEPS_PHASES and isinstance(data, dict) and "steps" in data:
+            data = data["steps"]
+        self.update(phase, data)
+        self._file_mtimes[str(file_path)] = mtime
+        return True
+
+    @classmethod
+    def from_project(cls, project_dir: str) -> "EntityRegistry":
+        """从项目输出目录登记所有已存在的阶段文件"""
+        registry = cls()
+        registry.refresh(project_dir)
+        return registry
+
+    def refresh(self, project_dir: str) -> List[str]:
+        """
+        重新登记项目目录中变化过的阶段文件
+
+        Returns:
+            重新登记的阶段
+        """
+        updated = [
+            phase for phase, filename in PHASE_FILES.items()
+            if self.update_file(phase, str(Path(project_dir) / filename))
+        ]
+        if updated:
+            log.info(f"实体注册表已更新: {', '.join(updated)}（共{len(self._entities)}个实体）")
+        return updated
+
+    # ==================== 查询 ====================
+
+    def get(self, ref: str, kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """
+        按ID或名称/别名查找实体
+
+        Args:
+            ref: 实体ID或名称
+            kind: 实体类型（不指定时返回任意类型的第一个匹配）
+
+        Returns:
+            实体记录，找不到时返回None
+        """
+        with self._lock:
+            for index in (self._by_id, self._by_alias):
+                keys = index.get(ref)
+                if not keys:
+                    continue
+                matched = sorted(k for k in keys if kind is None or k[0] == kind)
+                if matched:
+                    return self._entities[matched[0]]
+        return None
+
+    def definition(self, ref: str, kind: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """实体的主定义数据"""
+        record = self.get(ref, kind)
+        return record["definitions"][0]["data"] if record else None
+
+    def contains(self, ref: str, kind: Optional[str] = None) -> bool:
+        """ID或名称是否指向已登记的实体"""
+        return self.get(ref, kind) is not None
+
+    def ids(self, kind: str) -> Set[str]:
+        """某类实体的全部ID"""
+        with self._lock:
+            return {key[1] for key in self._entities if key[0] == kind}
+
+    def entities(self, kind: Optional[str] = None, collection: Optional[str] = None) -> List[Dict[str, Any]]:
+        """
+        按登记顺序列出实体
+
+        Args:
+            kind: 实体类型
+            collection: 定义所在的集合（如heroines、supporting_cast）
+        """
+        with self._lock:
+            records = []
+            seen = set()
+            for keys in self._phase_entities.values():
+                for key in keys:
+                    if key in seen or (kind is not None and key[0] != kind):
+                        continue
+                    seen.add(key)
+                    record = self._entities[key]
+                    if collection is None or record["definitions"][0]["collection"] == collection:
+                        records.append(record)
+            return records
+
+    def references(self, ref: str, kind: Optional[str] = None) -> List[str]:
+        """
+        实体被引用的所有位置（按ID或任一名称/别名精确匹配，不含自身定义中的ID/名称字段）
+
+        Returns:
+            位置列表 ["阶段:路径"]
+        """
+        record = self.get(ref, kind)
+        if record is None:
+            return []
+        with self._lock:
+            values = {record["id"]} | record["aliases"]
+            own_fields = {
+                f"{d['phase']}:{d['path']}.{field}"
+                for d in record["definitions"]
+                for field in (d["id_field"],) + NAME_FIELDS + ALIAS_FIELDS
+            }
+            locations = []
+            for phase, occurrences in self._phase_occurrences.items():
+                for value in values:
+                    for path in occurrences.get(value, []):
+                        location = f"{phase}:{path}"
+                        if location not in own_fields and not location.startswith(tuple(f + "." for f in own_fields)):
+                            locations.append(location)
+            return sorted(set(locations))
+
+    def __len__(self) -> int:
+        return len(self._entities)
+
+    # ==================== 内部 ====================
+
+    def _walk(
+        self,
+        value: Any,
+        path: str,
+        parent_key: Optional[str],
+        definitions: List[Tuple[EntityKey, Dict[str, Any]]],
+        occurrences: Dict[str, List[str]],
+        in_list: bool = False
+    ) -> None:
+        """遍历阶段数据，收集实体定义和短字符串出现的位置"""
+        if isinstance(value, dict):
+            if in_list or parent_key in SINGLE_DEFINITIONS:
+                found = self._definition_key(value, parent_key)
+                if found:
+                    (key, id_field) = found
+                    definitions.append((key, {
+                        "path": path, "collection": parent_key, "id_field": id_field, "data": value
+                    }))
+            for field, item in value.items():
+                child = f"{path}.{field}" if path else str(field)
+                if isinstance(field, str) and len(field) <= MAX_REF_LENGTH:
+                    # 以实体ID为键的映射（如relationship_matrix、faction_conflicts）
+                    occurrences.setdefault(field, []).append(child)
+                self._walk(item, child, field, definitions, occurrences)
+        elif isinstance(value, list):
+            for i, item in enumerate(value):
+                label = i
+                if isinstance(item, dict):
+                    found = self._definition_key(item, parent_key)
+                    label = found[0][1] if found else i
+                self._walk(item, f"{path}.{label}", parent_key, definitions, occurrences, in_list=True)
+        elif isinstance(value, str) and value and len(value) <= MAX_REF_LENGTH:
+            occurrences.setdefault(value, []).append(path)
+
+    @staticmethod
+    def _definition_key(item: Dict[str, Any], collection: Optional[str]) -> Optional[Tuple[EntityKey, str]]:
+        """dict定义的实体 ((类型, ID), ID字段)"""
+        for field, kind in ID_FIELDS:
+            entity_id = item.get(field)
+            if isinstance(entity_id, str) and entity_id:
+                return (kind, entity_id), field
+        if collection in ID_COLLECTIONS and isinstance(item.get("id"), str) and item["id"]:
+            return (ID_COLLECTIONS[collection], item["id"]), "id"
+        if collection == "protagonist":
+            return ("character", "protagonist_main"), "character_id"
+        return None
+
+    def _reindex_aliases(self, key: EntityKey) -> None:
+        """根据所有定义重建实体的名称和别名索引"""
+        record = self._entities[key]
+        for alias in record["aliases"]:
+            self._discard(self._by_alias, alias, key)
+
+        aliases: Set[str] = set()
+        name = ""
+        for definition in record["definitions"]:
+            data = definition["data"]
+            for field in NAME_FIELDS:
+                if isinstance(data.get(field), str) and data[field]:
+                    name = name or data[field]
+                    aliases.add(data[field])
+            for field in ALIAS_FIELDS:
+                values = data.get(field)
+                if isinstance(values, str):
+                    values = [values]
+                if isinstance(values, list):
+                    aliases.update(v for v in values if isinstance(v, str) and v)
+        aliases.discard(key[1])
+
+        record["name"] = name
+        record["aliases"] = aliases
+        for alias in aliases:
+            self._by_alias.setdefault(alias, set()).add(key)
+
+    @staticmethod
+    def _discard(index: Dict[str, Set[EntityKey]], value: str, key: EntityKey) -> None:
+        keys = index.get(value)
+        if keys is None:
+            return
+        keys.discard(key)
+        if not keys:
+            del index[value]
+
+
+def registry_from_data(
+    story_outline_data: Optional[Dict[str, Any]] = None,
+    world_setting_data: Optional[Dict[str, Any]] = None,
+    extra_phases: Optional[Dict[str, Any]] = None
+) -> EntityRegistry:
+    """
+    从内存中的阶段数据构建注册表（steps或含steps的完整数据均可）
+
+    Args:
+        story_outline_data: 故事大纲数据
+        world_setting_data: 世界观数据
+        extra_phases: 其他阶段 {阶段名: 数据}
+    """
+    registry = EntityRegistry()
+    for phase, data in (("world_setting", world_setting_data), ("story_outline", story_outline_data)):
+        if data:
+            registry.update(phase, data.get("steps", data) if isinstance(data, dict) else data)
+    for phase, data in (extra_phases or {}).items():
+        registry.update(phase, data)
+    return registry
+
@@ -0,0 +1,124 @@
+"""
+修复收敛检测
+为一致性问题计算指纹（与描述措辞无关），跨轮次追踪问题的解决情况，
+在修复不再收敛时提前结束修复循环
+"""
+import re
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from utils.logger import log
+
+
+def _issue_get(issue: Any, key: str) -> Any:
+    """读取问题字段（兼容Pydantic对象和dict）"""
+    if isinstance(issue, dict):
+        return issue.get(key)
+    return getattr(issue, key, None)
+
+
+def _normalize(value: Any) -> str:
+    """归一化字段：小写、去空白、列表下标统一为[]"""
+    if value is None:
+        return ""
+    text = str(value).strip().lower()
+    text = re.sub(r"\s+", "", text)
+    text = re.sub(r"\[\d+\]", "[]", text)
+    return text
+
+
+def issue_fingerprint(issue: Any) -> str:
+    """
+    计算问题指纹
+
+    由归一化的 category + location/related_field + source_agent 组成，
+    同一问题换了描述措辞仍得到相同指纹。
+    没有定位字段时退回到归一化的描述
+
+    Args:
+        issue: 问题（Pydantic对象或dict）
+
+    Returns:
+        问题指纹
+    """
+    category = _normalize(_issue_get(issue, "category"))
+    location = _normalize(_issue_get(issue, "location") or _issue_get(issue, "related_field"))
+    source_agent = _normalize(_issue_get(issue, "source_agent"))
+    if not location:
+        location = _normalize(_issue_get(issue, "description"))
+    return f"{category}|{location}|{source_agent}"
+
+
+class FixConvergenceTracker:
+    """
+    修复收敛追踪器
+
+    每轮修复后记录问题指纹的变化：
+    - resolved: 本轮消失的问题
+    - introduced: 本轮新出现的问题
+    - reintroduced: 之前已修复、本轮又出现的问题
+    当一轮没有解决任何问题，或重新引入的问题不少于解决的问题时，判定为不收敛
+    """
+
+    def __init__(self, stage: str = ""):
+        self.stage = stage
+        self.rounds: List[Dict[str, Any]] = []
+        self._current: Set[str] = set()
+        self._resolved_ever: Set[str] = set()
+
+    def start(self, issues: Iterable[Any]):
+        """记录修复前的问题"""
+        self._current = {issue_fingerprint(issue) for issue in issues}
+        self._resolved_ever = set()
+        self.rounds = []
+
+    def record_round(self, round_num: int, issues: Iterable[Any]) -> Dict[str, Any]:
+        """
+        记录一轮修复后的问题，返回本轮统计
+
+        Args:
+            round_num: 修复轮次
+            issues: 本轮修复后重新检查得到的问题（与start传入的范围一致）
+
+        Returns:
+            本轮解决情况统计
+        """
+        previous = self._current
+        current = {issue_fingerprint(issue) for issue in issues}
+
+        resolved = previous - current
+        introduced = current - previous
+        reintroduced = introduced & self._resolved_ever
+        self._resolved_ever |= resolved
+        self._current = current
+
+        stats = {
+            "round": round_num,
+            "issues_before": len(previous),
+            "issues_after": len(current),
+            "resolved": len(resolved),
+            "persisting": len(previous & current),
+            "introduced": len(introduced),
+            "reintroduced": len(reintroduced),
+            "reintroduced_fingerprints": sorted(reintroduced),
+        }
+        self.rounds.append(stats)
+        return stats
+
+    def should_stop(self, stats: Dict[str, Any]) -> Optional[str]:
+        """
+        判断是否应提前结束修复循环
+
+        Returns:
+            结束原因，继续修复时返回None
+        """
+        if stats["issues_after"] == 0:
+            return None
+        if stats["resolved"] == 0:
+            reason = "本轮修复未解决任何问题"
+        elif stats["reintroduced"] > 0 and stats["reintroduced"] >= stats["resolved"]:
+            reason = f"本轮修复重新引入了{stats['reintroduced']}个之前已修复的问题"
+        else:
+            return None
+
+        log.warning(f"{self.stage}修复不收敛: {reason}，提前结束修复")
+        return reason
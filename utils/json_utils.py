@@ -2,8 +2,9 @@
 JSON工具函数
 处理JSON格式转换和验证
 """
+import hashlib
 import json
-from typing import Any, Dict, Type, TypeVar
+from typing import Any, Dict, Optional, Set, Type, TypeVar
 from pydantic import BaseModel, ValidationError
 from utils.logger import log
 
@@ -116,3 +117,67 @@ def merge_json(base: Dict[str, Any], override: Dict[str, Any]) -> Dict[str, Any]
     result = base.copy()
     result.update(override)
     return result
+
+
+def stable_hash(data: Any) -> str:
+    """
+    计算数据的稳定哈希（键排序后序列化，与字典顺序无关）
+
+    Args:
+        data: 可JSON序列化的数据（Pydantic对象会先转为dict）
+
+    Returns:
+        16位十六进制哈希字符串
+    """
+    if hasattr(data, "model_dump"):
+        data = data.model_dump()
+    serialized = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+def _prepare_prompt_data(data: Any, drop_empty: bool, key_aliases: Optional[Dict[str, str]], used: Set[str]) -> Any:
+    """转换Pydantic对象、去掉空字段、替换字段缩写"""
+    if hasattr(data, "model_dump"):
+        data = data.model_dump()
+    if isinstance(data, dict):
+        result = {}
+        for key, value in data.items():
+            value = _prepare_prompt_data(value, drop_empty, key_aliases, used)
+            if drop_empty and value in (None, "", [], {}):
+                continue
+            if key_aliases and key in key_aliases:
+                used.add(key)
+                key = key_aliases[key]
+            result[key] = value
+        return result
+    if isinstance(data, (list, tuple)):
+        return [_prepare_prompt_data(item, drop_empty, key_aliases, used) for item in data]
+    return data
+
+
+def prompt_json(
+    data: Any,
+    drop_empty: bool = False,
+    key_aliases: Optional[Dict[str, str]] = None,
+    sort_keys: bool = True
+) -> str:
+    """
+    序列化嵌入prompt的JSON（紧凑分隔符、键排序，相同数据输出相同文本，便于缓存命中）
+
+    Args:
+        data: 数据（Pydantic对象会先转为dict）
+        drop_empty: 去掉值为None/空字符串/空列表/空字典的字段
+        key_aliases: 字段缩写 {原字段: 缩写}，使用时在开头附上缩写说明（只用于LLM不需要照抄结构的只读数据）
+        sort_keys: 是否按键排序
+
+    Returns:
+        JSON文本
+    """
+    used: Set[str] = set()
+    if drop_empty or key_aliases or hasattr(data, "model_dump"):
+        data = _prepare_prompt_data(data, drop_empty, key_aliases, used)
+    serialized = json.dumps(data, ensure_ascii=False, sort_keys=sort_keys, separators=(',', ':'), default=str)
+    if not used:
+        return serialized
+    legend = ", ".join(f"{key_aliases[key]}={key}" for key in sorted(used))
+    return f"（字段缩写: {legend}）\n{serialized}"
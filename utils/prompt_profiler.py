@@ -0,0 +1,252 @@
+"""
+Prompt组成分析
+记录每次Agent调用渲染出的prompt：按模板变量统计字符数/token数、空白字符占比，
+检测不同变量之间重复嵌入的内容（如同一份角色数据在一个prompt里出现多次），运行结束时写入报告
+
+开启方式: 环境变量 PROMPT_PROFILE=true，或调用 prompt_profiler.enable()
+报告位置: PROJECT_LOG_DIR/prompt_profile_{时间戳}.json
+查看报告: python -m utils.prompt_profiler <报告文件>
+"""
+import atexit
+import json
+import re
+import threading
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+from utils.config import config
+from utils.context_budget import estimate_tokens
+from utils.logger import log
+
+# 重复检测的最小长度（去掉空白后的字符数）
+DUPLICATE_MIN_CHARS = 48
+# 报告中保留的重复片段示例长度
+SAMPLE_CHARS = 40
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def find_duplicates(variables: Dict[str, str], min_chars: int = DUPLICATE_MIN_CHARS) -> List[Dict[str, Any]]:
+    """
+    检测变量之间重复的内容
+
+    去掉空白后比较（缩进JSON和紧凑JSON视为相同内容）：把后一个变量按min_chars切成对齐的窗口，
+    窗口在前一个变量任意位置出现即计为重复，重复字符数为命中窗口数 × min_chars（下界）
+
+    Args:
+        variables: {变量名: 文本}
+        min_chars: 最小重复长度
+
+    Returns:
+        [{variables: [变量A, 变量B], chars: 重复字符数, sample: 示例片段}]，按重复字符数降序
+    """
+    texts = {
+        name: _WHITESPACE.sub("", value) for name, value in variables.items()
+        if isinstance(value, str) and len(value) >= min_chars
+    }
+    texts = {name: text for name, text in texts.items() if len(text) >= min_chars}
+    names = list(texts)
+    windows = {
+        name: {hash(text[i:i + min_chars]) for i in range(len(text) - min_chars + 1)}
+        for name, text in texts.items()
+    }
+
+    duplicates = []
+    for i, first in enumerate(names):
+        for second in names[i + 1:]:
+            text = texts[second]
+            hits = [
+                start for start in range(0, len(text) - min_chars + 1, min_chars)
+                if hash(text[start:start + min_chars]) in windows[first]
+            ]
+            if hits:
+                duplicates.append({
+                    "variables": [first, second],
+                    "chars": len(hits) * min_chars,
+                    "sample": text[hits[0]:hits[0] + SAMPLE_CHARS],
+                })
+    duplicates.sort(key=lambda d: -d["chars"])
+    return duplicates
+
+
+def profile_prompt(template: str, variables: Dict[str, Any], system_prompt: str = "") -> Dict[str, Any]:
+    """
+    分析一次渲染的prompt
+
+    Args:
+        template: human prompt模板
+        variables: 模板变量
+        system_prompt: system prompt
+
+    Returns:
+        {total_chars, total_tokens, system_tokens, template_tokens, variables, duplicates}
+    """
+    used = {name: str(value) for name, value in variables.items() if "{" + name + "}" in template}
+    variable_stats = {}
+    for name, text in used.items():
+        whitespace = sum(len(m) for m in _WHITESPACE.findall(text))
+        variable_stats[name] = {
+            "chars": len(text),
+            "tokens": estimate_tokens(text),
+            "whitespace_ratio": round(whitespace / len(text), 3) if text else 0.0,
+        }
+
+    template_tokens = estimate_tokens(re.sub(r"\{[a-zA-Z_]+\}", "", template))
+    system_tokens = estimate_tokens(system_prompt)
+    return {
+        "total_chars": len(system_prompt) + len(template) + sum(s["chars"] for s in variable_stats.values()),
+        "total_tokens": system_tokens + template_tokens + sum(s["tokens"] for s in variable_stats.values()),
+        "system_tokens": system_tokens,
+        "template_tokens": template_tokens,
+        "variables": variable_stats,
+        "duplicates": find_duplicates(used),
+    }
+
+
+class PromptProfiler:
+    """Prompt组成记录器（线程安全，关闭时record不做任何事）"""
+
+    def __init__(self, enabled: bool = False):
+        self.enabled = False
+        self.records: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._exit_hook = False
+        if enabled:
+            self.enable()
+
+    def enable(self) -> None:
+        """开启记录（进程退出时自动写入报告）"""
+        self.enabled = True
+        if not self._exit_hook:
+            atexit.register(self._write_on_exit)
+            self._exit_hook = True
+
+    def record(
+        self,
+        agent: str,
+        template: str,
+        variables: Dict[str, Any],
+        system_prompt: str = "",
+        label: str = ""
+    ) -> None:
+        """
+        记录一次prompt
+
+        Args:
+            agent: Agent名称
+            template: human prompt模板
+            variables: 模板变量
+            system_prompt: system prompt
+            label: 调用类型（如skeleton、scene，默认为主模板）
+        """
+        if not self.enabled:
+            return
+        try:
+            profile = profile_prompt(template, variables, system_prompt)
+        except Exception as e:
+            log.warning(f"prompt分析失败 ({agent}): {e}")
+            return
+        profile.update({"agent": agent, "label": label, "time": datetime.now().isoformat(timespec="seconds")})
+        with self._lock:
+            self.records.append(profile)
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        按Agent（及调用类型）汇总
+
+        Returns:
+            {名称: {calls, avg_tokens, max_tokens, variables: {变量: {avg_tokens, share}}, duplicates: [...]}}
+        """
+        with self._lock:
+            records = list(self.records)
+        return summarize_records(records)
+
+    def write_report(self, path: Optional[str] = None) -> Optional[Path]:
+        """
+        写入报告（汇总 + 每次调用的明细）
+
+        Returns:
+            报告路径；没有记录时返回None
+        """
+        with self._lock:
+            records = list(self.records)
+        if not records:
+            return None
+        if path is None:
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            path = Path(config.PROJECT_LOG_DIR) / f"prompt_profile_{timestamp}.json"
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"summary": summarize_records(records), "calls": records}, f, ensure_ascii=False, indent=2)
+        log.info(f"prompt组成报告已保存到: {path}（{len(records)}次调用）")
+        return path
+
+    def _write_on_exit(self) -> None:
+        try:
+            self.write_report()
+        except Exception as e:
+            log.warning(f"prompt组成报告写入失败: {e}")
+
+
+def summarize_records(records: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """按Agent（及调用类型）汇总prompt记录"""
+    groups: Dict[str, List[Dict[str, Any]]] = {}
+    for record in records:
+        key = f"{record['agent']}:{record['label']}" if record.get("label") else record["agent"]
+        groups.setdefault(key, []).append(record)
+
+    summary = {}
+    for key, items in groups.items():
+        calls = len(items)
+        total = sum(r["total_tokens"] for r in items)
+        variable_tokens: Dict[str, int] = {}
+        for record in items:
+            for name, stats in record["variables"].items():
+                variable_tokens[name] = variable_tokens.get(name, 0) + stats["tokens"]
+        duplicate_chars: Dict[str, List[int]] = {}
+        for record in items:
+            for duplicate in record["duplicates"]:
+                duplicate_chars.setdefault(" & ".join(duplicate["variables"]), []).append(duplicate["chars"])
+
+        summary[key] = {
+            "calls": calls,
+            "avg_tokens": total // calls,
+            "max_tokens": max(r["total_tokens"] for r in items),
+            "variables": {
+                name: {"avg_tokens": tokens // calls, "share": round(tokens / total, 3) if total else 0.0}
+                for name, tokens in sorted(variable_tokens.items(), key=lambda item: -item[1])
+            },
+            "duplicates": [
+                {"variables": pair, "calls": len(chars), "avg_chars": sum(chars) // len(chars)}
+                for pair, chars in sorted(duplicate_chars.items(), key=lambda item: -sum(item[1]))
+            ],
+        }
+    return summary
+
+
+prompt_profiler = PromptProfiler(enabled=config.PROMPT_PROFILE)
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description="查看prompt组成报告")
+    parser.add_argument("report", help="prompt_profile_*.json 报告文件")
+    parser.add_argument("--top", type=int, default=8, help="每个Agent显示的变量数")
+    args = parser.parse_args()
+
+    with open(args.report, "r", encoding="utf-8") as f:
+        report = json.load(f)
+
+    for name, stats in report["summary"].items():
+        print(f"\n{name}: {stats['calls']}次调用, 平均{stats['avg_tokens']} tokens, 最大{stats['max_tokens']} tokens")
+        for variable, item in list(stats["variables"].items())[:args.top]:
+            print(f"  {variable:<28} {item['avg_tokens']:>8} tokens  {item['share']:>6.1%}")
+        for duplicate in stats["duplicates"]:
+            print(f"  ⚠️ 重复: {duplicate['variables']}（{duplicate['calls']}次, 平均{duplicate['avg_chars']}字符）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,150 @@
+"""
+路线自动修复 - 直接修复不使用LLM
+对RouteConsistencyChecker报告中的数值问题和分支跨度问题做确定性修复（截断数值、调整回归章节），
+可达性等需要剧情判断的问题仍交给RouteFixerAgent
+"""
+import copy
+from typing import Any, Dict, List, Optional, Tuple
+
+from utils.route_graph import RouteGraph
+
+
+class RouteAutoFixer:
+    """路线自动修复器"""
+
+    # 可以自动修复的问题类型
+    AUTO_FIX_CATEGORIES = ["numeric_issue", "span_issue"]
+
+    # 阈值（与RouteConsistencyChecker一致）
+    EFFECT_LIMIT = 20
+    VISIBLE_LIMIT = 70
+    EARLY_VISIBLE_LIMIT = 10
+    EARLY_CHAPTERS = 3
+    REWARD_RANGE = (20, 45)
+    MAX_SPAN = 3
+
+    def __init__(self, route_framework: Dict[str, Any]):
+        self.route = copy.deepcopy(route_framework)
+        self.graph = RouteGraph(self.route)
+        self.changes: List[Dict[str, Any]] = []
+
+    @classmethod
+    def can_fix(cls, issue: Dict[str, Any]) -> bool:
+        """判断问题是否可以自动修复"""
+        return issue.get("category") in cls.AUTO_FIX_CATEGORIES
+
+    def fix(self, issues: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        修复问题
+
+        Args:
+            issues: 检查报告中的问题列表（不可自动修复的会被忽略）
+
+        Returns:
+            修复后的主线框架（副本）
+        """
+        for issue in issues:
+            if not self.can_fix(issue):
+                continue
+            parts = (issue.get("location") or "").split(".")
+            if issue["category"] == "span_issue" and len(parts) >= 2 and parts[0] == "branches":
+                self._fix_span(issue, parts[1])
+            elif len(parts) == 5 and parts[0] == "chapters" and parts[2] == "choices":
+                self._fix_choice(issue, parts[1], parts[3], parts[4])
+            elif len(parts) == 3 and parts[0] == "branches" and parts[2] == "reward":
+                self._fix_reward(issue, parts[1])
+
+        return self.route
+
+    def _fix_choice(self, issue: Dict[str, Any], chapter_id: str, choice_id: str, field: str):
+        """截断选项的visible/effect数值"""
+        chapter = self.graph.chapters.get(chapter_id)
+        if not chapter:
+            return
+        choice = next((c for c in chapter.get("choices", []) if str(c.get("id")) == choice_id), None)
+        values = choice.get(field) if choice else None
+        if not isinstance(values, dict):
+            return
+
+        if field == "visible":
+            early = self.graph.chapter_index.get(chapter_id, 0) <= self.EARLY_CHAPTERS
+            limit = self.EARLY_VISIBLE_LIMIT if early else self.VISIBLE_LIMIT
+            bounds = (None, limit)
+        elif field == "effect":
+            bounds = (-self.EFFECT_LIMIT, self.EFFECT_LIMIT)
+        else:
+            return
+
+        for key, value in list(values.items()):
+            fixed = self._clamp(value, *bounds)
+            if fixed != value:
+                values[key] = fixed
+                self._record(issue, f"chapters.{chapter_id}.choices.{choice_id}.{field}.{key}", value, fixed)
+
+    def _fix_reward(self, issue: Dict[str, Any], branch_id: str):
+        """截断分支reward数值"""
+        reward = self.graph.branches.get(branch_id, {}).get("reward")
+        if not isinstance(reward, dict):
+            return
+        for key, value in list(reward.items()):
+            fixed = self._clamp(value, *self.REWARD_RANGE)
+            if fixed != value:
+                reward[key] = fixed
+                self._record(issue, f"branches.{branch_id}.reward.{key}", value, fixed)
+
+    def _fix_span(self, issue: Dict[str, Any], branch_id: str):
+        """把分支回归章节调整到入口章节后MAX_SPAN章以内"""
+        branch = self.graph.branches.get(branch_id)
+        entry_chapter = self.graph.entry_chapter(branch_id)
+        if not branch or not entry_chapter:
+            return
+        entry_idx = self.graph.chapter_index[entry_chapter]
+        return_idx = self.graph.chapter_index.get(branch.get("return"), 0)
+        if return_idx - entry_idx <= self.MAX_SPAN:
+            return
+
+        target_idx = min(entry_idx + self.MAX_SPAN, len(self.graph.chapter_order))
+        new_return = self.graph.chapter_order[target_idx - 1]
+        self._record(issue, f"branches.{branch_id}.return", branch.get("return"), new_return)
+        branch["return"] = new_return
+
+    @staticmethod
+    def _clamp(value: Any, low: Optional[int], high: Optional[int]) -> Any:
+        """截断数值（非数值原样返回）"""
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return value
+        if low is not None and value < low:
+            return low
+        if high is not None and value > high:
+            return high
+        return value
+
+    def _record(self, issue: Dict[str, Any], field: str, before: Any, after: Any):
+        """记录修改"""
+        self.changes.append({
+            "issue_id": issue.get("issue_id"),
+            "field": field,
+            "before": before,
+            "after": after
+        })
+
+
+def auto_fix_route(
+    route_framework: Dict[str, Any],
+    issues: List[Dict[str, Any]]
+) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+    """
+    自动修复路线中的数值和跨度问题
+
+    Args:
+        route_framework: 主线框架数据
+        issues: 检查报告中的问题列表
+
+    Returns:
+        (修复后的主线框架, 修改记录)；没有修改时返回原路线
+    """
+    fixer = RouteAutoFixer(route_framework)
+    fixed_route = fixer.fix(issues)
+    if not fixer.changes:
+        return route_framework, []
+    return fixed_route, fixer.changes
@@ -5,24 +5,78 @@ import json
 from typing import Dict, Any, List
 from pathlib import Path
 
+from utils.route_graph import RouteGraph
+from utils.route_reachability import RouteReachabilityAnalyzer
+
 
 class RouteConsistencyChecker:
-    """路线一致性检查器"""
+    """
+    路线一致性检查器
+
+    所有检查基于RouteGraph索引，问题按作用域（章节/分支/结局）缓存；
+    修复后调用recheck只重新检查变化章节及受影响的分支/结局
+    """
+
+    # 检查顺序（决定报告中问题的顺序）
+    CHECKS = ["branch_reachability", "ending_reachability", "ending_condition", "chapter_numeric",
+              "branch_reward", "span", "invalid_choice"]
 
     def __init__(self, route_framework: Dict[str, Any]):
         self.route = route_framework
+        self.graph = RouteGraph(route_framework)
         self.issues = []
+        self._scoped: Dict[str, Dict[str, List[Dict[str, Any]]]] = {check: {} for check in self.CHECKS}
 
     def check_all(self) -> Dict[str, Any]:
         """执行所有检查"""
-        self.issues = []
+        self._scoped = {check: {} for check in self.CHECKS}
 
         self.check_branch_reachability()
         self.check_ending_reachability()
+        self.check_ending_conditions()
         self.check_numeric_balance()
         self.check_span_issues()
         self.check_invalid_choices()
 
+        return self._build_report()
+
+    def recheck(self, route_framework: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        增量复查修复后的路线
+
+        只重新检查内容变化的章节，以及引用关系/定义发生变化的分支和结局；
+        章节增删或顺序变化时退回完整检查
+
+        Args:
+            route_framework: 修复后的主线框架
+
+        Returns:
+            检查报告
+        """
+        self.route = route_framework
+        changes = self.graph.update(route_framework)
+        if changes is None:
+            return self.check_all()
+
+        for chapter_id in changes["chapters"]:
+            self._check_chapter_numeric(chapter_id)
+            self._check_chapter_choices(chapter_id)
+        for branch_id in changes["branches"]:
+            self._check_branch(branch_id)
+            self._check_branch_reward(branch_id)
+            self._check_branch_span(branch_id)
+        for ending_id in changes["endings"]:
+            self._check_ending(ending_id)
+        # 好感度门槛沿整条路线传播，任何改动都需要重新分析
+        if any(changes.values()):
+            self.check_ending_conditions()
+
+        return self._build_report()
+
+    def _build_report(self) -> Dict[str, Any]:
+        """汇总各作用域的问题并生成报告"""
+        self.issues = self._collect_issues()
+
         # 确定整体状态
         critical_count = sum(1 for i in self.issues if i['severity'] == 'critical')
         high_count = sum(1 for i in self.issues if i['severity'] == 'high')
@@ -41,200 +95,229 @@ class RouteConsistencyChecker:
             "issues": self.issues
         }
 
+    def _collect_issues(self) -> List[Dict[str, Any]]:
+        """按检查顺序和路线顺序汇总问题"""
+        branch_scopes = list(self.graph.branches) + sorted(
+            t for t in self.graph.referenced_targets('branch_') if t not in self.graph.branches
+        )
+        scope_orders = {
+            "branch_reachability": branch_scopes,
+            "ending_reachability": list(self.graph.endings),
+            "ending_condition": list(self.graph.endings),
+            "chapter_numeric": self.graph.chapter_order,
+            "branch_reward": list(self.graph.branches),
+            "span": list(self.graph.branches),
+            "invalid_choice": self.graph.chapter_order,
+        }
+        issues = []
+        for check in self.CHECKS:
+            scoped = self._scoped[check]
+            for scope in scope_orders[check]:
+                issues.extend(scoped.get(scope, []))
+        return issues
+
+    def _set_issues(self, check: str, scope: str, issues: List[Dict[str, Any]]):
+        """写入某个作用域的问题（覆盖上一次结果）"""
+        if issues:
+            self._scoped[check][scope] = issues
+        else:
+            self._scoped[check].pop(scope, None)
+
     def check_branch_reachability(self):
         """检查分支可达性"""
-        branches = self.route.get('branches', [])
-        branch_ids = [b['id'] for b in branches]
-
-        # 收集被引用的branch
-        referenced_branches = self._get_referenced_branches()
-
-        # 找出未引用的分支
-        for branch_id in branch_ids:
-            if branch_id not in referenced_branches:
-                self.issues.append({
-                    "issue_id": f"branch_{branch_id}",
-                    "category": "branch_unreachable",
-                    "severity": "high",
-                    "description": f"分支 {branch_id} 没有被任何选择的branch字段引用",
-                    "location": f"branches.{branch_id}",
-                    "fix_suggestion": f"在某个章节的choices中添加一个选项，branch指向 {branch_id}"
-                })
+        for branch_id in set(self.graph.branches) | self.graph.referenced_targets('branch_'):
+            self._check_branch(branch_id)
+
+    def _check_branch(self, branch_id: str):
+        """检查单个分支的入口（未被引用 / 入口过多）"""
+        issues = []
+        refs = self.graph.refs_to(branch_id)
+
+        # 未被引用的分支（只有branch_前缀的引用计入）
+        if branch_id in self.graph.branches and not (refs and branch_id.startswith('branch_')):
+            issues.append({
+                "issue_id": f"branch_{branch_id}",
+                "category": "branch_unreachable",
+                "severity": "high",
+                "description": f"分支 {branch_id} 没有被任何选择的branch字段引用",
+                "location": f"branches.{branch_id}",
+                "fix_suggestion": f"在某个章节的choices中添加一个选项，branch指向 {branch_id}"
+            })
 
         # 检查分支入口数量
-        branch_ref_count = {}
-        for ch in self.route.get('chapters', []):
-            for choice in ch.get('choices', []):
-                branch = choice.get('branch')
-                if branch and branch.startswith('branch_'):
-                    branch_ref_count[branch] = branch_ref_count.get(branch, 0) + 1
-
-        for branch_id, count in branch_ref_count.items():
-            if count > 2:
-                self.issues.append({
-                    "issue_id": f"branch_multiple_{branch_id}",
-                    "category": "branch_unreachable",
-                    "severity": "medium",
-                    "description": f"分支 {branch_id} 有 {count} 个入口，建议不超过2个",
-                    "location": f"branches.{branch_id}",
-                    "fix_suggestion": f"删除多余的入口，只保留1-2个"
-                })
+        if branch_id.startswith('branch_') and len(refs) > 2:
+            issues.append({
+                "issue_id": f"branch_multiple_{branch_id}",
+                "category": "branch_unreachable",
+                "severity": "medium",
+                "description": f"分支 {branch_id} 有 {len(refs)} 个入口，建议不超过2个",
+                "location": f"branches.{branch_id}",
+                "fix_suggestion": f"删除多余的入口，只保留1-2个"
+            })
+
+        self._set_issues("branch_reachability", branch_id, issues)
 
     def check_ending_reachability(self):
         """检查结局可达性"""
-        endings = self.route.get('endings', [])
-        ending_ids = [e['id'] for e in endings]
-
-        # 收集被引用的ending
-        referenced_endings = self._get_referenced_endings()
-
-        # 找出未引用的结局
-        for ending_id in ending_ids:
-            if ending_id not in referenced_endings:
-                self.issues.append({
-                    "issue_id": f"ending_{ending_id}",
-                    "category": "ending_unreachable",
-                    "severity": "critical",
-                    "description": f"结局 {ending_id} 没有被任何选择的branch字段引用",
-                    "location": f"endings.{ending_id}",
-                    "fix_suggestion": f"在最终章的choices中添加一个选项，branch指向 {ending_id}"
-                })
+        for ending_id in self.graph.endings:
+            self._check_ending(ending_id)
+
+    def _check_ending(self, ending_id: str):
+        """检查单个结局是否被引用"""
+        issues = []
+        if ending_id in self.graph.endings and not (self.graph.refs_to(ending_id) and ending_id.startswith('ending_')):
+            issues.append({
+                "issue_id": f"ending_{ending_id}",
+                "category": "ending_unreachable",
+                "severity": "critical",
+                "description": f"结局 {ending_id} 没有被任何选择的branch字段引用",
+                "location": f"endings.{ending_id}",
+                "fix_suggestion": f"在最终章的choices中添加一个选项，branch指向 {ending_id}"
+            })
+        self._set_issues("ending_reachability", ending_id, issues)
+
+    def check_ending_conditions(self):
+        """检查被引用的结局在好感度门槛下能否真正到达"""
+        self._scoped["ending_condition"] = {}
+        for ending_id, result in RouteReachabilityAnalyzer(self.route).analyze().items():
+            if result["status"] != "unreachable":
+                continue
+            self._set_issues("ending_condition", ending_id, [{
+                "issue_id": f"ending_condition_{ending_id}",
+                "category": "ending_unreachable",
+                "severity": "critical",
+                "description": f"结局 {ending_id} 的visible门槛无法满足: " + "；".join(result["proof"]),
+                "location": f"endings.{ending_id}",
+                "fix_suggestion": "降低结局选项或途经选项的visible门槛，或提高前面章节相关女主的effect/reward"
+            }])
 
     def check_numeric_balance(self):
         """检查数值平衡"""
-        chapters = self.route.get('chapters', [])
-        chapter_index = {ch['id']: i for i, ch in enumerate(chapters, 1)}
-
-        for ch in chapters:
-            ch_id = ch['id']
-            idx = chapter_index.get(ch_id, 0)
-
-            for choice in ch.get('choices', []):
-                # 检查visible条件
-                visible = choice.get('visible')
-                if visible and isinstance(visible, dict):
-                    for heroine_id, value in visible.items():
-                        if idx <= 3 and value > 10:
-                            self.issues.append({
-                                "issue_id": f"visible_{ch_id}_{choice.get('id')}",
-                                "category": "numeric_issue",
-                                "severity": "medium",
-                                "description": f"第{idx}章 {ch_id} 的选项 {choice.get('id')} visible条件过高({value})",
-                                "location": f"chapters.{ch_id}.choices.{choice.get('id')}.visible",
-                                "fix_suggestion": f"将visible改为null或不超过10的数值"
-                            })
-                        elif value > 70:
-                            self.issues.append({
-                                "issue_id": f"visible_{ch_id}_{choice.get('id')}",
-                                "category": "numeric_issue",
-                                "severity": "medium",
-                                "description": f"第{idx}章 {ch_id} 的选项 {choice.get('id')} visible条件过高({value})",
-                                "location": f"chapters.{ch_id}.choices.{choice.get('id')}.visible",
-                                "fix_suggestion": f"将visible改为不超过70的数值"
-                            })
-
-                # 检查effect数值
-                effect = choice.get('effect', {})
-                if effect and isinstance(effect, dict):
-                    for heroine_id, value in effect.items():
-                        if isinstance(value, int) and abs(value) > 20:
-                            self.issues.append({
-                                "issue_id": f"effect_{ch_id}_{choice.get('id')}",
-                                "category": "numeric_issue",
-                                "severity": "medium",
-                                "description": f"选项 {choice.get('id')} 的effect值({value})超出合理范围",
-                                "location": f"chapters.{ch_id}.choices.{choice.get('id')}.effect",
-                                "fix_suggestion": f"将effect调整为+10到+20之间"
-                            })
+        for ch_id in self.graph.chapter_order:
+            self._check_chapter_numeric(ch_id)
 
         # 检查分支reward
-        for branch in self.route.get('branches', []):
-            reward = branch.get('reward', {})
-            if reward and isinstance(reward, dict):
-                for heroine_id, value in reward.items():
-                    if isinstance(value, int) and (value < 20 or value > 45):
-                        self.issues.append({
-                            "issue_id": f"reward_{branch.get('id')}",
+        for branch_id in self.graph.branches:
+            self._check_branch_reward(branch_id)
+
+    def _check_chapter_numeric(self, ch_id: str):
+        """检查单个章节选项的visible/effect数值"""
+        issues = []
+        ch = self.graph.chapters.get(ch_id, {})
+        idx = self.graph.chapter_index.get(ch_id, 0)
+
+        for choice in ch.get('choices', []):
+            # 检查visible条件
+            visible = choice.get('visible')
+            if visible and isinstance(visible, dict):
+                for heroine_id, value in visible.items():
+                    if not isinstance(value, (int, float)):
+                        continue
+                    if idx <= 3 and value > 10:
+                        issues.append({
+                            "issue_id": f"visible_{ch_id}_{choice.get('id')}",
+                            "category": "numeric_issue",
+                            "severity": "medium",
+                            "description": f"第{idx}章 {ch_id} 的选项 {choice.get('id')} visible条件过高({value})",
+                            "location": f"chapters.{ch_id}.choices.{choice.get('id')}.visible",
+                            "fix_suggestion": f"将visible改为null或不超过10的数值"
+                        })
+                    elif value > 70:
+                        issues.append({
+                            "issue_id": f"visible_{ch_id}_{choice.get('id')}",
+                            "category": "numeric_issue",
+                            "severity": "medium",
+                            "description": f"第{idx}章 {ch_id} 的选项 {choice.get('id')} visible条件过高({value})",
+                            "location": f"chapters.{ch_id}.choices.{choice.get('id')}.visible",
+                            "fix_suggestion": f"将visible改为不超过70的数值"
+                        })
+
+            # 检查effect数值
+            effect = choice.get('effect', {})
+            if effect and isinstance(effect, dict):
+                for heroine_id, value in effect.items():
+                    if isinstance(value, int) and abs(value) > 20:
+                        issues.append({
+                            "issue_id": f"effect_{ch_id}_{choice.get('id')}",
                             "category": "numeric_issue",
-                            "severity": "low",
-                            "description": f"分支 {branch.get('id')} 的reward值({value})可能不合理",
-                            "location": f"branches.{branch.get('id')}.reward",
-                            "fix_suggestion": f"将reward调整为+25到+40之间"
+                            "severity": "medium",
+                            "description": f"选项 {choice.get('id')} 的effect值({value})超出合理范围",
+                            "location": f"chapters.{ch_id}.choices.{choice.get('id')}.effect",
+                            "fix_suggestion": f"将effect调整为+10到+20之间"
                         })
 
+        self._set_issues("chapter_numeric", ch_id, issues)
+
+    def _check_branch_reward(self, branch_id: str):
+        """检查单个分支的reward数值"""
+        issues = []
+        branch = self.graph.branches.get(branch_id, {})
+        reward = branch.get('reward', {})
+        if reward and isinstance(reward, dict):
+            for heroine_id, value in reward.items():
+                if isinstance(value, int) and (value < 20 or value > 45):
+                    issues.append({
+                        "issue_id": f"reward_{branch_id}",
+                        "category": "numeric_issue",
+                        "severity": "low",
+                        "description": f"分支 {branch_id} 的reward值({value})可能不合理",
+                        "location": f"branches.{branch_id}.reward",
+                        "fix_suggestion": f"将reward调整为+25到+40之间"
+                    })
+        self._set_issues("branch_reward", branch_id, issues)
+
     def check_span_issues(self):
         """检查分支跨度"""
-        chapters = self.route.get('chapters', [])
-        chapter_index = {ch['id']: i for i, ch in enumerate(chapters, 1)}
-
-        for branch in self.route.get('branches', []):
-            branch_id = branch.get('id')
-            return_ch = branch.get('return')
-
-            # 找到这个分支的入口章节
-            entry_chapter = None
-            for ch in chapters:
-                for choice in ch.get('choices', []):
-                    if choice.get('branch') == branch_id:
-                        entry_chapter = ch['id']
-                        break
-                if entry_chapter:
-                    break
-
-            if entry_chapter and return_ch:
-                entry_idx = chapter_index.get(entry_chapter, 0)
-                return_idx = chapter_index.get(return_ch, 0)
-
-                if entry_idx > 0 and return_idx > 0:
-                    span = return_idx - entry_idx
-                    if span > 3:
-                        self.issues.append({
-                            "issue_id": f"span_{branch_id}",
-                            "category": "span_issue",
-                            "severity": "high",
-                            "description": f"分支 {branch_id} 从第{entry_idx}章进入，返回第{return_idx}章，跨度{span}章超过限制",
-                            "location": f"branches.{branch_id}",
-                            "fix_suggestion": f"将return章节改为第{entry_idx + 3}章或更早的章节"
-                        })
+        for branch_id in self.graph.branches:
+            self._check_branch_span(branch_id)
+
+    def _check_branch_span(self, branch_id: str):
+        """检查单个分支从入口到回归章节的跨度"""
+        issues = []
+        branch = self.graph.branches.get(branch_id, {})
+        return_ch = branch.get('return')
+        entry_chapter = self.graph.entry_chapter(branch_id)
+
+        if entry_chapter and return_ch:
+            entry_idx = self.graph.chapter_index.get(entry_chapter, 0)
+            return_idx = self.graph.chapter_index.get(return_ch, 0)
+
+            if entry_idx > 0 and return_idx > 0:
+                span = return_idx - entry_idx
+                if span > 3:
+                    issues.append({
+                        "issue_id": f"span_{branch_id}",
+                        "category": "span_issue",
+                        "severity": "high",
+                        "description": f"分支 {branch_id} 从第{entry_idx}章进入，返回第{return_idx}章，跨度{span}章超过限制",
+                        "location": f"branches.{branch_id}",
+                        "fix_suggestion": f"将return章节改为第{entry_idx + 3}章或更早的章节"
+                    })
+        self._set_issues("span", branch_id, issues)
 
     def check_invalid_choices(self):
         """检查无效选择"""
-        for ch in self.route.get('chapters', []):
-            ch_id = ch['id']
-            for choice in ch.get('choices', []):
-                choice_id = choice.get('id', 'unknown')
-                branch = choice.get('branch')
-                effect = choice.get('effect')
-
-                if branch is None and (not effect or effect == {}):
-                    self.issues.append({
-                        "issue_id": f"invalid_{ch_id}_{choice_id}",
-                        "category": "invalid_choice",
-                        "severity": "medium",
-                        "description": f"选项 {choice_id} 的branch为null且effect为空",
-                        "location": f"chapters.{ch_id}.choices.{choice_id}",
-                        "fix_suggestion": f"给该选项添加effect或设置branch"
-                    })
-
-    def _get_referenced_branches(self) -> set:
-        """获取所有被引用的branch"""
-        referenced = set()
-        for ch in self.route.get('chapters', []):
-            for choice in ch.get('choices', []):
-                branch = choice.get('branch')
-                if branch and branch.startswith('branch_'):
-                    referenced.add(branch)
-        return referenced
-
-    def _get_referenced_endings(self) -> set:
-        """获取所有被引用的ending"""
-        referenced = set()
-        for ch in self.route.get('chapters', []):
-            for choice in ch.get('choices', []):
-                branch = choice.get('branch')
-                if branch and branch.startswith('ending_'):
-                    referenced.add(branch)
-        return referenced
+        for ch_id in self.graph.chapter_order:
+            self._check_chapter_choices(ch_id)
+
+    def _check_chapter_choices(self, ch_id: str):
+        """检查单个章节的无效选项"""
+        issues = []
+        for choice in self.graph.chapters.get(ch_id, {}).get('choices', []):
+            choice_id = choice.get('id', 'unknown')
+            branch = choice.get('branch')
+            effect = choice.get('effect')
+
+            if branch is None and (not effect or effect == {}):
+                issues.append({
+                    "issue_id": f"invalid_{ch_id}_{choice_id}",
+                    "category": "invalid_choice",
+                    "severity": "medium",
+                    "description": f"选项 {choice_id} 的branch为null且effect为空",
+                    "location": f"chapters.{ch_id}.choices.{choice_id}",
+                    "fix_suggestion": f"给该选项添加effect或设置branch"
+                })
+        self._set_issues("invalid_choice", ch_id, issues)
 
     def _generate_summary(self) -> str:
         """生成摘要"""
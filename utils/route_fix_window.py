@@ -0,0 +1,195 @@
+"""
+路线修复窗口
+按问题的location只截取相关的章节/分支/结局（外加相邻章节作为上下文）交给修复Agent，
+修复后的片段按ID合并回完整路线；互不重叠的窗口可以并发修复
+"""
+import copy
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from utils.route_graph import RouteGraph
+
+# 窗口元素键: ("chapter" | "branch" | "ending", ID)
+ElementKey = Tuple[str, str]
+
+
+class RouteFixWindowBuilder:
+    """修复窗口构建器"""
+
+    # 上下文相邻章节数
+    NEIGHBOURS = 1
+    # 未被引用的分支在回归章节前多少章内寻找入口
+    MAX_SPAN = 3
+
+    def __init__(self, route_framework: Dict[str, Any], neighbours: Optional[int] = None):
+        self.route = route_framework
+        self.graph = RouteGraph(route_framework)
+        self.neighbours = self.NEIGHBOURS if neighbours is None else neighbours
+
+    def issue_scope(self, issue: Dict[str, Any]) -> Optional[Set[ElementKey]]:
+        """
+        解析问题需要修改的元素
+
+        Returns:
+            元素集合；location无法定位时返回None
+        """
+        parts = (issue.get("location") or "").split(".")
+        if len(parts) < 2 or not parts[1]:
+            return None
+        kind, element_id = parts[0], parts[1]
+        order = self.graph.chapter_order
+
+        if kind == "chapters" and element_id in self.graph.chapters:
+            return {("chapter", element_id)}
+
+        if kind == "branches":
+            scope = {("branch", element_id)}
+            refs = self.graph.refs_to(element_id)
+            scope.update(("chapter", chapter_id) for chapter_id, _ in refs)
+            return_chapter = self.graph.branches.get(element_id, {}).get("return")
+            if return_chapter in self.graph.chapter_index:
+                scope.add(("chapter", return_chapter))
+                if not refs:
+                    # 没有入口：在回归章节之前的几章中添加选项
+                    end = self.graph.chapter_index[return_chapter] - 1
+                    scope.update(("chapter", c) for c in order[max(end - self.MAX_SPAN, 0):end])
+            elif not refs:
+                return None
+            return scope
+
+        if kind == "endings":
+            scope = {("ending", element_id)}
+            scope.update(("chapter", chapter_id) for chapter_id, _ in self.graph.refs_to(element_id))
+            if order:
+                scope.add(("chapter", order[-1]))
+            return scope
+
+        return None
+
+    def build(self, issues: List[Dict[str, Any]]) -> Optional[List[Dict[str, Any]]]:
+        """
+        把问题分组为修复窗口（修改范围有重叠的问题合并到同一窗口）
+
+        Returns:
+            窗口列表 [{issues, elements, context_chapters}]；有问题无法定位时返回None
+        """
+        scopes = []
+        for issue in issues:
+            scope = self.issue_scope(issue)
+            if scope is None:
+                return None
+            scopes.append(scope)
+
+        # 并查集合并有共同元素的问题
+        parent = list(range(len(issues)))
+
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+
+        owner: Dict[ElementKey, int] = {}
+        for i, scope in enumerate(scopes):
+            for element in scope:
+                if element in owner:
+                    parent[find(i)] = find(owner[element])
+                else:
+                    owner[element] = i
+
+        groups: Dict[int, List[int]] = {}
+        for i in range(len(issues)):
+            groups.setdefault(find(i), []).append(i)
+
+        windows = []
+        for members in groups.values():
+            elements: Set[ElementKey] = set().union(*(scopes[i] for i in members))
+            windows.append({
+                "issues": [issues[i] for i in members],
+                "elements": elements,
+                "context_chapters": self._context_chapters(elements),
+            })
+        return windows
+
+    def _context_chapters(self, elements: Set[ElementKey]) -> List[str]:
+        """窗口内章节的相邻章节（只读）"""
+        order = self.graph.chapter_order
+        editable = {element_id for kind, element_id in elements if kind == "chapter"}
+        context = set()
+        for chapter_id in editable:
+            idx = self.graph.chapter_index[chapter_id] - 1
+            context.update(order[max(idx - self.neighbours, 0):idx + self.neighbours + 1])
+        return [c for c in order if c in context - editable]
+
+    def payload(self, window: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        构建窗口数据
+
+        Returns:
+            {editable: 可修改的元素, context_chapters: 只读上下文, route_index: 全路线ID索引}
+        """
+        elements = window["elements"]
+        return {
+            "editable": {
+                "chapters": [self.graph.chapters[c] for c in self.graph.chapter_order if ("chapter", c) in elements],
+                "branches": [b for b_id, b in self.graph.branches.items() if ("branch", b_id) in elements],
+                "endings": [e for e_id, e in self.graph.endings.items() if ("ending", e_id) in elements],
+            },
+            "context_chapters": [self.graph.chapters[c] for c in window["context_chapters"]],
+            "route_index": {
+                "state": self.route.get("state", {}),
+                "chapters": self.graph.chapter_order,
+                "branches": {b_id: b.get("return") for b_id, b in self.graph.branches.items()},
+                "endings": list(self.graph.endings),
+            },
+        }
+
+
+def merge_fix_fragments(
+    route_framework: Dict[str, Any],
+    fragments: List[Tuple[Dict[str, Any], Dict[str, Any]]]
+) -> Tuple[Dict[str, Any], List[str]]:
+    """
+    把修复片段按ID合并回完整路线
+
+    章节只合并choices（剧情字段不允许修改），分支/结局按字段覆盖；
+    片段中不属于该窗口的章节会被忽略，新增的分支/结局追加到末尾
+
+    Args:
+        route_framework: 原主线框架
+        fragments: [(窗口, 修复片段)]
+
+    Returns:
+        (合并后的主线框架副本, 被合并的元素列表)
+    """
+    route = copy.deepcopy(route_framework)
+    chapters = {ch.get("id"): ch for ch in route.get("chapters", [])}
+    collections = {
+        "branch": route.setdefault("branches", []),
+        "ending": route.setdefault("endings", []),
+    }
+    merged = []
+
+    for window, fragment in fragments:
+        elements = window["elements"]
+        for chapter in fragment.get("chapters", []):
+            chapter_id = chapter.get("id")
+            if ("chapter", chapter_id) in elements and chapter_id in chapters and "choices" in chapter:
+                chapters[chapter_id]["choices"] = chapter["choices"]
+                merged.append(f"chapters.{chapter_id}")
+
+        for kind, key in (("branch", "branches"), ("ending", "endings")):
+            existing = {item.get("id"): item for item in collections[kind]}
+            for item in fragment.get(key, []):
+                item_id = item.get("id")
+                if not item_id:
+                    continue
+                if item_id in existing:
+                    if (kind, item_id) not in elements:
+                        continue
+                    existing[item_id].update(item)
+                else:
+                    collections[kind].append(item)
+                    existing[item_id] = item
+                merged.append(f"{key}.{item_id}")
+
+    return route, merged
@@ -0,0 +1,205 @@
+"""
+路线图索引
+一次遍历主线框架，建立章节索引、选项→目标边、分支入口/回归映射和反向引用，
+供路线一致性检查使用；修复只改动少数章节时可以增量更新
+"""
+import hashlib
+import json
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+
+def _content_hash(data: Any) -> str:
+    """计算章节/分支内容哈希（不依赖json_utils，检查脚本可独立运行）"""
+    serialized = json.dumps(data, ensure_ascii=False, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(serialized.encode("utf-8")).hexdigest()[:16]
+
+
+class RouteGraph:
+    """
+    主线框架的索引图
+
+    索引:
+    - chapter_index: 章节ID → 序号（从1开始）
+    - choice_edges: 章节ID → [(选项ID, 目标branch/ending)]
+    - target_refs: 目标ID → [(章节ID, 选项ID)]（按章节顺序）
+    - branch_entry: 分支/结局ID → 第一个引用它的章节ID
+    - return_refs: 章节ID → 回归到该章节的分支ID列表
+    """
+
+    def __init__(self, route_framework: Dict[str, Any]):
+        self.route = route_framework
+        self.chapter_order: List[str] = []
+        self.chapter_index: Dict[str, int] = {}
+        self.chapters: Dict[str, Dict[str, Any]] = {}
+        self.branches: Dict[str, Dict[str, Any]] = {}
+        self.endings: Dict[str, Dict[str, Any]] = {}
+        self.choice_edges: Dict[str, List[Tuple[str, str]]] = {}
+        self.target_refs: Dict[str, List[Tuple[str, str]]] = {}
+        self.branch_entry: Dict[str, str] = {}
+        self.return_refs: Dict[str, List[str]] = {}
+        self._hashes: Dict[Tuple[str, str], str] = {}
+        self.build()
+
+    # ========== 构建 ==========
+
+    def build(self):
+        """一次遍历建立全部索引"""
+        self.chapter_order = []
+        self.chapter_index = {}
+        self.chapters = {}
+        self.choice_edges = {}
+        self.target_refs = {}
+        self._hashes = {}
+
+        for idx, chapter in enumerate(self.route.get("chapters", []), 1):
+            chapter_id = chapter.get("id")
+            if not chapter_id:
+                continue
+            self.chapter_order.append(chapter_id)
+            self.chapter_index[chapter_id] = idx
+            self.chapters[chapter_id] = chapter
+            self._hashes[("chapter", chapter_id)] = _content_hash(chapter)
+            self._index_choices(chapter_id)
+
+        self.branches = {}
+        self.endings = {}
+        self.return_refs = {}
+        for branch in self.route.get("branches", []):
+            self._add_branch(branch)
+        for ending in self.route.get("endings", []):
+            if ending.get("id"):
+                self.endings[ending["id"]] = ending
+                self._hashes[("ending", ending["id"])] = _content_hash(ending)
+
+        self.branch_entry = {target: refs[0][0] for target, refs in self.target_refs.items() if refs}
+
+    def _index_choices(self, chapter_id: str):
+        """索引章节的选项边和反向引用"""
+        edges = []
+        for choice in self.chapters[chapter_id].get("choices", []):
+            target = choice.get("branch")
+            if target:
+                edge = (choice.get("id", "unknown"), target)
+                edges.append(edge)
+                self.target_refs.setdefault(target, []).append((chapter_id, edge[0]))
+        self.choice_edges[chapter_id] = edges
+
+    def _add_branch(self, branch: Dict[str, Any]):
+        """索引分支及其回归章节"""
+        branch_id = branch.get("id")
+        if not branch_id:
+            return
+        self.branches[branch_id] = branch
+        self._hashes[("branch", branch_id)] = _content_hash(branch)
+        return_chapter = branch.get("return")
+        if return_chapter:
+            self.return_refs.setdefault(return_chapter, []).append(branch_id)
+
+    # ========== 增量更新 ==========
+
+    def update(self, route_framework: Dict[str, Any]) -> Optional[Dict[str, Set[str]]]:
+        """
+        用修复后的路线更新索引
+
+        章节顺序不变时只重建变化章节的选项边，分支/结局按内容哈希比较
+
+        Args:
+            route_framework: 修复后的主线框架
+
+        Returns:
+            {"chapters": 变化的章节, "branches": 受影响的分支, "endings": 受影响的结局}；
+            章节增删或顺序变化时完整重建并返回None
+        """
+        new_order = [ch.get("id") for ch in route_framework.get("chapters", []) if ch.get("id")]
+        if new_order != self.chapter_order or len(set(new_order)) != len(new_order):
+            self.route = route_framework
+            self.build()
+            return None
+
+        self.route = route_framework
+        changed_chapters: Set[str] = set()
+        affected_targets: Set[str] = set()
+
+        for chapter in route_framework.get("chapters", []):
+            chapter_id = chapter.get("id")
+            if not chapter_id:
+                continue
+            chapter_hash = _content_hash(chapter)
+            self.chapters[chapter_id] = chapter
+            if self._hashes.get(("chapter", chapter_id)) == chapter_hash:
+                continue
+            self._hashes[("chapter", chapter_id)] = chapter_hash
+            changed_chapters.add(chapter_id)
+
+            # 移除旧边的反向引用，再索引新边
+            for choice_id, target in self.choice_edges.get(chapter_id, []):
+                affected_targets.add(target)
+                refs = self.target_refs.get(target, [])
+                if (chapter_id, choice_id) in refs:
+                    refs.remove((chapter_id, choice_id))
+            self._index_choices(chapter_id)
+            affected_targets.update(target for _, target in self.choice_edges[chapter_id])
+
+        # 反向引用保持章节顺序，入口取第一个引用
+        for target in affected_targets:
+            refs = self.target_refs.get(target, [])
+            refs.sort(key=lambda ref: self.chapter_index.get(ref[0], 0))
+            if refs:
+                self.branch_entry[target] = refs[0][0]
+            else:
+                self.branch_entry.pop(target, None)
+                self.target_refs.pop(target, None)
+
+        changed_branches = self._update_routes("branch", route_framework.get("branches", []))
+        changed_endings = self._update_routes("ending", route_framework.get("endings", []))
+
+        return {
+            "chapters": changed_chapters,
+            "branches": changed_branches | {
+                t for t in affected_targets if t in self.branches or t.startswith("branch_")
+            },
+            "endings": changed_endings | {
+                t for t in affected_targets if t in self.endings or t.startswith("ending_")
+            },
+        }
+
+    def _update_routes(self, kind: str, routes: List[Dict[str, Any]]) -> Set[str]:
+        """按内容哈希更新分支/结局，返回变化（含新增和删除）的ID"""
+        current = self.branches if kind == "branch" else self.endings
+        new_ids = {route.get("id") for route in routes if route.get("id")}
+        changed = set(current) - new_ids
+
+        for route_id in changed:
+            current.pop(route_id, None)
+            self._hashes.pop((kind, route_id), None)
+
+        for route in routes:
+            route_id = route.get("id")
+            if not route_id:
+                continue
+            route_hash = _content_hash(route)
+            if self._hashes.get((kind, route_id)) != route_hash:
+                changed.add(route_id)
+                self._hashes[(kind, route_id)] = route_hash
+            current[route_id] = route
+
+        if kind == "branch" and changed:
+            self.return_refs = {}
+            for branch_id, branch in self.branches.items():
+                if branch.get("return"):
+                    self.return_refs.setdefault(branch["return"], []).append(branch_id)
+        return changed
+
+    # ========== 查询 ==========
+
+    def refs_to(self, target: str) -> List[Tuple[str, str]]:
+        """获取引用目标的全部选项 [(章节ID, 选项ID)]"""
+        return list(self.target_refs.get(target, []))
+
+    def entry_chapter(self, target: str) -> Optional[str]:
+        """获取分支/结局的入口章节（第一个引用它的章节）"""
+        return self.branch_entry.get(target)
+
+    def referenced_targets(self, prefix: str) -> Set[str]:
+        """获取被引用的目标（按前缀过滤，如 branch_ / ending_）"""
+        return {target for target in self.target_refs if target.startswith(prefix)}
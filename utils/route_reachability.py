@@ -0,0 +1,338 @@
+"""
+结局可达性分析 - 直接分析不使用LLM
+在章节/分支图上传播好感度，判断每个结局的visible门槛是否真的能被满足
+
+两层分析:
+- 区间传播: 每章每位女主的好感度可达区间[下界, 上界]（上近似），门槛高于上界即为不可达证明
+- 精确搜索: 每章保留好感度的Pareto前沿（好感度越高越好，花费越少越好），
+  找出到达每个结局花费最少的选项路径；前沿未截断时搜索穷尽，找不到路径同样是不可达证明
+
+好感度只出现在visible下界条件中，effect/reward叠加后截断到[min, max]保持单调，
+因此被支配的状态（花费不更少、每位女主好感度都不更高）可以安全丢弃
+"""
+import json
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class RouteReachabilityAnalyzer:
+    """结局可达性分析器"""
+
+    # 每章保留的最大状态数（超过后截断，结果不再保证穷尽）
+    MAX_FRONTIER = 200
+
+    def __init__(self, route_framework: Dict[str, Any], max_frontier: Optional[int] = None):
+        self.route = route_framework
+        self.max_frontier = max_frontier or self.MAX_FRONTIER
+        self._compile()
+
+    def _compile(self):
+        """整理章节、分支、结局和女主好感度范围"""
+        state = self.route.get("state", {}) or {}
+        self.heroines: List[str] = list(state)
+        for chapter in self.route.get("chapters", []):
+            for choice in chapter.get("choices", []):
+                for field in ("visible", "effect"):
+                    for heroine in (choice.get(field) or {}):
+                        if heroine not in self.heroines:
+                            self.heroines.append(heroine)
+        self.heroine_index = {h: i for i, h in enumerate(self.heroines)}
+
+        def state_value(heroine: str, key: str, default: float) -> float:
+            values = state.get(heroine)
+            value = values.get(key, default) if isinstance(values, dict) else default
+            return value if isinstance(value, (int, float)) else default
+
+        self.initial = tuple(state_value(h, "initial", 0) for h in self.heroines)
+        self.low = tuple(state_value(h, "min", 0) for h in self.heroines)
+        self.high = tuple(state_value(h, "max", 100) for h in self.heroines)
+
+        self.chapters = [ch for ch in self.route.get("chapters", []) if ch.get("id")]
+        self.chapter_ids = [ch["id"] for ch in self.chapters]
+        self.chapter_index = {cid: i for i, cid in enumerate(self.chapter_ids)}
+        self.branches = {b["id"]: b for b in self.route.get("branches", []) if b.get("id")}
+        self.ending_ids = [e["id"] for e in self.route.get("endings", []) if e.get("id")]
+
+    # ========== 选项转移 ==========
+
+    def _vector(self, values: Optional[Dict[str, Any]]) -> Dict[int, float]:
+        """把 {女主: 数值} 转为 {序号: 数值}（忽略非数值）"""
+        return {
+            self.heroine_index[h]: v for h, v in (values or {}).items()
+            if h in self.heroine_index and isinstance(v, (int, float)) and not isinstance(v, bool)
+        }
+
+    def _transition(self, c: int, choice: Dict[str, Any]) -> Tuple[str, Any, Dict[int, float], int]:
+        """
+        解析选项的转移
+
+        Returns:
+            (类型, 目标, 好感度变化, 花费)；类型为 ending / branch / next，
+            目标为结局ID或下一章节序号（等于章节数表示走完共通线）
+        """
+        delta = dict(self._vector(choice.get("effect")))
+        target = choice.get("branch")
+        if target in self.ending_ids:
+            return "ending", target, delta, 1
+
+        if target in self.branches:
+            branch = self.branches[target]
+            for i, v in self._vector(branch.get("reward")).items():
+                delta[i] = delta.get(i, 0) + v
+            return_idx = self.chapter_index.get(branch.get("return"))
+            # 回归章节不在当前章节之后时按顺序继续，避免循环
+            next_idx = return_idx if return_idx is not None and return_idx > c else c + 1
+            length = branch.get("chapters")
+            return "branch", next_idx, delta, 1 + (length if isinstance(length, int) and length > 0 else 1)
+
+        return "next", c + 1, delta, 1
+
+    def _apply(self, values: Tuple[float, ...], delta: Dict[int, float]) -> Tuple[float, ...]:
+        """叠加好感度变化并截断到[min, max]"""
+        if not delta:
+            return values
+        return tuple(
+            min(max(v + delta.get(i, 0), self.low[i]), self.high[i]) for i, v in enumerate(values)
+        )
+
+    # ========== 区间传播 ==========
+
+    def propagate_intervals(self) -> List[Optional[Tuple[Tuple[float, ...], Tuple[float, ...]]]]:
+        """
+        传播每章入口的好感度可达区间
+
+        Returns:
+            每章的 (下界, 上界)；章节不可达时为None
+        """
+        C = len(self.chapter_ids)
+        intervals: List[Optional[Tuple[Tuple[float, ...], Tuple[float, ...]]]] = [None] * (C + 1)
+        if C:
+            intervals[0] = (self.initial, self.initial)
+
+        def join(idx: int, lo: Tuple[float, ...], hi: Tuple[float, ...]):
+            current = intervals[idx]
+            if current is None:
+                intervals[idx] = (lo, hi)
+            else:
+                intervals[idx] = (
+                    tuple(map(min, current[0], lo)),
+                    tuple(map(max, current[1], hi)),
+                )
+
+        for c, chapter in enumerate(self.chapters):
+            if intervals[c] is None:
+                continue
+            lo, hi = intervals[c]
+            # 没有选项的章节（只有summary）直接进入下一章
+            if not chapter.get("choices"):
+                join(c + 1, lo, hi)
+                continue
+            for choice in chapter.get("choices", []):
+                threshold = self._vector(choice.get("visible"))
+                if any(hi[i] < t for i, t in threshold.items()):
+                    continue
+                # 选项可见时，受门槛约束的女主下界至少为门槛
+                choice_lo = tuple(max(v, threshold.get(i, v)) for i, v in enumerate(lo))
+                kind, target, delta, _ = self._transition(c, choice)
+                if kind != "ending":
+                    join(target, self._apply(choice_lo, delta), self._apply(hi, delta))
+
+        self.intervals = intervals
+        return intervals
+
+    # ========== 精确搜索 ==========
+
+    def _prune(self, states: List[tuple]) -> Tuple[List[tuple], bool]:
+        """
+        去掉被支配的状态；超过上限时按每位女主的好感度各取最高的一批，
+        保证单个女主的门槛路线不被截断丢掉
+
+        Returns:
+            (状态列表, 是否截断)
+        """
+        kept = self._non_dominated(states)
+        if kept is not None:
+            return kept, False
+
+        per_heroine = max(self.max_frontier // (len(self.heroines) + 1), 1)
+        rankings = [lambda s: (s[1], -sum(s[0]))] + [
+            (lambda i: lambda s: (-s[0][i], s[1]))(i) for i in range(len(self.heroines))
+        ]
+        selected = {}
+        for ranking in rankings:
+            for state in sorted(states, key=ranking)[:per_heroine]:
+                selected[id(state)] = state
+        return self._non_dominated(list(selected.values()), limit=None), True
+
+    def _non_dominated(self, states: List[tuple], limit: Optional[int] = -1) -> Optional[List[tuple]]:
+        """筛选不被支配的状态；超过limit（默认max_frontier）时返回None"""
+        limit = self.max_frontier if limit == -1 else limit
+        states.sort(key=lambda s: (s[1], s[2], -sum(s[0])))
+        kept: List[tuple] = []
+        for state in states:
+            values, cost = state[0], state[1]
+            if any(k[1] <= cost and all(a >= b for a, b in zip(k[0], values)) for k in kept):
+                continue
+            kept.append(state)
+            if limit is not None and len(kept) > limit:
+                return None
+        return kept
+
+    def search(self) -> Tuple[Dict[str, tuple], bool]:
+        """
+        逐章传播Pareto前沿，记录到达每个结局花费最少的状态
+
+        状态为 (好感度, 花费, 门槛选项数, (章节ID, 选项ID), 上一状态)
+
+        Returns:
+            ({结局ID: 最优状态}, 搜索是否穷尽)
+        """
+        C = len(self.chapter_ids)
+        frontier: List[List[tuple]] = [[] for _ in range(C + 1)]
+        if C:
+            frontier[0] = [(self.initial, 0, 0, None, None)]
+        best: Dict[str, tuple] = {}
+        exhaustive = True
+
+        for c, chapter in enumerate(self.chapters):
+            if not frontier[c]:
+                continue
+            states, truncated = self._prune(frontier[c])
+            exhaustive = exhaustive and not truncated
+            frontier[c] = []  # 已处理的章节不再需要
+            # 没有选项的章节（只有summary）直接进入下一章
+            if not chapter.get("choices"):
+                frontier[c + 1].extend(states)
+                continue
+            for state in states:
+                values, cost, gated = state[0], state[1], state[2]
+                for choice in chapter.get("choices", []):
+                    threshold = self._vector(choice.get("visible"))
+                    if any(values[i] < t for i, t in threshold.items()):
+                        continue
+                    kind, target, delta, step_cost = self._transition(c, choice)
+                    new_state = (
+                        self._apply(values, delta), cost + step_cost, gated + (1 if threshold else 0),
+                        (chapter["id"], choice.get("id")), state
+                    )
+                    if kind == "ending":
+                        current = best.get(target)
+                        if current is None or new_state[1:3] < current[1:3]:
+                            best[target] = new_state
+                    elif target < C:
+                        frontier[target].append(new_state)
+
+        return best, exhaustive
+
+    @staticmethod
+    def _path(state: tuple) -> List[Dict[str, Any]]:
+        """回溯状态得到选项路径"""
+        path = []
+        while state is not None and state[3] is not None:
+            path.append({"chapter": state[3][0], "choice": state[3][1]})
+            state = state[4]
+        return list(reversed(path))
+
+    # ========== 不可达证明 ==========
+
+    def _prove_unreachable(self, ending_id: str) -> List[str]:
+        """
+        用区间上界证明结局不可达
+
+        Returns:
+            每个引用该结局的选项不可达的原因；有选项在区间上可行时返回空列表
+        """
+        reasons = []
+        for c, chapter in enumerate(self.chapters):
+            for choice in chapter.get("choices", []):
+                if choice.get("branch") != ending_id:
+                    continue
+                label = f"{chapter['id']}.{choice.get('id')}"
+                interval = self.intervals[c]
+                if interval is None:
+                    reasons.append(f"{label}: 章节 {chapter['id']} 本身不可达")
+                    continue
+                blocked = [
+                    f"{self.heroines[i]}需要{t}但最高只能到{interval[1][i]:g}"
+                    for i, t in self._vector(choice.get("visible")).items() if interval[1][i] < t
+                ]
+                if not blocked:
+                    return []
+                reasons.append(f"{label}: " + "，".join(blocked))
+        return reasons
+
+    # ========== 汇总 ==========
+
+    def analyze(self) -> Dict[str, Dict[str, Any]]:
+        """
+        分析所有结局
+
+        Returns:
+            {结局ID: {status, exhaustive, cost, path, affection, proof}}，
+            status 为 reachable / unreachable / unknown / unreferenced
+        """
+        self.propagate_intervals()
+        best, exhaustive = self.search()
+
+        results = {}
+        for ending_id in self.ending_ids:
+            referenced = any(
+                choice.get("branch") == ending_id
+                for chapter in self.chapters for choice in chapter.get("choices", [])
+            )
+            result: Dict[str, Any] = {"exhaustive": exhaustive}
+            if ending_id in best:
+                state = best[ending_id]
+                result.update({
+                    "status": "reachable",
+                    "cost": state[1],
+                    "gated_choices": state[2],
+                    "path": self._path(state),
+                    "affection": dict(zip(self.heroines, state[0])),
+                })
+            elif not referenced:
+                result.update({"status": "unreferenced", "proof": ["没有选项引用该结局"]})
+            else:
+                proof = self._prove_unreachable(ending_id)
+                if not proof and exhaustive:
+                    proof = ["穷尽搜索所有选项组合，没有路径能同时满足途经选项和结局选项的visible门槛"]
+                result.update({"status": "unreachable" if proof else "unknown", "proof": proof})
+            results[ending_id] = result
+        return results
+
+
+def analyze_ending_reachability(route_framework: Dict[str, Any]) -> Dict[str, Dict[str, Any]]:
+    """
+    分析每个结局能否在好感度门槛下到达
+
+    Args:
+        route_framework: 主线框架数据
+
+    Returns:
+        {结局ID: 分析结果}
+    """
+    return RouteReachabilityAnalyzer(route_framework).analyze()
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python route_reachability.py <main_route_framework.json>")
+        sys.exit(1)
+
+    with open(sys.argv[1], 'r', encoding='utf-8') as f:
+        route_data = json.load(f)
+
+    print("=" * 60)
+    print("结局可达性分析")
+    print("=" * 60)
+
+    for ending_id, result in analyze_ending_reachability(route_data).items():
+        print(f"\n{ending_id}: {result['status']}")
+        if result["status"] == "reachable":
+            steps = " → ".join(f"{p['chapter']}.{p['choice']}" for p in result["path"])
+            print(f"   最短路径(花费{result['cost']}): {steps}")
+            print(f"   到达时好感度: {result['affection']}")
+        else:
+            for reason in result.get("proof", []):
+                print(f"   {reason}")
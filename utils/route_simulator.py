@@ -0,0 +1,430 @@
+"""
+路线模拟脚本 - 蒙特卡洛模拟玩家游玩路线
+把主线框架编译为NumPy数组，批量模拟大量随机/策略游玩，统计结局分布、
+死路率、不可达选项和各章节好感度分布，可作为Pipeline的检查关卡
+
+模拟规则（与主线框架提示词一致）:
+- 好感度从state[heroine].initial开始，限制在[min, max]内
+- 选项visible为null时始终可见，否则所有女主好感度都达到门槛才可见
+- 选择后叠加effect；branch指向分支时获得reward并跳到return章节，指向结局时游戏结束
+- 章节有选项但都不可见，或走完共通线仍未进入结局，记为死路
+"""
+import json
+from typing import Any, Dict, List, Optional
+
+from utils.route_reachability import analyze_ending_reachability
+
+try:
+    import numpy as np
+except ImportError:  # numpy为可选依赖，只有路线模拟需要
+    np = None
+
+
+class RouteSimulator:
+    """路线蒙特卡洛模拟器"""
+
+    # 好感度直方图分桶
+    HISTOGRAM_BINS = 10
+    # 策略模式下随机探索的概率
+    DEFAULT_EPSILON = 0.1
+
+    def __init__(self, route_framework: Dict[str, Any]):
+        if np is None:
+            raise ImportError("路线模拟需要numpy，请先安装: pip install numpy")
+        self.route = route_framework
+        self._compile()
+
+    # ========== 编译 ==========
+
+    def _compile(self):
+        """把主线框架编译为数组"""
+        state = self.route.get("state", {}) or {}
+        self.heroines: List[str] = list(state)
+        # 选项中出现但state未定义的女主，按默认范围补充
+        for chapter in self.route.get("chapters", []):
+            for choice in chapter.get("choices", []):
+                for field in ("visible", "effect"):
+                    for heroine in (choice.get(field) or {}):
+                        if heroine not in self.heroines:
+                            self.heroines.append(heroine)
+        heroine_index = {h: i for i, h in enumerate(self.heroines)}
+        H = len(self.heroines)
+
+        def state_value(heroine: str, key: str, default: float) -> float:
+            value = (state.get(heroine) or {}).get(key, default) if isinstance(state.get(heroine), dict) else default
+            return float(value) if isinstance(value, (int, float)) else default
+
+        self.initial = np.array([state_value(h, "initial", 0) for h in self.heroines], dtype=np.float32)
+        self.low = np.array([state_value(h, "min", 0) for h in self.heroines], dtype=np.float32)
+        self.high = np.array([state_value(h, "max", 100) for h in self.heroines], dtype=np.float32)
+
+        chapters = [ch for ch in self.route.get("chapters", []) if ch.get("id")]
+        self.chapter_ids = [ch["id"] for ch in chapters]
+        chapter_index = {cid: i for i, cid in enumerate(self.chapter_ids)}
+
+        self.ending_ids = [e["id"] for e in self.route.get("endings", []) if e.get("id")]
+        ending_index = {eid: i for i, eid in enumerate(self.ending_ids)}
+        branches = {b["id"]: b for b in self.route.get("branches", []) if b.get("id")}
+
+        # 每章的选项数组: 门槛(K,H) / 效果(K,H) / 跳转类型 / 跳转目标 / 分支奖励(K,H)
+        self.chapter_choices = []
+        for c, chapter in enumerate(chapters):
+            choices = chapter.get("choices", []) or []
+            K = len(choices)
+            threshold = np.full((K, H), -np.inf, dtype=np.float32)
+            effect = np.zeros((K, H), dtype=np.float32)
+            reward = np.zeros((K, H), dtype=np.float32)
+            jump = np.full(K, c + 1, dtype=np.int32)  # 下一个章节序号
+            ending = np.full(K, -1, dtype=np.int32)
+
+            for k, choice in enumerate(choices):
+                for heroine, value in (choice.get("visible") or {}).items():
+                    if isinstance(value, (int, float)):
+                        threshold[k, heroine_index[heroine]] = value
+                for heroine, value in (choice.get("effect") or {}).items():
+                    if isinstance(value, (int, float)):
+                        effect[k, heroine_index[heroine]] = value
+
+                target = choice.get("branch")
+                if target in ending_index:
+                    ending[k] = ending_index[target]
+                elif target in branches:
+                    branch = branches[target]
+                    for heroine, value in (branch.get("reward") or {}).items():
+                        if isinstance(value, (int, float)) and heroine in heroine_index:
+                            reward[k, heroine_index[heroine]] = value
+                    return_idx = chapter_index.get(branch.get("return"))
+                    # 回归章节不在当前章节之后时按顺序继续，避免循环
+                    if return_idx is not None and return_idx > c:
+                        jump[k] = return_idx
+
+            self.chapter_choices.append({
+                "ids": [choice.get("id", f"{chapter['id']}_{k}") for k, choice in enumerate(choices)],
+                "targets": [choice.get("target") for choice in choices],
+                "threshold": threshold,
+                "effect": effect,
+                "reward": reward,
+                "jump": jump,
+                "ending": ending,
+            })
+
+    # ========== 模拟 ==========
+
+    def run(
+        self,
+        n: int = 100000,
+        policy: str = "random",
+        seed: Optional[int] = None,
+        batch_size: int = 200000,
+        epsilon: float = DEFAULT_EPSILON
+    ) -> Dict[str, Any]:
+        """
+        批量模拟游玩
+
+        Args:
+            n: 模拟次数
+            policy: "random" 随机选择可见选项；女主ID 则优先选择对该女主好感度最有利的选项
+            seed: 随机种子
+            batch_size: 每批模拟次数（控制内存）
+            epsilon: 策略模式下随机探索的概率
+
+        Returns:
+            模拟报告
+        """
+        rng = np.random.default_rng(seed)
+        if policy != "random" and policy not in self.heroines:
+            raise ValueError(f"未知的模拟策略: {policy}（可用: random, {', '.join(self.heroines)}）")
+
+        C, H, E = len(self.chapter_ids), len(self.heroines), len(self.ending_ids)
+        stats = {
+            "endings": np.zeros(E, dtype=np.int64),
+            "dead_ends": np.zeros(C + 1, dtype=np.int64),  # 最后一位表示走完共通线仍未进入结局
+            "visits": np.zeros(C, dtype=np.int64),
+            "visible": [np.zeros(len(cc["ids"]), dtype=np.int64) for cc in self.chapter_choices],
+            "picked": [np.zeros(len(cc["ids"]), dtype=np.int64) for cc in self.chapter_choices],
+            "histograms": np.zeros((C, H, self.HISTOGRAM_BINS), dtype=np.int64),
+            "affection_sum": np.zeros((C, H), dtype=np.float64),
+            "final_affection": [],
+        }
+
+        remaining = n
+        while remaining > 0:
+            size = min(batch_size, remaining)
+            self._run_batch(size, policy, epsilon, rng, stats)
+            remaining -= size
+
+        return self._build_report(n, policy, stats)
+
+    def _run_batch(self, size: int, policy: str, epsilon: float, rng, stats: Dict[str, Any]):
+        """模拟一批游玩（章节只会向后跳转，按章节顺序一遍处理完）"""
+        C = len(self.chapter_ids)
+        affection = np.tile(self.initial, (size, 1))
+        position = np.zeros(size, dtype=np.int32)
+        ending = np.full(size, -1, dtype=np.int32)
+        active = np.ones(size, dtype=bool)
+        bin_width = np.maximum(self.high - self.low, 1) / self.HISTOGRAM_BINS
+        policy_idx = self.heroines.index(policy) if policy != "random" else None
+
+        for c in range(C):
+            rows = np.nonzero(active & (position == c))[0]
+            if rows.size == 0:
+                continue
+            aff = affection[rows]
+
+            # 章节入口的好感度统计
+            stats["visits"][c] += rows.size
+            stats["affection_sum"][c] += aff.sum(axis=0)
+            bins = np.clip(((aff - self.low) / bin_width).astype(np.int64), 0, self.HISTOGRAM_BINS - 1)
+            for h in range(aff.shape[1]):
+                stats["histograms"][c, h] += np.bincount(bins[:, h], minlength=self.HISTOGRAM_BINS)
+
+            cc = self.chapter_choices[c]
+            K = len(cc["ids"])
+            if K == 0:
+                position[rows] = c + 1
+                continue
+
+            visible = np.all(aff[:, None, :] >= cc["threshold"][None, :, :], axis=2)  # (n, K)
+            stats["visible"][c] += visible.sum(axis=0)
+            has_choice = visible.any(axis=1)
+
+            # 没有可见选项：死路
+            stuck = rows[~has_choice]
+            if stuck.size:
+                active[stuck] = False
+                stats["dead_ends"][c] += stuck.size
+            rows, aff, visible = rows[has_choice], aff[has_choice], visible[has_choice]
+            if rows.size == 0:
+                continue
+
+            # 选择选项：随机分数只在可见选项上取最大值
+            score = rng.random(visible.shape)
+            if policy_idx is not None:
+                gain = cc["effect"][:, policy_idx] + cc["reward"][:, policy_idx]
+                gain = gain + np.where(np.array([t == policy for t in cc["targets"]]), 0.5, 0)
+                greedy = rng.random(rows.size) >= epsilon
+                score[greedy] = gain[None, :] * 1000 + score[greedy]
+            score[~visible] = -np.inf
+            picked = score.argmax(axis=1)
+            stats["picked"][c] += np.bincount(picked, minlength=K)
+
+            aff = np.clip(aff + cc["effect"][picked] + cc["reward"][picked], self.low, self.high)
+            affection[rows] = aff
+
+            ended = cc["ending"][picked] >= 0
+            ending[rows[ended]] = cc["ending"][picked][ended]
+            active[rows[ended]] = False
+            position[rows[~ended]] = cc["jump"][picked][~ended]
+
+        # 走完共通线仍未进入结局
+        unfinished = np.nonzero(active)[0]
+        stats["dead_ends"][C] += unfinished.size
+
+        finished = ending >= 0
+        stats["endings"] += np.bincount(ending[finished], minlength=len(self.ending_ids))
+        stats["final_affection"].append(affection.mean(axis=0))
+
+    # ========== 报告 ==========
+
+    def _build_report(self, n: int, policy: str, stats: Dict[str, Any]) -> Dict[str, Any]:
+        """汇总模拟结果"""
+        C = len(self.chapter_ids)
+        ending_rates = {
+            eid: round(float(count) / n, 6) for eid, count in zip(self.ending_ids, stats["endings"])
+        }
+        dead_end_chapters = {
+            (self.chapter_ids[c] if c < C else "after_last_chapter"): int(count)
+            for c, count in enumerate(stats["dead_ends"]) if count
+        }
+        dead_end_total = int(stats["dead_ends"].sum())
+
+        unreachable_choices = []
+        never_picked_choices = []
+        for c, cc in enumerate(self.chapter_choices):
+            if stats["visits"][c] == 0:
+                continue
+            for k, choice_id in enumerate(cc["ids"]):
+                if stats["visible"][c][k] == 0:
+                    unreachable_choices.append({"chapter": self.chapter_ids[c], "choice": choice_id})
+                elif stats["picked"][c][k] == 0:
+                    never_picked_choices.append({"chapter": self.chapter_ids[c], "choice": choice_id})
+
+        chapter_affection = {}
+        for c, chapter_id in enumerate(self.chapter_ids):
+            visits = int(stats["visits"][c])
+            if visits == 0:
+                continue
+            chapter_affection[chapter_id] = {
+                "visit_rate": round(visits / n, 6),
+                "mean": {
+                    h: round(float(stats["affection_sum"][c, i]) / visits, 2) for i, h in enumerate(self.heroines)
+                },
+                "histogram": {
+                    h: stats["histograms"][c, i].tolist() for i, h in enumerate(self.heroines)
+                },
+            }
+
+        return {
+            "policy": policy,
+            "playthroughs": n,
+            "ending_rates": ending_rates,
+            "unreached_endings": [eid for eid, rate in ending_rates.items() if rate == 0],
+            "dead_end_rate": round(dead_end_total / n, 6),
+            "dead_end_chapters": dead_end_chapters,
+            "unvisited_chapters": [cid for c, cid in enumerate(self.chapter_ids) if stats["visits"][c] == 0],
+            "unreachable_choices": unreachable_choices,
+            "never_picked_choices": never_picked_choices,
+            "histogram_bins": self.HISTOGRAM_BINS,
+            "chapter_affection": chapter_affection,
+            "final_affection_mean": {
+                h: round(float(v), 2) for h, v in zip(self.heroines, np.mean(stats["final_affection"], axis=0))
+            },
+        }
+
+
+def simulate_route(
+    route_framework: Dict[str, Any],
+    n: int = 100000,
+    policies: Optional[List[str]] = None,
+    seed: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    模拟路线（随机策略 + 每位女主的偏好策略）
+
+    Args:
+        route_framework: 主线框架数据
+        n: 每种策略的模拟次数
+        policies: 策略列表（默认 random + 所有女主）
+        seed: 随机种子
+
+    Returns:
+        {策略: 模拟报告}
+    """
+    simulator = RouteSimulator(route_framework)
+    policies = policies or ["random"] + simulator.heroines
+    return {policy: simulator.run(n=n, policy=policy, seed=seed) for policy in policies}
+
+
+def check_route_simulation(
+    simulation: Dict[str, Dict[str, Any]],
+    max_dead_end_rate: float = 0.05,
+    route_framework: Optional[Dict[str, Any]] = None
+) -> List[Dict[str, Any]]:
+    """
+    把模拟结果转换为检查问题（格式与RouteConsistencyChecker一致），用作Pipeline检查关卡
+
+    模拟中没有到达的结局不一定不可达（可能只是概率很低），提供route_framework时
+    用可达性分析确认，只有被证明不可达的结局才报critical
+
+    Args:
+        simulation: simulate_route的结果
+        max_dead_end_rate: 随机策略允许的最大死路率
+        route_framework: 主线框架数据（用于可达性分析，未提供时未到达的结局只报medium）
+
+    Returns:
+        问题列表
+    """
+    issues = []
+
+    # 任何策略都没有到达的结局
+    endings = set()
+    for report in simulation.values():
+        endings.update(report["ending_rates"])
+    unreached = [
+        ending_id for ending_id in sorted(endings)
+        if all(report["ending_rates"].get(ending_id, 0) == 0 for report in simulation.values())
+    ]
+    reachability = analyze_ending_reachability(route_framework) if unreached and route_framework else {}
+    playthroughs = sum(report.get("playthroughs", 0) for report in simulation.values())
+
+    for ending_id in unreached:
+        analysis = reachability.get(ending_id, {})
+        if analysis.get("status") in ("unreachable", "unreferenced"):
+            proof = "；".join(analysis.get("proof", []))
+            issues.append({
+                "issue_id": f"sim_ending_{ending_id}",
+                "category": "ending_unreachable",
+                "severity": "critical",
+                "description": f"结局 {ending_id} 不可达（好感度门槛无法满足）: {proof}",
+                "location": f"endings.{ending_id}",
+                "fix_suggestion": "降低该结局选项的visible门槛，或增加相关女主的effect/reward"
+            })
+        else:
+            issues.append({
+                "issue_id": f"sim_ending_{ending_id}",
+                "category": "ending_not_observed",
+                "severity": "medium",
+                "description": f"模拟的{playthroughs}次游玩中没有到达结局 {ending_id}（未证明不可达，可能概率很低）",
+                "location": f"endings.{ending_id}",
+                "fix_suggestion": "检查该结局的visible门槛是否过高，必要时降低门槛或增加相关女主的effect/reward"
+            })
+
+    random_report = simulation.get("random")
+    if random_report and random_report["dead_end_rate"] > max_dead_end_rate:
+        worst = max(random_report["dead_end_chapters"].items(), key=lambda item: item[1])[0]
+        issues.append({
+            "issue_id": "sim_dead_end",
+            "category": "dead_end",
+            "severity": "high",
+            "description": f"随机游玩的死路率为{random_report['dead_end_rate']:.1%}，主要发生在 {worst}",
+            "location": f"chapters.{worst}",
+            "fix_suggestion": "保证每章至少有一个无门槛(visible为null)的选项，最终章为每位女主提供低门槛结局"
+        })
+
+    # 任何策略下都不可见的选项
+    unreachable = None
+    for report in simulation.values():
+        choices = {(c["chapter"], c["choice"]) for c in report["unreachable_choices"]}
+        unreachable = choices if unreachable is None else unreachable & choices
+    for chapter_id, choice_id in sorted(unreachable or []):
+        issues.append({
+            "issue_id": f"sim_choice_{chapter_id}_{choice_id}",
+            "category": "choice_unreachable",
+            "severity": "medium",
+            "description": f"模拟中选项 {choice_id} 从未满足可见条件",
+            "location": f"chapters.{chapter_id}.choices.{choice_id}.visible",
+            "fix_suggestion": "降低visible门槛"
+        })
+
+    return issues
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python route_simulator.py <main_route_framework.json> [模拟次数]")
+        sys.exit(1)
+
+    json_file = sys.argv[1]
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 100000
+
+    with open(json_file, 'r', encoding='utf-8') as f:
+        route_data = json.load(f)
+
+    print("=" * 60)
+    print("路线蒙特卡洛模拟")
+    print("=" * 60)
+
+    simulation = simulate_route(route_data, n=runs)
+    for policy, report in simulation.items():
+        print(f"\n策略: {policy}")
+        print(f"   死路率: {report['dead_end_rate']:.2%}")
+        for ending_id, rate in report["ending_rates"].items():
+            print(f"   {ending_id}: {rate:.2%}")
+
+    issues = check_route_simulation(simulation, route_framework=route_data)
+    if issues:
+        print("\n发现的问题:")
+        for i, issue in enumerate(issues, 1):
+            print(f"\n{i}. [{issue['severity']}] {issue['category']}")
+            print(f"   描述: {issue['description']}")
+            print(f"   建议: {issue['fix_suggestion']}")
+    else:
+        print("\n✓ 没有发现问题!")
+
+    # 保存报告
+    report_file = json_file.replace('.json', '_simulation_report.json')
+    with open(report_file, 'w', encoding='utf-8') as f:
+        json.dump(simulation, f, ensure_ascii=False, indent=2)
+    print(f"\n报告已保存到: {report_file}")
@@ -0,0 +1,420 @@
+"""
+故事大纲一致性检查脚本 - 直接检查不使用LLM
+检查角色/冲突/升级节点之间的引用完整性，问题格式与StoryConsistencyAgent一致
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Set
+
+from utils.entity_registry import registry_from_data
+
+
+class StoryConsistencyChecker:
+    """故事大纲一致性检查器"""
+
+    # 报告ID前缀（用于区分规则检查报告和LLM检查报告）
+    REPORT_ID_PREFIX = "story_rule_check"
+
+    # 冲突大纲的最少数量要求（与冲突大纲提示词一致）
+    MIN_MAIN_CONFLICTS = 3
+    MIN_SECONDARY_CONFLICTS = 4
+    MIN_CRITICAL_CHOICES = 4
+
+    def __init__(
+        self,
+        premise: Dict[str, Any],
+        cast_arc: Dict[str, Any],
+        conflict_map: Optional[Dict[str, Any]] = None,
+        conflict_outline: Optional[Dict[str, Any]] = None,
+        world_setting_json: Optional[Dict[str, Any]] = None
+    ):
+        self.premise = self._to_dict(premise)
+        self.cast_arc = self._to_dict(cast_arc)
+        self.conflict_map = self._to_dict(conflict_map)
+        self.conflict_outline = self._to_dict(conflict_outline)
+        self.issues = []
+
+        # 角色/冲突/势力的ID和名称查找、引用位置都从实体注册表查询
+        self.registry = registry_from_data(
+            {"cast_arc": self.cast_arc, "conflict_engine": {"map": self.conflict_map}},
+            world_setting_json or {}
+        )
+        self.world_faction_ids = self.registry.ids("faction")
+
+    def check_all(self) -> Dict[str, Any]:
+        """执行所有检查"""
+        self.issues = []
+
+        self.check_premise()
+        self.check_cast()
+        self.check_conflict_outline()
+        if self._has_conflicts():
+            self.check_conflict_references()
+            self.check_escalation_curve()
+            self.check_heroine_coverage()
+
+        # 确定整体状态
+        critical_count = sum(1 for i in self.issues if i['severity'] == 'critical')
+        high_count = sum(1 for i in self.issues if i['severity'] == 'high')
+
+        if critical_count > 0:
+            overall_status = "failed"
+        elif high_count > 0:
+            overall_status = "warning"
+        else:
+            overall_status = "passed"
+
+        return {
+            "report_id": f"{self.REPORT_ID_PREFIX}_{len(self.issues)}",
+            "overall_status": overall_status,
+            "total_issues": len(self.issues),
+            "consistency_issues": sum(1 for i in self.issues if i['category'] != 'suggestion'),
+            "summary": self._generate_summary(),
+            "issues": self.issues
+        }
+
+    def check_premise(self):
+        """检查故事前提"""
+        for field, label in [("hook", "核心钩子"), ("core_question", "核心问题")]:
+            if not self.premise.get(field):
+                self._add_issue(
+                    f"premise_empty_{field}", "missing", "high", "StoryPremiseAgent",
+                    f"故事前提缺少{label}({field})",
+                    f"补充{label}"
+                )
+
+        must_have = set(self.premise.get("must_have_elements", []) or [])
+        forbidden = set(self.premise.get("forbidden_elements", []) or [])
+        for element in sorted(must_have & forbidden):
+            self._add_issue(
+                f"premise_element_conflict_{element}", "conflict", "critical", "StoryPremiseAgent",
+                f"元素「{element}」同时出现在必备元素和禁止元素中",
+                "从必备元素或禁止元素中删除该元素"
+            )
+
+    def check_cast(self):
+        """检查角色弧光（主角/女主、重复ID、关系引用、势力引用）"""
+        if not self.cast_arc.get("protagonist"):
+            self._add_issue(
+                "cast_no_protagonist", "missing", "critical", "CastArcAgent",
+                "角色弧光缺少主角(protagonist)",
+                "补充主角设定"
+            )
+        if not self.cast_arc.get("heroines"):
+            self._add_issue(
+                "cast_no_heroines", "missing", "critical", "CastArcAgent",
+                "角色弧光没有任何女主(heroines)，无法生成个人线",
+                "至少补充一位女主"
+            )
+
+        seen: Set[str] = set()
+        for character in self._iter_characters():
+            character_id = character.get("character_id")
+            if not character_id:
+                self._add_issue(
+                    f"cast_no_id_{character.get('character_name', 'unknown')}", "missing", "high", "CastArcAgent",
+                    f"角色 {character.get('character_name', '未命名')} 缺少character_id",
+                    "为角色补充唯一的character_id"
+                )
+                continue
+            if character_id in seen:
+                self._add_issue(
+                    f"cast_duplicate_{character_id}", "conflict", "critical", "CastArcAgent",
+                    f"角色ID {character_id} 重复出现",
+                    "为重复的角色分配不同的character_id"
+                )
+            seen.add(character_id)
+
+            # 关系引用
+            for target in (character.get("relationships") or {}):
+                if not self.registry.contains(target, "character"):
+                    self._add_issue(
+                        f"cast_relationship_{character_id}_{target}", "inconsistency", "medium", "CastArcAgent",
+                        f"角色 {character_id} 的relationships引用了不存在的角色 {target}",
+                        "删除该关系或改为已有角色ID"
+                    )
+
+            # 势力引用（只在世界观提供了势力列表时检查）
+            faction = character.get("faction_affiliation")
+            if faction and self.world_faction_ids and faction not in self.world_faction_ids:
+                self._add_issue(
+                    f"cast_faction_{character_id}", "inconsistency", "high", "CastArcAgent",
+                    f"角色 {character_id} 的faction_affiliation {faction} 不存在于世界观势力中",
+                    f"改为已有势力ID（{', '.join(sorted(self.world_faction_ids))}）或设为null"
+                )
+
+        matrix = self.cast_arc.get("relationship_matrix") or {}
+        for source, targets in matrix.items():
+            refs = [source] + (list(targets) if isinstance(targets, dict) else [])
+            for ref in refs:
+                if not self.registry.contains(ref, "character"):
+                    self._add_issue(
+                        f"cast_matrix_{ref}", "inconsistency", "medium", "CastArcAgent",
+                        f"relationship_matrix引用了不存在的角色 {ref}",
+                        "删除该条目或改为已有角色ID"
+                    )
+
+    def check_conflict_outline(self):
+        """检查冲突大纲的数量要求"""
+        if not self.conflict_outline:
+            return
+        requirements = [
+            ("main_conflicts_outline", self.MIN_MAIN_CONFLICTS, "主冲突"),
+            ("secondary_conflicts_outline", self.MIN_SECONDARY_CONFLICTS, "次要冲突"),
+            ("critical_choice_outline", self.MIN_CRITICAL_CHOICES, "关键抉择点"),
+        ]
+        for field, minimum, label in requirements:
+            count = len(self.conflict_outline.get(field, []) or [])
+            if count < minimum:
+                self._add_issue(
+                    f"outline_count_{field}", "missing", "high", "ConflictOutlineAgent",
+                    f"冲突大纲只规划了{count}个{label}，至少需要{minimum}个",
+                    f"补充{label}到至少{minimum}个"
+                )
+
+    def check_conflict_references(self):
+        """检查具体冲突的引用（重复ID、涉及角色、势力冲突）"""
+        conflict_ids: Set[str] = set()
+        for conflict in self._iter_conflicts():
+            conflict_id = conflict.get("conflict_id", "unknown")
+            if conflict_id in conflict_ids:
+                self._add_issue(
+                    f"conflict_duplicate_{conflict_id}", "conflict", "critical", "ConflictEngineAgent",
+                    f"冲突ID {conflict_id} 重复出现",
+                    "为重复的冲突分配不同的conflict_id"
+                )
+            conflict_ids.add(conflict_id)
+
+            for character in conflict.get("involved_characters", []) or []:
+                if not self.registry.contains(character, "character"):
+                    self._add_issue(
+                        f"conflict_character_{conflict_id}_{character}", "inconsistency", "critical",
+                        "ConflictEngineAgent",
+                        f"冲突 {conflict_id} 的involved_characters包含不存在于角色弧光中的角色 {character}",
+                        "改为cast_arc中已有的character_id，或删除该角色"
+                    )
+
+        # 主冲突数量应与冲突大纲一致
+        if self.conflict_outline:
+            planned = len(self.conflict_outline.get("main_conflicts_outline", []) or [])
+            actual = len(self.conflict_map.get("main_conflicts", []) or [])
+            if actual < planned:
+                self._add_issue(
+                    "conflict_main_count", "missing", "high", "ConflictEngineAgent",
+                    f"冲突大纲规划了{planned}个主冲突，实际只生成了{actual}个",
+                    "按冲突大纲补全主冲突"
+                )
+
+        faction_conflicts = self.conflict_map.get("faction_conflicts") or {}
+        for faction_id, related in faction_conflicts.items():
+            if self.world_faction_ids and faction_id not in self.world_faction_ids:
+                self._add_issue(
+                    f"faction_conflicts_key_{faction_id}", "inconsistency", "medium", "ConflictEngineAgent",
+                    f"faction_conflicts的key {faction_id} 不存在于世界观势力中",
+                    "改为已有势力ID"
+                )
+            for conflict_id in related or []:
+                if conflict_id not in conflict_ids:
+                    self._add_issue(
+                        f"faction_conflicts_ref_{faction_id}_{conflict_id}", "inconsistency", "medium",
+                        "ConflictEngineAgent",
+                        f"faction_conflicts中势力 {faction_id} 引用了不存在的冲突 {conflict_id}",
+                        "删除该引用或改为已有冲突ID"
+                    )
+
+    def check_escalation_curve(self):
+        """检查危机升级曲线（冲突引用、角色引用、节点顺序）"""
+        conflict_ids = {c.get("conflict_id") for c in self._iter_conflicts() if c.get("conflict_id")}
+        previous_order = None
+
+        for node in self.conflict_map.get("escalation_curve", []) or []:
+            node_id = node.get("node_id", "unknown")
+
+            for conflict_id in node.get("escalated_conflicts", []) or []:
+                if conflict_id not in conflict_ids:
+                    self._add_issue(
+                        f"node_conflict_{node_id}_{conflict_id}", "inconsistency", "critical", "ConflictEngineAgent",
+                        f"升级节点 {node_id} 的escalated_conflicts引用了不存在的冲突 {conflict_id}",
+                        f"改为已有冲突ID（{', '.join(sorted(conflict_ids)) or '无'}）"
+                    )
+
+            for character in node.get("involved_characters", []) or []:
+                if not self.registry.contains(character, "character"):
+                    self._add_issue(
+                        f"node_character_{node_id}_{character}", "inconsistency", "high", "ConflictEngineAgent",
+                        f"升级节点 {node_id} 的involved_characters包含不存在的角色 {character}",
+                        "改为cast_arc中已有的character_id"
+                    )
+
+            order = node.get("sequence_order")
+            if isinstance(order, (int, float)):
+                if previous_order is not None and order <= previous_order:
+                    self._add_issue(
+                        f"node_order_{node_id}", "inconsistency", "medium", "ConflictEngineAgent",
+                        f"升级节点 {node_id} 的sequence_order({order})不大于前一节点({previous_order})",
+                        "按顺序重新编号sequence_order"
+                    )
+                previous_order = order
+
+    def check_heroine_coverage(self):
+        """检查每位女主是否参与了冲突或升级节点（否则个人线没有剧情支撑）"""
+        for heroine in self.cast_arc.get("heroines", []) or []:
+            heroine = self._to_dict(heroine)
+            refs = [r for r in (heroine.get("character_id"), heroine.get("character_name")) if r]
+            involved = any(
+                ".involved_characters." in location
+                for ref in refs for location in self.registry.references(ref, "character")
+            )
+            if refs and not involved:
+                heroine_id = heroine.get("character_id") or heroine.get("character_name")
+                self._add_issue(
+                    f"heroine_uncovered_{heroine_id}", "missing", "high", "ConflictEngineAgent",
+                    f"女主 {heroine.get('character_name', heroine_id)} 没有参与任何冲突或升级节点，个人线缺少剧情支撑",
+                    "让该女主参与至少一个冲突或升级节点"
+                )
+
+    # ========== 工具方法 ==========
+
+    @staticmethod
+    def _to_dict(data: Any) -> Dict[str, Any]:
+        """确保数据为dict格式"""
+        if hasattr(data, "model_dump"):
+            return data.model_dump()
+        return data or {}
+
+    def _iter_characters(self) -> List[Dict[str, Any]]:
+        """遍历所有角色"""
+        characters = []
+        protagonist = self.cast_arc.get("protagonist")
+        if protagonist:
+            characters.append(self._to_dict(protagonist))
+        for field in ("heroines", "supporting_cast", "antagonists"):
+            characters.extend(self._to_dict(c) for c in self.cast_arc.get(field, []) or [])
+        return characters
+
+    def _iter_conflicts(self) -> List[Dict[str, Any]]:
+        """遍历所有具体冲突"""
+        conflicts = []
+        for field in ("main_conflicts", "secondary_conflicts", "background_conflicts"):
+            conflicts.extend(self._to_dict(c) for c in self.conflict_map.get(field, []) or [])
+        return conflicts
+
+    def _has_conflicts(self) -> bool:
+        """是否已经生成了具体冲突（大纲阶段没有）"""
+        return bool(self._iter_conflicts() or self.conflict_map.get("escalation_curve"))
+
+    def _add_issue(
+        self,
+        key: str,
+        category: str,
+        severity: str,
+        source_agent: str,
+        description: str,
+        fix_suggestion: str
+    ):
+        """添加问题（issue_id以rule_开头，与LLM问题区分；相同描述的问题只记录一次）"""
+        if any(issue["description"] == description for issue in self.issues):
+            return
+        # 非ASCII字符（如中文名称）会被替换，冲突时追加序号保证ID唯一
+        base_id = "rule_" + re.sub(r"[^a-z0-9_]", "_", key.lower())
+        existing = {issue["issue_id"] for issue in self.issues}
+        issue_id, suffix = base_id, 2
+        while issue_id in existing:
+            issue_id, suffix = f"{base_id}_{suffix}", suffix + 1
+        self.issues.append({
+            "issue_id": issue_id,
+            "category": category,
+            "severity": severity,
+            "source_agent": source_agent,
+            "description": description,
+            "fix_suggestion": fix_suggestion,
+            "is_fixed": False
+        })
+
+    def _generate_summary(self) -> str:
+        """生成摘要"""
+        if not self.issues:
+            return "规则检查没有发现问题"
+
+        # 统计各来源的问题
+        source_count = {}
+        for issue in self.issues:
+            source = issue['source_agent']
+            source_count[source] = source_count.get(source, 0) + 1
+
+        parts = [f"{source} {count}个" for source, count in source_count.items()]
+        return "规则检查发现问题: " + "、".join(parts)
+
+
+def check_story_consistency(
+    premise: Dict[str, Any],
+    cast_arc: Dict[str, Any],
+    conflict_map: Optional[Dict[str, Any]] = None,
+    conflict_outline: Optional[Dict[str, Any]] = None,
+    world_setting_json: Optional[Dict[str, Any]] = None
+) -> Dict[str, Any]:
+    """
+    检查故事大纲引用完整性（规则检查）
+
+    Args:
+        premise: 故事前提
+        cast_arc: 角色弧光
+        conflict_map: 矛盾地图（大纲阶段可为空）
+        conflict_outline: 冲突大纲
+        world_setting_json: 世界观数据（用于校验势力ID，可选）
+
+    Returns:
+        检查报告（格式与StoryConsistencyAgent输出一致）
+    """
+    checker = StoryConsistencyChecker(premise, cast_arc, conflict_map, conflict_outline, world_setting_json)
+    return checker.check_all()
+
+
+def is_rule_report(report: Any) -> bool:
+    """判断报告是否来自规则检查"""
+    report_id = report.get("report_id") if isinstance(report, dict) else getattr(report, "report_id", None)
+    return str(report_id or "").startswith(StoryConsistencyChecker.REPORT_ID_PREFIX)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python story_consistency_checker.py <story_outline.json>")
+        sys.exit(1)
+
+    json_file = sys.argv[1]
+
+    with open(json_file, 'r', encoding='utf-8') as f:
+        story_data = json.load(f)
+
+    steps = story_data.get("steps", story_data)
+    conflict_data = steps.get("conflict_engine", {})
+    if isinstance(conflict_data, dict) and "outline" in conflict_data:
+        conflict_outline, conflict_map = conflict_data["outline"], conflict_data.get("map", {})
+    else:
+        conflict_outline, conflict_map = steps.get("conflict_outline"), conflict_data
+
+    print("=" * 60)
+    print("故事大纲引用完整性检查")
+    print("=" * 60)
+
+    report = check_story_consistency(
+        steps.get("premise", {}),
+        steps.get("cast_arc", {}),
+        conflict_map,
+        conflict_outline
+    )
+
+    print(f"\n状态: {report['overall_status']}")
+    print(f"问题总数: {report['total_issues']}")
+    print(f"摘要: {report['summary']}")
+
+    if report['issues']:
+        print("\n发现的问题:")
+        for i, issue in enumerate(report['issues'], 1):
+            print(f"\n{i}. [{issue['severity']}] {issue['source_agent']}")
+            print(f"   描述: {issue['description']}")
+            print(f"   建议: {issue['fix_suggestion']}")
+    else:
+        print("\n✓ 没有发现问题!")
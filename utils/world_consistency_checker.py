@@ -0,0 +1,397 @@
+"""
+世界观一致性检查脚本 - 直接检查不使用LLM
+检查悬空引用、重复ID/名称、时间线顺序和必填集合，问题格式与WorldConsistencyAgent一致
+"""
+import json
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class WorldConsistencyChecker:
+    """世界观一致性检查器"""
+
+    # 报告ID前缀（用于区分规则检查报告和LLM检查报告）
+    REPORT_ID_PREFIX = "world_rule_check"
+
+    def __init__(
+        self,
+        key_elements: Dict[str, Any],
+        timeline: Dict[str, Any],
+        atmosphere: Dict[str, Any],
+        factions: Dict[str, Any]
+    ):
+        self.key_elements = self._to_dict(key_elements)
+        self.timeline = self._to_dict(timeline)
+        self.atmosphere = self._to_dict(atmosphere)
+        self.factions = self._to_dict(factions)
+        self.issues = []
+
+    def check_all(self) -> Dict[str, Any]:
+        """执行所有检查"""
+        self.issues = []
+
+        self.check_required_collections()
+        self.check_duplicates()
+        self.check_faction_references()
+        self.check_item_references()
+        self.check_event_references()
+        self.check_timeline_order()
+
+        # 确定整体状态
+        critical_count = sum(1 for i in self.issues if i['severity'] == 'critical')
+        high_count = sum(1 for i in self.issues if i['severity'] == 'high')
+
+        if critical_count > 0:
+            overall_status = "failed"
+        elif high_count > 0:
+            overall_status = "warning"
+        else:
+            overall_status = "passed"
+
+        return {
+            "report_id": f"{self.REPORT_ID_PREFIX}_{len(self.issues)}",
+            "overall_status": overall_status,
+            "total_issues": len(self.issues),
+            "summary": self._generate_summary(),
+            "issues": self.issues
+        }
+
+    def check_required_collections(self):
+        """检查必填集合是否为空"""
+        required = [
+            ("KeyElementAgent", self.key_elements, "items", "关键道具"),
+            ("KeyElementAgent", self.key_elements, "locations", "关键地点"),
+            ("TimelineAgent", self.timeline, "events", "历史事件"),
+            ("AtmosphereAgent", self.atmosphere, "scene_presets", "场景预设"),
+            ("NpcFactionAgent", self.factions, "factions", "势力"),
+            ("NpcFactionAgent", self.factions, "key_npcs", "关键NPC"),
+        ]
+        for source_agent, data, field, label in required:
+            if not data.get(field):
+                self._add_issue(
+                    f"empty_{field}", "missing", "high", source_agent,
+                    f"{label}列表({field})为空",
+                    f"补充{label}，不要输出空列表",
+                    field
+                )
+
+    def check_duplicates(self):
+        """检查重复的ID和名称"""
+        collections = [
+            ("KeyElementAgent", self.key_elements.get("items", []), "item_id", "items"),
+            ("KeyElementAgent", self.key_elements.get("locations", []), "location_id", "locations"),
+            ("KeyElementAgent", self.key_elements.get("organizations", []), "org_id", "organizations"),
+            ("TimelineAgent", self.timeline.get("events", []), "event_id", "events"),
+            ("NpcFactionAgent", self.factions.get("factions", []), "faction_id", "factions"),
+            ("NpcFactionAgent", self.factions.get("key_npcs", []), "npc_id", "key_npcs"),
+        ]
+        for source_agent, entries, id_field, field in collections:
+            for value, count in self._count_values(entries, id_field).items():
+                self._add_issue(
+                    f"duplicate_id_{field}_{value}", "conflict", "high", source_agent,
+                    f"{field}中的ID {value} 重复出现{count}次",
+                    f"为重复的条目分配不同的{id_field}",
+                    f"{field}.{value}"
+                )
+            for value, count in self._count_values(entries, "name").items():
+                self._add_issue(
+                    f"duplicate_name_{field}_{value}", "inconsistency", "medium", source_agent,
+                    f"{field}中的名称「{value}」重复出现{count}次",
+                    "合并重复条目或改用不同的名称",
+                    f"{field}.{value}"
+                )
+
+        terms = self.key_elements.get("terms", [])
+        for value, count in self._count_values(terms, "term").items():
+            self._add_issue(
+                f"duplicate_term_{value}", "inconsistency", "medium", "KeyElementAgent",
+                f"术语「{value}」重复定义{count}次",
+                "合并重复的术语定义",
+                f"terms.{value}"
+            )
+
+    def check_faction_references(self):
+        """检查势力引用（NPC所属势力、势力关系目标）"""
+        faction_ids = self._collect_ids(self.factions.get("factions", []), "faction_id")
+
+        for npc in self.factions.get("key_npcs", []):
+            faction_id = npc.get("faction_id")
+            if faction_id and faction_id not in faction_ids:
+                npc_id = npc.get("npc_id", "unknown")
+                self._add_issue(
+                    f"npc_faction_{npc_id}", "inconsistency", "high", "NpcFactionAgent",
+                    f"NPC {npc.get('name', npc_id)} 的faction_id {faction_id} 不存在于势力列表",
+                    f"将faction_id改为已有势力ID（{', '.join(sorted(faction_ids)) or '无'}）或补充该势力",
+                    f"key_npcs.{npc_id}.faction_id"
+                )
+
+        for faction in self.factions.get("factions", []):
+            source_id = faction.get("faction_id", "unknown")
+            for relation in faction.get("relations", []) or []:
+                target_id = relation.get("target_faction_id")
+                if target_id and target_id not in faction_ids:
+                    self._add_issue(
+                        f"faction_relation_{source_id}_{target_id}", "inconsistency", "high", "NpcFactionAgent",
+                        f"势力 {source_id} 的关系目标 {target_id} 不存在于势力列表",
+                        "删除该关系或将target_faction_id改为已有势力ID",
+                        f"factions.{source_id}.relations"
+                    )
+
+    def check_item_references(self):
+        """检查道具持有者/所在地点引用"""
+        owner_ids = (
+            self._collect_ids(self.factions.get("key_npcs", []), "npc_id")
+            | self._collect_ids(self.factions.get("factions", []), "faction_id")
+            | self._collect_ids(self.key_elements.get("organizations", []), "org_id")
+        )
+        location_ids = self._collect_ids(self.key_elements.get("locations", []), "location_id")
+
+        for item in self.key_elements.get("items", []):
+            item_id = item.get("item_id", "unknown")
+            owner = item.get("owner_id") or item.get("owner")
+            if owner and self._looks_like_id(owner) and owner not in owner_ids:
+                self._add_issue(
+                    f"item_owner_{item_id}", "inconsistency", "high", "KeyElementAgent",
+                    f"道具 {item.get('name', item_id)} 的持有者 {owner} 不存在于NPC/势力/组织中",
+                    "将持有者改为已有的NPC/势力/组织ID",
+                    f"items.{item_id}.owner"
+                )
+            location = item.get("location_id")
+            if location and location not in location_ids:
+                self._add_issue(
+                    f"item_location_{item_id}", "inconsistency", "high", "KeyElementAgent",
+                    f"道具 {item.get('name', item_id)} 的所在地点 {location} 不存在于地点列表",
+                    "将location_id改为已有地点ID",
+                    f"items.{item_id}.location_id"
+                )
+
+    def check_event_references(self):
+        """检查事件引用（关联事件、参与者）"""
+        events = self.timeline.get("events", [])
+        event_ids = self._collect_ids(events, "event_id")
+        participant_ids = (
+            self._collect_ids(self.factions.get("key_npcs", []), "npc_id")
+            | self._collect_ids(self.factions.get("factions", []), "faction_id")
+            | self._collect_ids(self.key_elements.get("organizations", []), "org_id")
+        )
+
+        for event in events:
+            event_id = event.get("event_id", "unknown")
+            for related in event.get("related_events", []) or []:
+                if related == event_id:
+                    self._add_issue(
+                        f"event_self_ref_{event_id}", "inconsistency", "low", "TimelineAgent",
+                        f"事件 {event_id} 的related_events引用了自身",
+                        "从related_events中删除自身ID",
+                        f"events.{event_id}.related_events"
+                    )
+                elif self._looks_like_id(related) and related not in event_ids:
+                    self._add_issue(
+                        f"event_related_{event_id}_{related}", "inconsistency", "medium", "TimelineAgent",
+                        f"事件 {event_id} 的关联事件 {related} 不存在于时间线",
+                        "删除该关联或改为已有事件ID",
+                        f"events.{event_id}.related_events"
+                    )
+
+            # 参与者为可选字段，只检查ID形式的引用
+            for participant in event.get("participants", []) or []:
+                if self._looks_like_id(participant) and participant not in participant_ids:
+                    self._add_issue(
+                        f"event_participant_{event_id}_{participant}", "inconsistency", "medium", "TimelineAgent",
+                        f"事件 {event_id} 的参与者 {participant} 不存在于NPC/势力/组织中",
+                        "将参与者改为已有的NPC/势力/组织ID",
+                        f"events.{event_id}.participants"
+                    )
+
+    def check_timeline_order(self):
+        """检查时间线是否按时间顺序排列（只比较同类可解析的时间点）"""
+        previous: Dict[str, Tuple[float, str]] = {}
+        for event in self.timeline.get("events", []):
+            parsed = self._parse_time_period(event.get("time_period"))
+            if parsed is None:
+                continue
+            kind, position = parsed
+            event_id = event.get("event_id", "unknown")
+            latest = previous.get(kind)
+            if latest and position < latest[0]:
+                self._add_issue(
+                    f"timeline_order_{event_id}", "inconsistency", "medium", "TimelineAgent",
+                    f"事件 {event_id}（{event.get('time_period')}）排在更晚的事件 {latest[1]} 之后，时间线顺序错误",
+                    "按时间先后重新排列events",
+                    f"events.{event_id}.time_period"
+                )
+            else:
+                previous[kind] = (position, event_id)
+
+    # ========== 工具方法 ==========
+
+    @staticmethod
+    def _to_dict(data: Any) -> Dict[str, Any]:
+        """确保数据为dict格式"""
+        if hasattr(data, "model_dump"):
+            return data.model_dump()
+        return data or {}
+
+    @staticmethod
+    def _collect_ids(entries: List[Dict[str, Any]], id_field: str) -> set:
+        """收集条目ID"""
+        return {entry.get(id_field) for entry in entries or [] if entry.get(id_field)}
+
+    @staticmethod
+    def _count_values(entries: List[Dict[str, Any]], field: str) -> Dict[str, int]:
+        """统计重复出现的字段值"""
+        counts = {}
+        for entry in entries or []:
+            value = entry.get(field)
+            if value:
+                counts[value] = counts.get(value, 0) + 1
+        return {value: count for value, count in counts.items() if count > 1}
+
+    @staticmethod
+    def _looks_like_id(value: Any) -> bool:
+        """判断是否为ID形式的引用（英文小写和下划线）"""
+        return isinstance(value, str) and re.fullmatch(r"[a-z][a-z0-9_]*", value) is not None
+
+    @staticmethod
+    def _parse_time_period(time_period: Any) -> Optional[Tuple[str, float]]:
+        """
+        解析时间点为 (类型, 数值)，数值越大越晚；相对时间和绝对年份分开比较
+
+        支持: "N年前"/"N个月前"/"N天前"（相对故事开始）、"N年后"、"公元N年"/"N年"（绝对年份）
+        """
+        if not isinstance(time_period, str):
+            return None
+        text = time_period.replace(" ", "")
+
+        relative = re.search(r"(\d+(?:\.\d+)?)(年|个月|月|天|日)(前|后)", text)
+        if relative:
+            value = float(relative.group(1))
+            unit = {"年": 1, "个月": 1 / 12, "月": 1 / 12, "天": 1 / 365, "日": 1 / 365}[relative.group(2)]
+            sign = -1 if relative.group(3) == "前" else 1
+            return "relative", sign * value * unit
+
+        absolute = re.search(r"(\d{3,4})年", text)
+        if absolute:
+            return "absolute", float(absolute.group(1))
+        return None
+
+    def _add_issue(
+        self,
+        key: str,
+        category: str,
+        severity: str,
+        source_agent: str,
+        description: str,
+        fix_suggestion: str,
+        related_field: str
+    ):
+        """添加问题（issue_id以rule_开头，与LLM问题区分；相同描述的问题只记录一次）"""
+        if any(issue["description"] == description for issue in self.issues):
+            return
+        # 非ASCII字符（如中文名称）会被替换，冲突时追加序号保证ID唯一
+        base_id = "rule_" + re.sub(r"[^a-z0-9_]", "_", key.lower())
+        existing = {issue["issue_id"] for issue in self.issues}
+        issue_id, suffix = base_id, 2
+        while issue_id in existing:
+            issue_id, suffix = f"{base_id}_{suffix}", suffix + 1
+        self.issues.append({
+            "issue_id": issue_id,
+            "category": category,
+            "severity": severity,
+            "source_agent": source_agent,
+            "description": description,
+            "fix_suggestion": fix_suggestion,
+            "related_field": related_field,
+            "is_fixed": False
+        })
+
+    def _generate_summary(self) -> str:
+        """生成摘要"""
+        if not self.issues:
+            return "规则检查没有发现问题"
+
+        # 统计各类问题
+        category_count = {}
+        for issue in self.issues:
+            cat = issue['category']
+            category_count[cat] = category_count.get(cat, 0) + 1
+
+        parts = []
+        for cat, count in category_count.items():
+            cat_name = {
+                'conflict': '冲突',
+                'inconsistency': '不一致',
+                'missing': '缺失',
+                'suggestion': '建议'
+            }.get(cat, cat)
+            parts.append(f"{count}个{cat_name}")
+
+        return "规则检查发现" + "、".join(parts)
+
+
+def check_world_consistency(
+    key_elements: Dict[str, Any],
+    timeline: Dict[str, Any],
+    atmosphere: Dict[str, Any],
+    factions: Dict[str, Any]
+) -> Dict[str, Any]:
+    """
+    检查世界观一致性（规则检查）
+
+    Args:
+        key_elements: 关键元素
+        timeline: 时间线
+        atmosphere: 氛围设定
+        factions: 势力设定
+
+    Returns:
+        检查报告（格式与WorldConsistencyAgent输出一致）
+    """
+    checker = WorldConsistencyChecker(key_elements, timeline, atmosphere, factions)
+    return checker.check_all()
+
+
+def is_rule_report(report: Any) -> bool:
+    """判断报告是否来自规则检查"""
+    report_id = report.get("report_id") if isinstance(report, dict) else getattr(report, "report_id", None)
+    return str(report_id or "").startswith(WorldConsistencyChecker.REPORT_ID_PREFIX)
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) < 2:
+        print("用法: python world_consistency_checker.py <worldbuilding_result.json>")
+        sys.exit(1)
+
+    json_file = sys.argv[1]
+
+    with open(json_file, 'r', encoding='utf-8') as f:
+        world_data = json.load(f)
+
+    steps = world_data.get("steps", world_data)
+
+    print("=" * 60)
+    print("世界观一致性检查")
+    print("=" * 60)
+
+    report = check_world_consistency(
+        steps.get("key_element", {}),
+        steps.get("timeline", {}),
+        steps.get("atmosphere", {}),
+        steps.get("npc_faction", {})
+    )
+
+    print(f"\n状态: {report['overall_status']}")
+    print(f"问题总数: {report['total_issues']}")
+    print(f"摘要: {report['summary']}")
+
+    if report['issues']:
+        print("\n发现的问题:")
+        for i, issue in enumerate(report['issues'], 1):
+            print(f"\n{i}. [{issue['severity']}] {issue['category']}")
+            print(f"   描述: {issue['description']}")
+            print(f"   位置: {issue['related_field']}")
+            print(f"   建议: {issue['fix_suggestion']}")
+    else:
+        print("\n✓ 没有发现问题!")
@@ -0,0 +1,148 @@
+"""
+世界观摘要（World Digest）
+把world_setting.json的steps整理为去重、规范化、限制长度的紧凑文本，供下游Agent的prompt共用
+
+- 只保留世界观内容步骤（检查报告、修复记录、重复的result["world"]不进入摘要）
+- 去掉空值和生成过程中的标记字段，紧凑JSON序列化（键排序，输出稳定）
+- 超出长度上限时逐步截短长文本、再截短长列表
+- 按内容哈希缓存在内存和 PROJECT_TEMP_DIR/world_digest 下，同一份世界观只构建一次
+"""
+import threading
+from pathlib import Path
+from typing import Any, Dict, Optional
+
+from utils.config import config
+from utils.json_utils import prompt_json, stable_hash
+from utils.logger import log
+
+# 进入摘要的步骤（按顺序）
+DIGEST_STEPS = ["story_intake", "worldbuilding", "key_element", "timeline", "atmosphere", "npc_faction"]
+# 不进入摘要的标记字段
+SKIP_KEYS = {"fallback", "fixed", "fix_count", "fix_round", "agent_name", "error"}
+# 默认长度上限（字符数，中文约等于token数）
+DEFAULT_MAX_CHARS = 12000
+# 摘要格式版本：格式变化时旧缓存失效
+DIGEST_VERSION = 1
+
+STEP_TITLES = {
+    "story_intake": "故事约束",
+    "worldbuilding": "世界观设定",
+    "key_element": "关键元素",
+    "timeline": "时间线",
+    "atmosphere": "氛围设定",
+    "npc_faction": "势力/NPC",
+}
+
+_memory_cache: Dict[str, str] = {}
+_lock = threading.Lock()
+
+
+def _canonical(value: Any) -> Any:
+    """去掉空值和标记字段（Pydantic对象先转为dict）"""
+    if hasattr(value, "model_dump"):
+        value = value.model_dump()
+    if isinstance(value, dict):
+        result = {}
+        for key, item in value.items():
+            if key in SKIP_KEYS:
+                continue
+            item = _canonical(item)
+            if item not in (None, "", [], {}):
+                result[key] = item
+        return result
+    if isinstance(value, (list, tuple)):
+        return [item for item in (_canonical(i) for i in value) if item not in (None, "", [], {})]
+    return value
+
+
+def _shrink(value: Any, max_str: Optional[int], max_items: Optional[int]) -> Any:
+    """截短长文本和长列表"""
+    if isinstance(value, dict):
+        return {k: _shrink(v, max_str, max_items) for k, v in value.items()}
+    if isinstance(value, list):
+        items = [_shrink(v, max_str, max_items) for v in value]
+        if max_items is not None and len(items) > max_items:
+            items = items[:max_items] + [f"...（共{len(value)}项）"]
+        return items
+    if isinstance(value, str) and max_str is not None and len(value) > max_str:
+        return value[:max_str] + "…"
+    return value
+
+
+def _render(steps: Dict[str, Any], max_str: Optional[int] = None, max_items: Optional[int] = None) -> str:
+    """渲染为【步骤】+ 紧凑JSON"""
+    blocks = []
+    for key, value in steps.items():
+        serialized = prompt_json(_shrink(value, max_str, max_items))
+        blocks.append(f"【{STEP_TITLES.get(key, key)}】\n{serialized}")
+    return "\n\n".join(blocks)
+
+
+def _digest_steps(world_setting_json: Dict[str, Any]) -> Dict[str, Any]:
+    """取出摘要步骤并去重（内容相同的步骤只保留第一个）"""
+    steps = world_setting_json.get("steps", world_setting_json) or {}
+    selected = {}
+    seen = set()
+    for key in DIGEST_STEPS:
+        if key not in steps:
+            continue
+        value = _canonical(steps[key])
+        if not value:
+            continue
+        value_hash = stable_hash(value)
+        if value_hash in seen:
+            continue
+        seen.add(value_hash)
+        selected[key] = value
+    return selected
+
+
+def build_world_digest(world_setting_json: Dict[str, Any], max_chars: Optional[int] = None) -> str:
+    """
+    构建世界观摘要（带缓存）
+
+    Args:
+        world_setting_json: 完整的世界观数据（含steps），也可以直接传steps
+        max_chars: 长度上限（默认DEFAULT_MAX_CHARS）
+
+    Returns:
+        摘要文本
+    """
+    max_chars = max_chars or DEFAULT_MAX_CHARS
+    steps = _digest_steps(world_setting_json)
+    key = stable_hash({"version": DIGEST_VERSION, "max_chars": max_chars, "steps": steps})
+
+    with _lock:
+        if key in _memory_cache:
+            return _memory_cache[key]
+
+    cache_file = Path(config.PROJECT_TEMP_DIR) / "world_digest" / f"{key}.txt"
+    if cache_file.exists():
+        digest = cache_file.read_text(encoding="utf-8")
+    else:
+        digest = _fit(steps, max_chars)
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            cache_file.write_text(digest, encoding="utf-8")
+        except OSError as e:
+            log.warning(f"世界观摘要缓存写入失败: {e}")
+        log.info(f"世界观摘要已生成: {len(digest)}字符 (缓存键 {key})")
+
+    with _lock:
+        _memory_cache[key] = digest
+    return digest
+
+
+def _fit(steps: Dict[str, Any], max_chars: int) -> str:
+    """在长度上限内渲染：先截短文本，再截短列表"""
+    digest = _render(steps)
+    if len(digest) <= max_chars:
+        return digest
+
+    for max_str, max_items in ((300, None), (150, None), (150, 12), (80, 8), (40, 5)):
+        digest = _render(steps, max_str, max_items)
+        if len(digest) <= max_chars:
+            return digest
+
+    log.warning(f"世界观摘要超出上限({len(digest)}>{max_chars})，已截断")
+    return digest[:max_chars]